@@ -0,0 +1,39 @@
+"""include updated_at in ix_tankvolume_tank_id_created_at
+
+Revision ID: 0c7a3d9e5b41
+Revises: 1f5b8c3e6a27
+Create Date: 2026-10-18 20:41:09.664813
+
+"""
+import sqlalchemy as sa
+import sqlmodel
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '0c7a3d9e5b41'
+down_revision = '1f5b8c3e6a27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.drop_index('ix_tankvolume_tank_id_created_at', table_name='tankvolume')
+    op.create_index(
+        'ix_tankvolume_tank_id_created_at',
+        'tankvolume',
+        ['tank_id', 'created_at'],
+        unique=False,
+        postgresql_include=['id', 'volume', 'updated_at'],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tankvolume_tank_id_created_at', table_name='tankvolume')
+    op.create_index(
+        'ix_tankvolume_tank_id_created_at',
+        'tankvolume',
+        ['tank_id', 'created_at'],
+        unique=False,
+        postgresql_include=['id', 'volume'],
+    )
@@ -0,0 +1,31 @@
+"""create averagesaledeletion table
+
+Revision ID: 1f5b8c3e6a27
+Revises: 7e3b5c1a9d24
+Create Date: 2026-10-18 20:07:43.518290
+
+"""
+import sqlalchemy as sa
+import sqlmodel
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '1f5b8c3e6a27'
+down_revision = '7e3b5c1a9d24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'averagesaledeletion',
+        sa.Column('tank_id', sa.Integer(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['tank_id'], ['tank.id'], ),
+        sa.PrimaryKeyConstraint('tank_id'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('averagesaledeletion')
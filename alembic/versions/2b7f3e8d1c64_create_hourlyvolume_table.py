@@ -0,0 +1,44 @@
+"""create hourlyvolume table
+
+Revision ID: 2b7f3e8d1c64
+Revises: 9e4a1b6c2f70
+Create Date: 2026-10-18 15:07:32.418265
+
+"""
+import sqlalchemy as sa
+import sqlmodel
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '2b7f3e8d1c64'
+down_revision = '9e4a1b6c2f70'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'hourlyvolume',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('tank_id', sa.Integer(), nullable=False),
+        sa.Column('hour', sa.DateTime(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.Column('min_volume', sa.Float(), nullable=False),
+        sa.Column('max_volume', sa.Float(), nullable=False),
+        sa.Column('total_volume', sa.Float(), nullable=False),
+        sa.Column('last_volume', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['tank_id'], ['tank.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ix_hourlyvolume_tank_id_hour',
+        'hourlyvolume',
+        ['tank_id', 'hour'],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_hourlyvolume_tank_id_hour', table_name='hourlyvolume')
+    op.drop_table('hourlyvolume')
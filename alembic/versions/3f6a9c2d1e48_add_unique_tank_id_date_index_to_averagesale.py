@@ -0,0 +1,52 @@
+"""add unique (tank_id, date) index to averagesale
+
+Revision ID: 3f6a9c2d1e48
+Revises: cd51f9f25127
+Create Date: 2026-10-18 09:12:31.402117
+
+"""
+import sqlalchemy as sa
+import sqlmodel
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '3f6a9c2d1e48'
+down_revision = 'cd51f9f25127'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Merge duplicated entries into the one with the lowest id.
+    op.execute(
+        """
+        UPDATE averagesale
+        SET sales = (
+                SELECT SUM(duplicate.sales) FROM averagesale AS duplicate
+                WHERE duplicate.tank_id = averagesale.tank_id
+                AND duplicate.date = averagesale.date
+            ),
+            total = (
+                SELECT SUM(duplicate.total) FROM averagesale AS duplicate
+                WHERE duplicate.tank_id = averagesale.tank_id
+                AND duplicate.date = averagesale.date
+            )
+        WHERE id IN (
+            SELECT MIN(id) FROM averagesale
+            GROUP BY tank_id, date
+            HAVING COUNT(*) > 1
+        )
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM averagesale
+        WHERE id NOT IN (SELECT MIN(id) FROM averagesale GROUP BY tank_id, date)
+        """
+    )
+    op.create_index('ix_averagesale_tank_id_date', 'averagesale', ['tank_id', 'date'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_averagesale_tank_id_date', table_name='averagesale')
@@ -0,0 +1,59 @@
+"""create saleswindow and windowedsale tables
+
+Revision ID: 4a8d2f6b9e13
+Revises: 6c1d9a4e7b32
+Create Date: 2026-10-18 17:41:06.902317
+
+"""
+import sqlalchemy as sa
+import sqlmodel
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '4a8d2f6b9e13'
+down_revision = '6c1d9a4e7b32'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'saleswindow',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('tank_id', sa.Integer(), nullable=False),
+        sa.Column('calendar', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('length', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['tank_id'], ['tank.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ix_saleswindow_tank_id_calendar_length',
+        'saleswindow',
+        ['tank_id', 'calendar', 'length'],
+        unique=True,
+    )
+    op.create_table(
+        'windowedsale',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('window_id', sa.Integer(), nullable=False),
+        sa.Column('start', sa.DateTime(), nullable=False),
+        sa.Column('sales', sa.Integer(), nullable=False),
+        sa.Column('total', sa.Float(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['window_id'], ['saleswindow.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ix_windowedsale_window_id_start',
+        'windowedsale',
+        ['window_id', 'start'],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_windowedsale_window_id_start', table_name='windowedsale')
+    op.drop_table('windowedsale')
+    op.drop_index('ix_saleswindow_tank_id_calendar_length', table_name='saleswindow')
+    op.drop_table('saleswindow')
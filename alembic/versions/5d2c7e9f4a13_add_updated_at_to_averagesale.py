@@ -0,0 +1,37 @@
+"""add updated_at to averagesale
+
+Revision ID: 5d2c7e9f4a13
+Revises: 8b1e4d7a0c95
+Create Date: 2026-10-18 11:24:07.381652
+
+"""
+import sqlalchemy as sa
+import sqlmodel
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '5d2c7e9f4a13'
+down_revision = '8b1e4d7a0c95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'averagesale',
+        sa.Column(
+            'updated_at',
+            sa.DateTime(),
+            nullable=False,
+            server_default=sa.func.current_timestamp(),
+        ),
+    )
+    op.create_index(
+        op.f('ix_averagesale_updated_at'), 'averagesale', ['updated_at'], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_averagesale_updated_at'), table_name='averagesale')
+    op.drop_column('averagesale', 'updated_at')
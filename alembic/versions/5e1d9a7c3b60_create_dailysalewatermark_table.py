@@ -0,0 +1,31 @@
+"""create dailysalewatermark table
+
+Revision ID: 5e1d9a7c3b60
+Revises: a3e9f6c2d815
+Create Date: 2026-10-18 22:14:05.362871
+
+"""
+import sqlalchemy as sa
+import sqlmodel
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '5e1d9a7c3b60'
+down_revision = 'a3e9f6c2d815'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'dailysalewatermark',
+        sa.Column('tank_id', sa.Integer(), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.ForeignKeyConstraint(['tank_id'], ['tank.id'], ),
+        sa.PrimaryKeyConstraint('tank_id'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('dailysalewatermark')
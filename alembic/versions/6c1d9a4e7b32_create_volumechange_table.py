@@ -0,0 +1,32 @@
+"""create volumechange table
+
+Revision ID: 6c1d9a4e7b32
+Revises: 2b7f3e8d1c64
+Create Date: 2026-10-18 16:22:48.573910
+
+"""
+import sqlalchemy as sa
+import sqlmodel
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '6c1d9a4e7b32'
+down_revision = '2b7f3e8d1c64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'volumechange',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('tank_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['tank_id'], ['tank.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('volumechange')
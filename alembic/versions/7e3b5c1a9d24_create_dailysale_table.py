@@ -0,0 +1,43 @@
+"""create dailysale table
+
+Revision ID: 7e3b5c1a9d24
+Revises: 4a8d2f6b9e13
+Create Date: 2026-10-18 18:32:51.274906
+
+"""
+import sqlalchemy as sa
+import sqlmodel
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '7e3b5c1a9d24'
+down_revision = '4a8d2f6b9e13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'dailysale',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('tank_id', sa.Integer(), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('sales', sa.Integer(), nullable=False),
+        sa.Column('total', sa.Float(), nullable=False),
+        sa.Column('cumulative_sales', sa.Integer(), nullable=False),
+        sa.Column('cumulative_total', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['tank_id'], ['tank.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ix_dailysale_tank_id_date',
+        'dailysale',
+        ['tank_id', 'date'],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_dailysale_tank_id_date', table_name='dailysale')
+    op.drop_table('dailysale')
@@ -0,0 +1,31 @@
+"""add (tank_id, created_at) index to tankvolume
+
+Revision ID: 8b1e4d7a0c95
+Revises: 3f6a9c2d1e48
+Create Date: 2026-10-18 10:03:54.218533
+
+"""
+import sqlalchemy as sa
+import sqlmodel
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '8b1e4d7a0c95'
+down_revision = '3f6a9c2d1e48'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_tankvolume_tank_id_created_at',
+        'tankvolume',
+        ['tank_id', 'created_at'],
+        unique=False,
+        postgresql_include=['id', 'volume'],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tankvolume_tank_id_created_at', table_name='tankvolume')
@@ -0,0 +1,37 @@
+"""add updated_at to tankvolume
+
+Revision ID: 9e4a1b6c2f70
+Revises: 5d2c7e9f4a13
+Create Date: 2026-10-18 12:41:15.902144
+
+"""
+import sqlalchemy as sa
+import sqlmodel
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '9e4a1b6c2f70'
+down_revision = '5d2c7e9f4a13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'tankvolume',
+        sa.Column(
+            'updated_at',
+            sa.DateTime(),
+            nullable=False,
+            server_default=sa.func.current_timestamp(),
+        ),
+    )
+    op.create_index(
+        op.f('ix_tankvolume_updated_at'), 'tankvolume', ['updated_at'], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_tankvolume_updated_at'), table_name='tankvolume')
+    op.drop_column('tankvolume', 'updated_at')
@@ -0,0 +1,42 @@
+"""create tankvolumedeletion table
+
+Revision ID: a3e9f6c2d815
+Revises: 0c7a3d9e5b41
+Create Date: 2026-10-18 21:02:36.174520
+
+"""
+import sqlalchemy as sa
+import sqlmodel
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'a3e9f6c2d815'
+down_revision = '0c7a3d9e5b41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'tankvolumedeletion',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('tank_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['tank_id'], ['tank.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        op.f('ix_tankvolumedeletion_deleted_at'),
+        'tankvolumedeletion',
+        ['deleted_at'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        op.f('ix_tankvolumedeletion_deleted_at'), table_name='tankvolumedeletion'
+    )
+    op.drop_table('tankvolumedeletion')
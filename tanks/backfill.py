@@ -0,0 +1,227 @@
+"""
+Rebuild the average sales, windowed sales and hourly volumes of tanks from
+their volumes.
+
+Usage: python -m tanks.backfill --start 2023-01-01 --end 2023-12-31 [--tank-id 1 ...]
+"""
+import argparse
+import csv
+import io
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Any, TypeVar
+
+import sqlalchemy
+
+from .config import Settings
+from .database import copy_csv, create_engine, supports_copy
+from .hooks.avgsales_updater import AvgSalesUpdater, record_deletions
+from .hooks.daily_sales import rebuild_daily_sales
+from .hooks.volume_rollup import refresh_hourly_volumes
+from .hooks.windowed_sales import rebuild_windowed_sales
+from .locks import lock_tanks
+from .models import AverageSale, Tank
+from .sales_series import derive_average_sales, get_next_created_at, get_volume_series
+
+T = TypeVar("T")
+
+WINDOW_WEEKS = AvgSalesUpdater.window_weeks
+
+AVERAGE_SALE_COLUMNS = ("tank_id", "date", "sales", "total", "updated_at")
+
+
+def _copy_rows(
+    connection: sqlalchemy.engine.Connection, rows: Sequence[tuple[Any, ...]]
+) -> None:
+    # Write rows to averagesale with Postgres' COPY.
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+
+    copy_csv(connection, str(AverageSale.__tablename__), AVERAGE_SALE_COLUMNS, buffer)
+
+
+def write_average_sales(
+    connection: sqlalchemy.engine.Connection,
+    tank_id: int,
+    start: date,
+    end: date,
+    average_sales: list[tuple[date, int, float]],
+) -> None:
+    # Replace the average sales of a tank in range.
+    deleted = connection.execute(
+        sqlalchemy.delete(AverageSale).where(
+            AverageSale.tank_id == tank_id,
+            AverageSale.date >= start,
+            AverageSale.date <= end,
+        )
+    )
+    if deleted.rowcount:
+        record_deletions(connection, [tank_id])
+
+    if not average_sales:
+        return
+
+    now = datetime.utcnow()
+    rows = [(tank_id, day, sales, total, now) for day, sales, total in average_sales]
+
+    if supports_copy(connection):
+        _copy_rows(connection, rows)
+        return
+
+    connection.execute(
+        sqlalchemy.insert(AverageSale),
+        [dict(zip(AVERAGE_SALE_COLUMNS, row)) for row in rows],
+    )
+
+
+def compute_average_sales(
+    connection: sqlalchemy.engine.Connection, tank_id: int, start: date, end: date
+) -> list[tuple[date, int, float]]:
+    # Compute the average sales of a tank in range from its volumes.
+    #
+    # The volumes of the range and its windows are read once, and the average sales
+    # derived from them with NumPy.
+    created_at, volumes = get_volume_series(
+        connection, tank_id, start - timedelta(weeks=WINDOW_WEEKS - 1), end
+    )
+    days, sales, totals = derive_average_sales(created_at, volumes, start, end)
+    return list(zip(days.tolist(), sales.tolist(), totals.tolist()))
+
+
+def rebuild_average_sales(
+    connection: sqlalchemy.engine.Connection, tank_id: int, start: date, end: date
+) -> int:
+    # Rebuild the average sales of a tank in range.
+    #
+    # Returns the number of average sales written.
+    average_sales = compute_average_sales(connection, tank_id, start, end)
+    write_average_sales(connection, tank_id, start, end, average_sales)
+    return len(average_sales)
+
+
+def get_affected_range(
+    connection: sqlalchemy.engine.Connection,
+    tank_id: int,
+    first_created_at: datetime,
+    last_created_at: datetime,
+) -> tuple[date, date]:
+    # Get the range of average sales that changes of volumes in a span affect.
+    #
+    # It spans from the first change to the windows of the sale of the volume following
+    # the last one.
+    next_created_at = get_next_created_at(connection, tank_id, last_created_at)
+    end = (next_created_at or last_created_at).date()
+    return (first_created_at.date(), end + timedelta(weeks=WINDOW_WEEKS - 1))
+
+
+def backfill_tanks(
+    settings: Settings, tank_ids: Sequence[int], start: date, end: date
+) -> int:
+    # Rebuild the average sales, windowed sales and hourly volumes of some tanks.
+    #
+    # Each tank is rebuilt in its own transaction.
+    #
+    # Returns the number of average sales written.
+    engine = create_engine(settings)
+    written = 0
+
+    try:
+        for tank_id in tank_ids:
+            with engine.begin() as connection:
+                lock_tanks(connection, [tank_id])
+                written += rebuild_average_sales(connection, tank_id, start, end)
+
+                first_created_at = datetime.combine(start, datetime.min.time())
+                last_created_at = datetime.combine(end, datetime.max.time())
+                refresh_hourly_volumes(
+                    connection, tank_id, first_created_at, last_created_at
+                )
+                rebuild_windowed_sales(
+                    connection, tank_id, first_created_at, last_created_at
+                )
+                rebuild_daily_sales(connection, tank_id, start)
+    finally:
+        engine.dispose()
+
+    return written
+
+
+def _chunks(items: Sequence[T], size: int) -> list[Sequence[T]]:
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+def backfill(
+    settings: Settings,
+    start: date,
+    end: date,
+    tank_ids: Sequence[int] | None = None,
+    workers: int = 1,
+    chunk_size: int = 100,
+) -> int:
+    # Rebuild the derived data of tanks, all by default, from start to end.
+    #
+    # Chunks of tanks are rebuilt in parallel by a pool of worker processes. Returns the
+    # number of average sales written.
+    if start > end:
+        raise ValueError(f"Expected start before end. Received {start} > {end}.")
+
+    if tank_ids is None:
+        engine = create_engine(settings)
+        with engine.connect() as connection:
+            tank_ids = list(
+                connection.execute(sqlalchemy.select(Tank.id).order_by(Tank.id))
+                .scalars()
+                .all()
+            )
+        engine.dispose()
+
+    chunks = _chunks(tank_ids, chunk_size)
+
+    if workers == 1:
+        return sum(backfill_tanks(settings, chunk, start, end) for chunk in chunks)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(backfill_tanks, settings, chunk, start, end)
+            for chunk in chunks
+        ]
+        return sum(future.result() for future in futures)
+
+
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m tanks.backfill",
+        description="Rebuild the average sales and hourly volumes of tanks "
+        "from their volumes.",
+    )
+    parser.add_argument("--start", type=date.fromisoformat, required=True)
+    parser.add_argument("--end", type=date.fromisoformat, required=True)
+    parser.add_argument(
+        "--tank-id",
+        type=int,
+        action="append",
+        dest="tank_ids",
+        help="A tank to rebuild. Repeat for many. Defaults to all tanks.",
+    )
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--chunk-size", type=int, default=100)
+    return parser.parse_args(argv)
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    args = parse_args(argv)
+    written = backfill(
+        Settings(),  # type: ignore
+        start=args.start,
+        end=args.end,
+        tank_ids=args.tank_ids,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+    )
+    print(f"Wrote {written} average sales.")
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,120 @@
+"""
+Downsample tank volumes into time buckets, for charts.
+"""
+from collections.abc import Iterable
+from datetime import datetime, timedelta
+from typing import Any
+
+import sqlalchemy
+from sqlmodel import col
+
+from .models import HourlyVolume, TankVolume
+from .schemas import VolumeBucket
+from .sql import epoch_of
+
+HOUR = 3600
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def _hourly_volumes(
+    tank_id: int, start: datetime | None, end: datetime | None
+) -> sqlalchemy.sql.Subquery:
+    statement = sqlalchemy.select(
+        HourlyVolume.id,
+        col(HourlyVolume.hour).label("moment"),
+        HourlyVolume.count,
+        HourlyVolume.min_volume,
+        HourlyVolume.max_volume,
+        HourlyVolume.total_volume,
+        HourlyVolume.last_volume,
+    ).where(HourlyVolume.tank_id == tank_id)
+
+    if start is not None:
+        statement = statement.where(HourlyVolume.hour >= start)
+    if end is not None:
+        statement = statement.where(HourlyVolume.hour < end)
+
+    return statement.subquery()
+
+
+def _volumes(
+    tank_id: int, start: datetime | None, end: datetime | None
+) -> sqlalchemy.sql.Subquery:
+    statement = sqlalchemy.select(
+        TankVolume.id,
+        col(TankVolume.created_at).label("moment"),
+        sqlalchemy.literal(1).label("count"),
+        col(TankVolume.volume).label("min_volume"),
+        col(TankVolume.volume).label("max_volume"),
+        col(TankVolume.volume).label("total_volume"),
+        col(TankVolume.volume).label("last_volume"),
+    ).where(TankVolume.tank_id == tank_id)
+
+    if start is not None:
+        statement = statement.where(TankVolume.created_at >= start)
+    if end is not None:
+        statement = statement.where(TankVolume.created_at < end)
+
+    return statement.subquery()
+
+
+def buckets_statement(
+    tank_id: int,
+    bucket: int,
+    start: datetime | None = None,
+    end: datetime | None = None,
+) -> sqlalchemy.sql.Select:
+    # Select the volumes of a tank aggregated into buckets of seconds, by date.
+    #
+    # Buckets are aligned to the Unix epoch. Buckets of whole hours are aggregated from
+    # the hourly volumes, so start and end select hours, and others from the volumes
+    # themselves.
+    rows = (
+        _hourly_volumes(tank_id, start, end)
+        if bucket % HOUR == 0
+        else _volumes(tank_id, start, end)
+    )
+
+    epoch = epoch_of(rows.c.moment)
+    bucket_start = epoch - epoch % bucket
+    ranked = sqlalchemy.select(
+        rows,
+        bucket_start.label("bucket"),
+        sqlalchemy.func.row_number()
+        .over(
+            partition_by=bucket_start,
+            order_by=(rows.c.moment.desc(), rows.c.id.desc()),
+        )
+        .label("recency"),
+    ).subquery()
+
+    return (
+        sqlalchemy.select(
+            ranked.c.bucket,
+            sqlalchemy.func.sum(ranked.c.count),
+            sqlalchemy.func.min(ranked.c.min_volume),
+            sqlalchemy.func.max(ranked.c.max_volume),
+            sqlalchemy.func.sum(ranked.c.total_volume)
+            / sqlalchemy.func.sum(ranked.c.count),
+            sqlalchemy.func.max(
+                sqlalchemy.case((ranked.c.recency == 1, ranked.c.last_volume))
+            ),
+        )
+        .group_by(ranked.c.bucket)
+        .order_by(ranked.c.bucket)
+    )
+
+
+def read_buckets(rows: Iterable[Any]) -> list[VolumeBucket]:
+    return [
+        VolumeBucket(
+            start=EPOCH + timedelta(seconds=bucket),
+            count=count,
+            min=minimum,
+            max=maximum,
+            avg=average,
+            last=last,
+        )
+        for bucket, count, minimum, maximum, average, last in rows
+    ]
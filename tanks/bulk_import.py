@@ -0,0 +1,239 @@
+"""
+Import tank volumes in bulk from CSV.
+
+Usage: python -m tanks.bulk_import FILE
+"""
+import argparse
+import csv
+import sys
+from collections.abc import Iterator, Sequence
+from datetime import datetime
+from typing import Any, TextIO
+
+import sqlalchemy
+from pydantic import BaseModel
+
+from .backfill import get_affected_range, rebuild_average_sales
+from .config import Settings
+from .database import copy_csv, create_engine, supports_copy
+from .hooks.daily_sales import rebuild_daily_sales
+from .hooks.volume_rollup import refresh_hourly_volumes
+from .hooks.windowed_sales import rebuild_windowed_sales
+from .locks import lock_tanks
+from .models import Tank, TankVolume
+
+IMPORT_COLUMNS = ("tank_id", "created_at", "volume")
+
+# The id column of exports is accepted, and ignored.
+IGNORED_COLUMNS = ("id",)
+
+# Rows inserted into the staging table at a time, without COPY.
+IMPORT_BATCH_SIZE = 10000
+
+# The position keeps the order of the rows, so the last of duplicates wins.
+_staging = sqlalchemy.Table(
+    "tankvolume_staging",
+    sqlalchemy.MetaData(),
+    sqlalchemy.Column("position", sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column("id", sqlalchemy.Integer),
+    sqlalchemy.Column("tank_id", sqlalchemy.Integer, nullable=False),
+    sqlalchemy.Column("created_at", sqlalchemy.DateTime, nullable=False),
+    sqlalchemy.Column("volume", sqlalchemy.Float, nullable=False),
+    prefixes=["TEMPORARY"],
+)
+
+
+class InvalidImport(ValueError):
+    pass
+
+
+class ImportResult(BaseModel):
+    imported: int
+    average_sales: int
+
+
+def _read_header(file: TextIO) -> list[str]:
+    header: list[str] = next(csv.reader([file.readline()]), [])
+
+    unknown = set(header) - set(IMPORT_COLUMNS) - set(IGNORED_COLUMNS)
+    missing = set(IMPORT_COLUMNS) - set(header)
+    if unknown or missing:
+        raise InvalidImport(
+            f"Expected the columns {', '.join(IMPORT_COLUMNS)}. Received {header}."
+        )
+
+    return header
+
+
+def _parse_rows(file: TextIO, header: list[str]) -> Iterator[dict[str, Any]]:
+    # The header is line 1.
+    for line, values in enumerate(csv.reader(file), start=2):
+        row = dict(zip(header, values))
+        try:
+            yield {
+                "tank_id": int(row["tank_id"]),
+                "created_at": datetime.fromisoformat(row["created_at"]),
+                "volume": float(row["volume"]),
+            }
+        except (KeyError, ValueError) as err:
+            raise InvalidImport(f"Invalid row on line {line}: {values}.") from err
+
+
+def _insert_staging(
+    connection: sqlalchemy.engine.Connection, file: TextIO, header: list[str]
+) -> None:
+    batch: list[dict[str, Any]] = []
+
+    for row in _parse_rows(file, header):
+        batch.append(row)
+        if len(batch) == IMPORT_BATCH_SIZE:
+            connection.execute(_staging.insert(), batch)
+            batch = []
+
+    if batch:
+        connection.execute(_staging.insert(), batch)
+
+
+def _merge_staging(connection: sqlalchemy.engine.Connection) -> int:
+    # Insert the staged volumes that aren't in tankvolume yet.
+    #
+    # Of the volumes staged more than once for a tank and date, the last one is
+    # inserted. Returns the number of inserted volumes.
+    unknown_tank_ids = (
+        connection.execute(
+            sqlalchemy.select(_staging.c.tank_id)
+            .distinct()
+            .where(
+                ~sqlalchemy.exists().where(Tank.id == _staging.c.tank_id),
+            )
+        )
+        .scalars()
+        .all()
+    )
+    if unknown_tank_ids:
+        raise InvalidImport(f"Unknown tanks: {sorted(unknown_tank_ids)}.")
+
+    staged = sqlalchemy.select(
+        _staging.c.tank_id,
+        _staging.c.created_at,
+        _staging.c.volume,
+        sqlalchemy.func.row_number()
+        .over(
+            partition_by=(_staging.c.tank_id, _staging.c.created_at),
+            order_by=_staging.c.position.desc(),
+        )
+        .label("rank"),
+    ).subquery()
+
+    result = connection.execute(
+        sqlalchemy.insert(TankVolume).from_select(
+            ["tank_id", "created_at", "volume", "updated_at"],
+            sqlalchemy.select(
+                staged.c.tank_id,
+                staged.c.created_at,
+                staged.c.volume,
+                sqlalchemy.literal(datetime.utcnow(), sqlalchemy.DateTime),
+            ).where(
+                staged.c.rank == 1,
+                ~sqlalchemy.exists().where(
+                    sqlalchemy.and_(
+                        TankVolume.tank_id == staged.c.tank_id,
+                        TankVolume.created_at == staged.c.created_at,
+                    )
+                ),
+            ),
+        )
+    )
+    return result.rowcount
+
+
+def _staged_spans(
+    connection: sqlalchemy.engine.Connection,
+) -> list[sqlalchemy.engine.Row]:
+    # Get the tank id, and first and last staged volume dates of each tank.
+    return connection.execute(
+        sqlalchemy.select(
+            _staging.c.tank_id,
+            sqlalchemy.func.min(_staging.c.created_at),
+            sqlalchemy.func.max(_staging.c.created_at),
+        )
+        .group_by(_staging.c.tank_id)
+        .order_by(_staging.c.tank_id)
+    ).all()
+
+
+def import_volumes(
+    connection: sqlalchemy.engine.Connection, file: TextIO
+) -> ImportResult:
+    # Import volumes from a CSV file, and derive their average sales.
+    #
+    # The file is loaded into a staging table, with COPY on Postgres, and the volumes
+    # new to tankvolume are inserted from it in one statement. Then the hourly volumes
+    # and average sales of the affected range of each tank are rebuilt, set-based,
+    # instead of handling each volume through SalesMonitor.
+    header = _read_header(file)
+
+    # On errors, the transaction is rolled back, staging table included.
+    _staging.create(connection)
+
+    if supports_copy(connection):
+        copy_csv(connection, _staging.name, header, file)
+    else:
+        _insert_staging(connection, file, header)
+
+    spans = _staged_spans(connection)
+    lock_tanks(connection, (tank_id for tank_id, _first, _last in spans))
+
+    imported = _merge_staging(connection)
+
+    for tank_id, first_created_at, last_created_at in spans:
+        refresh_hourly_volumes(connection, tank_id, first_created_at, last_created_at)
+
+    average_sales = 0
+    for tank_id, first_created_at, last_created_at in spans:
+        start, end = get_affected_range(
+            connection, tank_id, first_created_at, last_created_at
+        )
+        average_sales += rebuild_average_sales(connection, tank_id, start, end)
+        rebuild_windowed_sales(connection, tank_id, first_created_at, last_created_at)
+        rebuild_daily_sales(connection, tank_id, first_created_at.date())
+
+    _staging.drop(connection)
+
+    return ImportResult(imported=imported, average_sales=average_sales)
+
+
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m tanks.bulk_import",
+        description="Import tank volumes from a CSV file with the columns "
+        f"{', '.join(IMPORT_COLUMNS)}.",
+    )
+    parser.add_argument(
+        "file",
+        type=argparse.FileType("r", encoding="utf-8"),
+        help="The CSV file, or - for the standard input.",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    args = parse_args(argv)
+    engine = create_engine(Settings())  # type: ignore
+
+    try:
+        with engine.begin() as connection:
+            result = import_volumes(connection, args.file)
+    except InvalidImport as err:
+        sys.exit(str(err))
+    finally:
+        engine.dispose()
+
+    print(
+        f"Imported {result.imported} volumes "
+        f"and wrote {result.average_sales} average sales."
+    )
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -1,5 +1,15 @@
+from typing import Literal
+
 from pydantic import BaseSettings, Field
 
 
 class Settings(BaseSettings):
     database_url: str = Field(min_length=3)
+    database_async: bool = False
+    database_pool_size: int = Field(default=5, ge=1)
+    database_max_overflow: int = Field(default=10, ge=0)
+    database_pool_pre_ping: bool = True
+    database_pool_recycle: int = 1800
+    avgsales_updater: Literal["orm", "upsert"] = "upsert"
+    unit_of_work: bool = False
+    sales_derivation: Literal["inline", "outbox"] = "inline"
@@ -0,0 +1,421 @@
+"""
+Check the average sales, daily sales, windowed sales and hourly volumes against
+a recomputation from the volumes.
+
+Usage: python -m tanks.consistency [--since DATETIME | --watermark-file PATH] [--repair]
+"""
+import argparse
+import math
+import sys
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+import sqlalchemy
+from pydantic import BaseModel
+from sqlmodel import col
+
+from .backfill import WINDOW_WEEKS, _chunks, compute_average_sales, write_average_sales
+from .config import Settings
+from .database import create_engine
+from .hooks.daily_sales import compute_daily_sales, get_daily_sales, rebuild_daily_sales
+from .hooks.volume_rollup import compute_hourly_volumes, refresh_hourly_volumes
+from .hooks.windowed_sales import compute_windowed_sales, rebuild_windowed_sales
+from .locks import lock_tanks
+from .models import (
+    AverageSale,
+    HourlyVolume,
+    TankVolume,
+    TankVolumeDeletion,
+    WindowedSale,
+)
+
+# Writes committed shortly after a run started may be dated before it.
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+
+Values = tuple[int | float, ...]
+
+
+class Mismatch(BaseModel):
+    """A row of a rollup of a tank differing from its recomputation.
+
+    Rows are dated by their day, hour or bucket, and windowed sales also have
+    their window.
+    """
+
+    class Config:  # pylint: disable=too-few-public-methods
+        smart_union = True
+
+    rollup: str
+    tank_id: int
+    window_id: int | None = None
+    date: datetime | date
+    expected: Values | None
+    actual: Values | None
+
+
+def get_touched_tanks(
+    connection: sqlalchemy.engine.Connection,
+    since: datetime | None = None,
+    tank_ids: Sequence[int] | None = None,
+) -> dict[int, date]:
+    # Get the earliest date of each tank whose average sales may have drifted.
+    #
+    # Those are the tanks with volumes or average sales written, or volumes deleted,
+    # since the watermark, or all tanks without it.
+    starts: dict[int, date] = {}
+
+    sources = [
+        (TankVolume.tank_id, TankVolume.created_at, TankVolume.updated_at),
+        (AverageSale.tank_id, AverageSale.date, AverageSale.updated_at),
+        (
+            TankVolumeDeletion.tank_id,
+            TankVolumeDeletion.created_at,
+            TankVolumeDeletion.deleted_at,
+        ),
+    ]
+
+    for tank_id_column, start_column, written_at in sources:
+        statement = sqlalchemy.select(
+            tank_id_column, sqlalchemy.func.min(start_column)
+        ).group_by(tank_id_column)
+        if since is not None:
+            statement = statement.where(written_at >= since)
+        if tank_ids is not None:
+            statement = statement.where(col(tank_id_column).in_(tank_ids))
+
+        for tank_id, start in connection.execute(statement):
+            if isinstance(start, datetime):
+                start = start.date()
+            starts[tank_id] = min(starts.get(tank_id, start), start)
+
+    return starts
+
+
+def _end(connection: sqlalchemy.engine.Connection, tank_id: int, start: date) -> date:
+    # Get the last date of a tank that has, or should have, an average sale.
+    last_created_at, last_date = connection.execute(
+        sqlalchemy.select(
+            sqlalchemy.select(sqlalchemy.func.max(TankVolume.created_at))
+            .where(TankVolume.tank_id == tank_id)
+            .scalar_subquery(),
+            sqlalchemy.select(sqlalchemy.func.max(AverageSale.date))
+            .where(AverageSale.tank_id == tank_id)
+            .scalar_subquery(),
+        )
+    ).one()
+
+    ends = [start, last_date or start]
+    if last_created_at is not None:
+        ends.append(last_created_at.date() + timedelta(weeks=WINDOW_WEEKS - 1))
+
+    return max(ends)
+
+
+def _compare(
+    rollup: str,
+    tank_id: int,
+    expected: dict[Any, Values],
+    actual: dict[Any, Values],
+    window_id: int | None = None,
+) -> list[Mismatch]:
+    return [
+        Mismatch(
+            rollup=rollup,
+            tank_id=tank_id,
+            window_id=window_id,
+            date=key,
+            expected=expected.get(key),
+            actual=actual.get(key),
+        )
+        for key in sorted(expected.keys() | actual.keys())
+        if not _matches(expected.get(key), actual.get(key))
+    ]
+
+
+def _matches(expected: Values | None, actual: Values | None) -> bool:
+    if expected is None or actual is None:
+        return expected == actual
+
+    return len(expected) == len(actual) and all(
+        math.isclose(expected_value, actual_value)
+        for expected_value, actual_value in zip(expected, actual)
+    )
+
+
+def _check_average_sales(
+    connection: sqlalchemy.engine.Connection,
+    tank_id: int,
+    start: date,
+    end: date,
+    repair: bool,
+) -> list[Mismatch]:
+    expected = compute_average_sales(connection, tank_id, start, end)
+    actual = connection.execute(
+        sqlalchemy.select(AverageSale.date, AverageSale.sales, AverageSale.total).where(
+            AverageSale.tank_id == tank_id,
+            AverageSale.date >= start,
+            AverageSale.date <= end,
+        )
+    )
+
+    mismatches = _compare(
+        "average sales",
+        tank_id,
+        {day: tuple(values) for day, *values in expected},
+        {day: tuple(values) for day, *values in actual},
+    )
+    if repair and mismatches:
+        write_average_sales(connection, tank_id, start, end, expected)
+
+    return mismatches
+
+
+def _check_daily_sales(
+    connection: sqlalchemy.engine.Connection,
+    tank_id: int,
+    start: date,
+    repair: bool,
+) -> list[Mismatch]:
+    expected = compute_daily_sales(connection, tank_id, start)
+    actual = get_daily_sales(connection, tank_id, start)
+
+    mismatches = _compare(
+        "daily sales",
+        tank_id,
+        {day: tuple(values) for day, *values in expected},
+        {day: tuple(values) for day, *values in actual},
+    )
+    if repair and mismatches:
+        rebuild_daily_sales(connection, tank_id, start)
+
+    return mismatches
+
+
+def _check_windowed_sales(
+    connection: sqlalchemy.engine.Connection,
+    tank_id: int,
+    first_created_at: datetime,
+    last_created_at: datetime,
+    repair: bool,
+) -> list[Mismatch]:
+    mismatches = []
+    for window_id, start, end, expected in compute_windowed_sales(
+        connection, tank_id, first_created_at, last_created_at
+    ):
+        actual = connection.execute(
+            sqlalchemy.select(
+                WindowedSale.start, WindowedSale.sales, WindowedSale.total
+            ).where(
+                WindowedSale.window_id == window_id,
+                WindowedSale.start >= start,
+                WindowedSale.start <= end,
+            )
+        )
+        mismatches += _compare(
+            "windowed sales",
+            tank_id,
+            {bucket: tuple(values) for bucket, *values in expected},
+            {bucket: tuple(values) for bucket, *values in actual},
+            window_id=window_id,
+        )
+
+    if repair and mismatches:
+        rebuild_windowed_sales(connection, tank_id, first_created_at, last_created_at)
+
+    return mismatches
+
+
+def _check_hourly_volumes(
+    connection: sqlalchemy.engine.Connection,
+    tank_id: int,
+    first_created_at: datetime,
+    last_created_at: datetime,
+    repair: bool,
+) -> list[Mismatch]:
+    expected = compute_hourly_volumes(
+        connection, tank_id, first_created_at, last_created_at
+    )
+    actual = connection.execute(
+        sqlalchemy.select(
+            HourlyVolume.hour,
+            HourlyVolume.count,
+            HourlyVolume.min_volume,
+            HourlyVolume.max_volume,
+            HourlyVolume.total_volume,
+            HourlyVolume.last_volume,
+        ).where(
+            HourlyVolume.tank_id == tank_id,
+            HourlyVolume.hour >= first_created_at,
+            HourlyVolume.hour <= last_created_at,
+        )
+    )
+
+    mismatches = _compare(
+        "hourly volumes",
+        tank_id,
+        {hour: tuple(values) for hour, *values in expected},
+        {hour: tuple(values) for hour, *values in actual},
+    )
+    if repair and mismatches:
+        refresh_hourly_volumes(connection, tank_id, first_created_at, last_created_at)
+
+    return mismatches
+
+
+def check_tank(
+    connection: sqlalchemy.engine.Connection,
+    tank_id: int,
+    start: date,
+    repair: bool = False,
+) -> list[Mismatch]:
+    # Compare the rollups of a tank from start on to their recomputation.
+    #
+    # Those are its average sales, daily sales, windowed sales and hourly volumes. If
+    # repair is set, each mismatching rollup is rebuilt over the range, with the tank
+    # locked so changes to it don't interleave.
+    if repair:
+        lock_tanks(connection, [tank_id])
+
+    end = _end(connection, tank_id, start)
+    first_created_at = datetime.combine(start, datetime.min.time())
+    last_created_at = datetime.combine(end, datetime.max.time())
+
+    return [
+        *_check_average_sales(connection, tank_id, start, end, repair),
+        *_check_daily_sales(connection, tank_id, start, repair),
+        *_check_windowed_sales(
+            connection, tank_id, first_created_at, last_created_at, repair
+        ),
+        *_check_hourly_volumes(
+            connection, tank_id, first_created_at, last_created_at, repair
+        ),
+    ]
+
+
+def check_tanks(
+    settings: Settings, starts: Sequence[tuple[int, date]], repair: bool = False
+) -> list[Mismatch]:
+    # Check some tanks, each in its own transaction.
+    engine = create_engine(settings)
+    mismatches: list[Mismatch] = []
+
+    try:
+        for tank_id, start in starts:
+            with engine.begin() as connection:
+                mismatches.extend(check_tank(connection, tank_id, start, repair))
+    finally:
+        engine.dispose()
+
+    return mismatches
+
+
+def check(
+    settings: Settings,
+    since: datetime | None = None,
+    tank_ids: Sequence[int] | None = None,
+    repair: bool = False,
+    workers: int = 1,
+    chunk_size: int = 100,
+) -> list[Mismatch]:
+    # Check the rollups of the tanks touched since a watermark, or all without it.
+    #
+    # Chunks of tanks are checked in parallel by a pool of worker processes.
+    engine = create_engine(settings)
+    with engine.connect() as connection:
+        starts = sorted(get_touched_tanks(connection, since, tank_ids).items())
+    engine.dispose()
+
+    chunks = _chunks(starts, chunk_size)
+
+    if workers == 1:
+        return [
+            mismatch
+            for chunk in chunks
+            for mismatch in check_tanks(settings, chunk, repair)
+        ]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(check_tanks, settings, chunk, repair) for chunk in chunks
+        ]
+        return [mismatch for future in futures for mismatch in future.result()]
+
+
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m tanks.consistency",
+        description="Check the rollups of the volumes against the volumes.",
+    )
+    watermark = parser.add_mutually_exclusive_group()
+    watermark.add_argument(
+        "--since",
+        type=datetime.fromisoformat,
+        help="Only check what was written since this UTC datetime.",
+    )
+    watermark.add_argument(
+        "--watermark-file",
+        type=Path,
+        help="Only check what was written since the last run recorded in this "
+        "file, and record this run in it.",
+    )
+    parser.add_argument(
+        "--tank-id",
+        type=int,
+        action="append",
+        dest="tank_ids",
+        help="A tank to check. Repeat for many. Defaults to all tanks.",
+    )
+    parser.add_argument(
+        "--repair",
+        action="store_true",
+        help="Replace mismatching rollups by their recomputation.",
+    )
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--chunk-size", type=int, default=100)
+    return parser.parse_args(argv)
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    args = parse_args(argv)
+    started_at = datetime.utcnow()
+
+    since = args.since
+    if args.watermark_file is not None and args.watermark_file.exists():
+        since = (
+            datetime.fromisoformat(args.watermark_file.read_text().strip())
+            - WATERMARK_OVERLAP
+        )
+
+    mismatches = check(
+        Settings(),  # type: ignore
+        since=since,
+        tank_ids=args.tank_ids,
+        repair=args.repair,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+    )
+
+    for mismatch in mismatches:
+        window = (
+            "" if mismatch.window_id is None else f" of window {mismatch.window_id}"
+        )
+        print(
+            f"Tank {mismatch.tank_id} {mismatch.rollup}{window} on {mismatch.date}: "
+            f"expected {mismatch.expected}, found {mismatch.actual}."
+        )
+    print(f"{'Repaired' if args.repair else 'Found'} {len(mismatches)} mismatches.")
+
+    if mismatches and not args.repair:
+        # The watermark isn't moved, so the next run finds them again.
+        sys.exit(1)
+
+    if args.watermark_file is not None:
+        args.watermark_file.write_text(started_at.isoformat())
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
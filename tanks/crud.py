@@ -1,11 +1,20 @@
 """
 Provide CRUD operations for SQLModels.
 """
+import base64
+import binascii
+import json
+from collections.abc import Hashable, Sequence
+from enum import Enum
 from typing import Any, Generic, Type, TypeVar
 
 import sqlalchemy
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError, parse_obj_as
+from pydantic.json import pydantic_encoder
 from sqlmodel import Session, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .cache import TTLCache
 
 M = TypeVar("M", bound=SQLModel)
 B = TypeVar("B", bound=BaseModel)
@@ -14,27 +23,107 @@ T = TypeVar("T")
 
 
 class CollectionResource(BaseModel, Generic[T]):
-    total: int
+    total: int | None
     offset: int
     limit: int
     items: list[T]
+    next_cursor: str | None = None
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class TotalMode(str, Enum):
+    """How to get the total of a collection.
+
+    - exact: count the rows.
+    - none: skip the total.
+    - estimate: take the query planner's estimate, on Postgres.
+    - cached: count the rows, reusing counts of the same query for a short TTL.
+    """
+
+    EXACT = "exact"
+    NONE = "none"
+    ESTIMATE = "estimate"
+    CACHED = "cached"
+
+
+class Order(str, Enum):
+    ASC = "asc"
+    DESC = "desc"
+
+
+TOTALS_CACHE: TTLCache[Hashable, int] = TTLCache(maxsize=1024, ttl=5.0)
+
+
+def _planned_rows(connection: sqlalchemy.engine.Connection, statement: Any) -> int:
+    # Get Postgres' estimate of the rows returned by a statement.
+    compiled = statement.compile(dialect=connection.dialect)
+    params = (
+        tuple(compiled.params[name] for name in compiled.positiontup)
+        if compiled.positional
+        else compiled.params
+    )
+    plan = connection.exec_driver_sql(
+        f"EXPLAIN (FORMAT JSON) {compiled}", params
+    ).scalar_one()
+    return int(plan[0]["Plan"]["Plan Rows"])
 
 
 class SQLModelCRUD(Generic[M, B]):
-    """A SQLModel wrapper that providing CRUD operations."""
+    """A SQLModel wrapper that providing CRUD operations.
+
+    Collections are sorted by the keyset columns, which must identify rows
+    uniquely, and can be paginated with cursors over them.
+    """
 
-    def __init__(self, session: Session, model_cls: Type[M]):
+    def __init__(
+        self,
+        session: Session,
+        model_cls: Type[M],
+        keyset: Sequence[Any] | None = None,
+        totals_cache: TTLCache[Hashable, int] = TOTALS_CACHE,
+    ):
         self.session = session
         self.model_cls = model_cls
         self.query_set = session.query(model_cls)
+        self.keyset = list(keyset) if keyset else [model_cls.id]  # type: ignore
+        self.totals_cache = totals_cache
 
-    def create(self, content: B, row_id: int | None = None) -> M:
+    def _encode_cursor(self, row: M) -> str:
+        values = [getattr(row, column.key) for column in self.keyset]
+        content = json.dumps(values, default=pydantic_encoder)
+        return base64.urlsafe_b64encode(content.encode()).decode()
+
+    def _decode_cursor(self, cursor: str) -> list[Any]:
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, ValueError) as err:
+            raise InvalidCursor(cursor) from err
+
+        if not isinstance(values, list) or len(values) != len(self.keyset):
+            raise InvalidCursor(cursor)
+
+        try:
+            return [
+                parse_obj_as(column.type.python_type, value)
+                for column, value in zip(self.keyset, values)
+            ]
+        except ValidationError as err:
+            raise InvalidCursor(cursor) from err
+
+    def create(self, content: B, row_id: int | None = None, commit: bool = True) -> M:
+        # Create a row, committing it, or only flushing it if commit is unset.
         content_dict = content.dict()
         if id is not None:
             content_dict["id"] = row_id
         row = self.model_cls(**content_dict)
         self.session.add(row)
-        self.session.commit()
+        if commit:
+            self.session.commit()
+        else:
+            self.session.flush()
         return row
 
     def get_one(self, row_id: int) -> M:
@@ -43,29 +132,95 @@ class SQLModelCRUD(Generic[M, B]):
     def total(self) -> int:
         return self.query_set.count()
 
+    def _estimate_total(self, query: sqlalchemy.orm.Query) -> int:
+        connection = self.session.connection()
+
+        if connection.dialect.name == "postgresql":
+            return _planned_rows(connection, query.statement)
+
+        return query.count()
+
+    def _cached_total(self, query: sqlalchemy.orm.Query) -> int:
+        compiled = query.statement.compile()
+        key = (str(compiled), tuple(sorted(compiled.params.items())))
+
+        total = self.totals_cache.get(key)
+        if total is None:
+            total = query.count()
+            self.totals_cache.set(key, total)
+
+        return total
+
+    def _total(self, query: sqlalchemy.orm.Query, mode: TotalMode) -> int | None:
+        if mode == TotalMode.NONE:
+            return None
+        if mode == TotalMode.ESTIMATE:
+            return self._estimate_total(query)
+        if mode == TotalMode.CACHED:
+            return self._cached_total(query)
+        return query.count()
+
+    def _filtered(
+        self, filters: dict[int, Any], conditions: Sequence[Any]
+    ) -> sqlalchemy.orm.Query:
+        query = self.query_set
+
+        for field, value in filters.items():
+            query = query.filter(field == value)
+
+        for condition in conditions:
+            query = query.filter(condition)
+
+        return query
+
+    def _after(
+        self, query: sqlalchemy.orm.Query, cursor: str, order: Order
+    ) -> sqlalchemy.orm.Query:
+        # Seek to the rows after the cursor's row, in the keyset order or its reverse.
+        keyset: sqlalchemy.sql.ColumnElement[Any] = sqlalchemy.tuple_(*self.keyset)
+        after: sqlalchemy.sql.ColumnElement[Any] = sqlalchemy.tuple_(
+            *self._decode_cursor(cursor)
+        )
+        return query.filter(keyset < after if order == Order.DESC else keyset > after)
+
     def get_many(
         self,
-        offset: int,
         limit: int,
+        offset: int = 0,
         filters: dict[int, Any] | None = None,
+        cursor: str | None = None,
+        total: TotalMode | None = None,
+        conditions: Sequence[Any] | None = None,
+        order: Order = Order.ASC,
     ) -> CollectionResource[M]:
-        if filters is None:
-            filters = {}
+        # Get a page of the collection.
+        #
+        # Rows are filtered by equality filters and any other conditions, such as
+        # ranges, and sorted in the keyset order, or its reverse. Pages after a cursor
+        # seek straight to the cursor's row in that order. The total is counted exactly,
+        # unless another mode is given, except for pages after a cursor, which skip it
+        # by default.
+        if total is None:
+            total = TotalMode.EXACT if cursor is None else TotalMode.NONE
 
-        query = self.query_set
+        query = self._filtered(filters or {}, conditions or [])
+        count = self._total(query, total)
 
-        for field, value in filters.items():
-            query = query.filter(field == value)
-
-        total = query.count()
+        if cursor is not None:
+            query = self._after(query, cursor, order)
 
-        items = query.offset(offset).limit(limit).all()
+        order_by = [
+            column.desc() if order == Order.DESC else column for column in self.keyset
+        ]
+        rows = query.order_by(*order_by).offset(offset).limit(limit + 1).all()
+        items = rows[:limit]
 
         return CollectionResource(
             items=items,
             offset=offset,
             limit=limit,
-            total=total,
+            total=count,
+            next_cursor=self._encode_cursor(items[-1]) if len(rows) > limit else None,
         )
 
     def update(self, row_id: int, content: B) -> M:
@@ -76,3 +231,60 @@ class SQLModelCRUD(Generic[M, B]):
         deleted_rows = self.session.query(self.model_cls).filter_by(id=row_id).delete()
         if deleted_rows < 1:
             raise sqlalchemy.exc.NoResultFound()
+
+
+class AsyncSQLModelCRUD(Generic[M, B]):
+    """An asyncio SQLModelCRUD, running its operations on an AsyncSession."""
+
+    def __init__(
+        self,
+        session: AsyncSession,
+        model_cls: Type[M],
+        keyset: Sequence[Any] | None = None,
+    ):
+        self.session = session
+        self.model_cls = model_cls
+        self._crud = SQLModelCRUD[M, B](session.sync_session, model_cls, keyset)
+
+    async def create(
+        self, content: B, row_id: int | None = None, commit: bool = True
+    ) -> M:
+        return await self.session.run_sync(
+            lambda _session: self._crud.create(content, row_id=row_id, commit=commit)
+        )
+
+    async def get_one(self, row_id: int) -> M:
+        return await self.session.run_sync(lambda _session: self._crud.get_one(row_id))
+
+    async def total(self) -> int:
+        return await self.session.run_sync(lambda _session: self._crud.total())
+
+    async def get_many(
+        self,
+        limit: int,
+        offset: int = 0,
+        filters: dict[int, Any] | None = None,
+        cursor: str | None = None,
+        total: TotalMode | None = None,
+        conditions: Sequence[Any] | None = None,
+        order: Order = Order.ASC,
+    ) -> CollectionResource[M]:
+        return await self.session.run_sync(
+            lambda _session: self._crud.get_many(
+                limit=limit,
+                offset=offset,
+                filters=filters,
+                cursor=cursor,
+                total=total,
+                conditions=conditions,
+                order=order,
+            )
+        )
+
+    async def update(self, row_id: int, content: B) -> M:
+        return await self.session.run_sync(
+            lambda _session: self._crud.update(row_id, content)
+        )
+
+    async def delete(self, row_id: int) -> None:
+        await self.session.run_sync(lambda _session: self._crud.delete(row_id))
@@ -0,0 +1,107 @@
+"""
+Provide the database engine and its connection pool, and COPY into its tables.
+"""
+from collections.abc import AsyncIterator, Sequence
+from typing import Any, TextIO
+
+import sqlalchemy
+import sqlmodel
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.ext.asyncio import create_async_engine as _create_async_engine
+from sqlalchemy.util import await_only
+
+from .config import Settings
+
+ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite",
+}
+
+# The Postgres drivers COPY is done with.
+COPY_DRIVERS = ("psycopg2", "asyncpg")
+
+# Characters of CSV sent to asyncpg's COPY at a time.
+COPY_CHUNK_SIZE = 64 * 1024
+
+
+def get_engine_options(settings: Settings) -> dict[str, Any]:
+    # Get the engine options for the configured database.
+    #
+    # SQLite uses single connection pools, which can't be sized.
+    options: dict[str, Any] = {
+        "pool_pre_ping": settings.database_pool_pre_ping,
+        "pool_recycle": settings.database_pool_recycle,
+    }
+
+    url = sqlalchemy.engine.make_url(settings.database_url)
+    if url.get_backend_name() != "sqlite":
+        options["pool_size"] = settings.database_pool_size
+        options["max_overflow"] = settings.database_max_overflow
+
+    return options
+
+
+def create_engine(settings: Settings) -> sqlalchemy.engine.Engine:
+    return sqlmodel.create_engine(
+        url=settings.database_url, **get_engine_options(settings)
+    )
+
+
+def get_async_database_url(database_url: str) -> sqlalchemy.engine.URL:
+    # Get the database URL with the asyncio driver of its backend.
+    #
+    # URLs already naming an asyncio driver are kept as they are.
+    url = sqlalchemy.engine.make_url(database_url)
+    backend = url.get_backend_name()
+
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No asyncio driver is known for {backend}.")
+
+    if url.get_driver_name() in ASYNC_DRIVERS.values():
+        return url
+
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+
+
+def create_async_engine(settings: Settings) -> AsyncEngine:
+    return _create_async_engine(
+        get_async_database_url(settings.database_url),
+        **get_engine_options(settings),
+    )
+
+
+def supports_copy(connection: sqlalchemy.engine.Connection) -> bool:
+    return (
+        connection.dialect.name == "postgresql"
+        and connection.dialect.driver in COPY_DRIVERS
+    )
+
+
+async def _encoded_chunks(file: TextIO) -> AsyncIterator[bytes]:
+    while chunk := file.read(COPY_CHUNK_SIZE):
+        yield chunk.encode()
+
+
+def copy_csv(
+    connection: sqlalchemy.engine.Connection,
+    table: str,
+    columns: Sequence[str],
+    file: TextIO,
+) -> None:
+    # Load CSV rows into a table with Postgres' COPY.
+    #
+    # With psycopg2, the file is copied by the cursor. With asyncpg, it's sent in chunks
+    # by the driver's connection, awaited from the synchronous code that
+    # AsyncSession.run_sync runs. Check supports_copy first.
+    if connection.dialect.driver == "asyncpg":
+        await_only(
+            connection.connection.driver_connection.copy_to_table(
+                table, source=_encoded_chunks(file), columns=list(columns), format="csv"
+            )
+        )
+        return
+
+    with connection.connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", file
+        )
@@ -1,13 +1,23 @@
+from collections.abc import AsyncGenerator, Generator
 from functools import cache
 from typing import Annotated
 
+import sqlalchemy
 import sqlmodel
+import sqlmodel.ext.asyncio.session
 from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncEngine
 
 import tanks.hooks.sales_monitor
-from tanks.hooks.avgsales_updater import AvgSalesUpdater
+from tanks.hooks.avgsales_updater import AvgSalesUpdater, UpsertAvgSalesUpdater
+from tanks.hooks.daily_sales import DailySalesUpdater
+from tanks.hooks.sales_outbox import AsyncSalesOutbox, SalesOutbox
+from tanks.hooks.volume_rollup import AsyncVolumeRollupUpdater, VolumeRollupUpdater
+from tanks.hooks.windowed_sales import WindowedSalesUpdater
 
 from .config import Settings
+from .database import create_async_engine, create_engine
+from .locks import unlock_session_tanks
 
 
 @cache
@@ -16,22 +26,118 @@ def get_settings() -> Settings:
 
 
 @cache
-def get_session() -> sqlmodel.Session:
-    engine = sqlmodel.create_engine(url=get_settings().database_url)
-    return Session(engine)
+def get_engine() -> sqlalchemy.engine.Engine:
+    return create_engine(get_settings())
+
+
+def get_session() -> Generator[sqlmodel.Session, None, None]:
+    # The session keeps a connection, which holds the tanks it locks.
+    with get_engine().connect() as connection:
+        session = sqlmodel.Session(connection)
+        try:
+            yield session
+        finally:
+            session.close()
+            unlock_session_tanks(connection, session)
 
 
 Session = Annotated[sqlmodel.Session, Depends(get_session)]
 
 
 @cache
+def get_async_engine() -> AsyncEngine:
+    return create_async_engine(get_settings())
+
+
+async def get_async_session() -> AsyncGenerator[
+    sqlmodel.ext.asyncio.session.AsyncSession, None
+]:
+    async with get_async_engine().connect() as connection:
+        session = sqlmodel.ext.asyncio.session.AsyncSession(
+            connection, expire_on_commit=False
+        )
+        try:
+            yield session
+        finally:
+            await session.close()
+            await connection.run_sync(unlock_session_tanks, session.sync_session)
+
+
+AsyncSession = Annotated[
+    sqlmodel.ext.asyncio.session.AsyncSession, Depends(get_async_session)
+]
+
+
+def get_unit_of_work() -> bool:
+    settings = get_settings()
+    # Changes are recorded in the outbox within the transaction of the volumes.
+    return settings.unit_of_work or settings.sales_derivation == "outbox"
+
+
+UnitOfWork = Annotated[bool, Depends(get_unit_of_work)]
+
+
+def get_avgsales_updater(session: sqlmodel.Session) -> AvgSalesUpdater:
+    # Committed with the other observers' changes.
+    if get_settings().avgsales_updater == "orm":
+        return AvgSalesUpdater(session, commit=False)
+    return UpsertAvgSalesUpdater(session, commit=False)
+
+
+def get_sales_observers(
+    session: sqlmodel.Session,
+) -> tanks.hooks.sales_monitor.SalesObservers:
+    # Get the observers of sales: the average, windowed and daily sales.
+    #
+    # Their changes are flushed at once, and committed by the routes.
+    return tanks.hooks.sales_monitor.SalesObservers(
+        session,
+        get_avgsales_updater(session),
+        WindowedSalesUpdater(session),
+        DailySalesUpdater(session),
+    )
+
+
 def get_sales_monitor(session: Session):
+    if get_settings().sales_derivation == "outbox":
+        return SalesOutbox(session)
     return tanks.hooks.sales_monitor.SalesMonitor(
-        session=session, avgsales_updater=AvgSalesUpdater(session)
+        session=session, avgsales_updater=get_sales_observers(session)
     )
 
 
 SalesMonitor = Annotated[
-    tanks.hooks.sales_monitor.SalesMonitor,
+    tanks.hooks.sales_monitor.SalesMonitor | SalesOutbox,
     Depends(get_sales_monitor),
 ]
+
+
+def get_async_sales_monitor(session: AsyncSession):
+    if get_settings().sales_derivation == "outbox":
+        return AsyncSalesOutbox(session)
+    return tanks.hooks.sales_monitor.AsyncSalesMonitor(
+        session=session,
+        avgsales_updater=get_sales_observers(session.sync_session),
+    )
+
+
+AsyncSalesMonitor = Annotated[
+    tanks.hooks.sales_monitor.AsyncSalesMonitor | AsyncSalesOutbox,
+    Depends(get_async_sales_monitor),
+]
+
+
+def get_volume_rollup(session: Session) -> VolumeRollupUpdater:
+    return VolumeRollupUpdater(session)
+
+
+VolumeRollup = Annotated[VolumeRollupUpdater, Depends(get_volume_rollup)]
+
+
+def get_async_volume_rollup(session: AsyncSession) -> AsyncVolumeRollupUpdater:
+    return AsyncVolumeRollupUpdater(session)
+
+
+AsyncVolumeRollup = Annotated[
+    AsyncVolumeRollupUpdater, Depends(get_async_volume_rollup)
+]
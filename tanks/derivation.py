@@ -0,0 +1,200 @@
+"""
+Derive the average sales of the volume changes recorded in the outbox, and settle
+the stale running sums of daily sales.
+
+Usage: python -m tanks.derivation [--batch-size 1000] [--poll-interval 1] [--once]
+                                  [--shard 0 --shards 1]
+"""
+import argparse
+import time
+from collections.abc import Sequence
+from datetime import datetime
+
+import sqlalchemy
+from sqlmodel import col
+
+from .backfill import get_affected_range, rebuild_average_sales
+from .config import Settings
+from .database import create_engine
+from .hooks.daily_sales import rebuild_daily_sales, settle_running_sums
+from .hooks.windowed_sales import rebuild_windowed_sales
+from .locks import lock_tanks
+from .models import DailySaleWatermark, VolumeChange
+
+
+def derive_changes(
+    connection: sqlalchemy.engine.Connection,
+    batch_size: int,
+    shard: int = 0,
+    shards: int = 1,
+) -> int:
+    # Derive the average sales of a batch of the oldest recorded changes.
+    #
+    # The changes of each tank in the batch are merged into one span, whose affected
+    # average sales are rebuilt from the volumes, as the bulk import does. Rebuilding
+    # reads the volumes as they are now, so it's right whatever the order of the
+    # changes, and however many of them are merged. The derived changes are then
+    # deleted.
+    #
+    # Workers can share the outbox: each derives only the tanks of its shard, those
+    # whose id modulo shards is shard. The tanks of the batch are locked, and on
+    # Postgres changes claimed by another worker are skipped, so a tank is never rebuilt
+    # by two transactions at once, including the requests'.
+    #
+    # Returns the number of changes derived.
+    changes = connection.execute(
+        sqlalchemy.select(
+            VolumeChange.id, VolumeChange.tank_id, VolumeChange.created_at
+        )
+        .where(VolumeChange.tank_id % shards == shard)
+        .order_by(VolumeChange.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).all()
+
+    spans: dict[int, tuple[datetime, datetime]] = {}
+    for _id, tank_id, created_at in changes:
+        first_created_at, last_created_at = spans.get(tank_id, (created_at, created_at))
+        spans[tank_id] = (
+            min(first_created_at, created_at),
+            max(last_created_at, created_at),
+        )
+
+    lock_tanks(connection, spans)
+    for tank_id, (first_created_at, last_created_at) in sorted(spans.items()):
+        start, end = get_affected_range(
+            connection, tank_id, first_created_at, last_created_at
+        )
+        rebuild_average_sales(connection, tank_id, start, end)
+        rebuild_windowed_sales(connection, tank_id, first_created_at, last_created_at)
+        rebuild_daily_sales(connection, tank_id, first_created_at.date())
+
+    if changes:
+        # By id, as changes with lower ids may still be committed meanwhile.
+        connection.execute(
+            sqlalchemy.delete(VolumeChange).where(
+                col(VolumeChange.id).in_([change.id for change in changes])
+            )
+        )
+
+    return len(changes)
+
+
+def settle_stale_running_sums(
+    connection: sqlalchemy.engine.Connection,
+    batch_size: int,
+    shard: int = 0,
+    shards: int = 1,
+) -> int:
+    # Settle the stale running sums of the daily sales of a batch of tanks.
+    #
+    # Sales before the latest day of their tank leave the running sums of the later days
+    # stale, from the tank's watermark on, and reads work them out until they're
+    # settled. The tanks are locked, and their watermarks read again, as requests may
+    # move them meanwhile.
+    #
+    # Returns the number of tanks settled.
+    tank_ids = (
+        connection.execute(
+            sqlalchemy.select(DailySaleWatermark.tank_id)
+            .where(DailySaleWatermark.tank_id % shards == shard)
+            .order_by(DailySaleWatermark.tank_id)
+            .limit(batch_size)
+        )
+        .scalars()
+        .all()
+    )
+
+    lock_tanks(connection, tank_ids)
+    for tank_id in tank_ids:
+        settle_running_sums(connection, tank_id)
+
+    return len(tank_ids)
+
+
+def run(
+    settings: Settings,
+    batch_size: int = 1000,
+    poll_interval: float = 1.0,
+    once: bool = False,
+    shard: int = 0,
+    shards: int = 1,
+) -> int:
+    # Derive recorded changes and settle running sums in batches.
+    #
+    # Each batch has its own transaction. The outbox and the watermarks are polled every
+    # poll_interval seconds while they're empty, or, if once is set, drained and left.
+    # Only the tanks of the shard are derived and settled. Returns the number of changes
+    # derived.
+    engine = create_engine(settings)
+    derived = 0
+
+    try:
+        while True:
+            with engine.begin() as connection:
+                batch = derive_changes(connection, batch_size, shard, shards)
+            with engine.begin() as connection:
+                settled = settle_stale_running_sums(
+                    connection, batch_size, shard, shards
+                )
+            derived += batch
+
+            if batch < batch_size and settled < batch_size:
+                if once:
+                    return derived
+                time.sleep(poll_interval)
+    finally:
+        engine.dispose()
+
+
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m tanks.derivation",
+        description="Derive the average sales of the volume changes recorded in "
+        "the outbox, and settle the stale running sums of daily sales.",
+    )
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=1.0,
+        help="Seconds to wait for changes while there are none.",
+    )
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help="Derive the recorded changes and exit, instead of polling.",
+    )
+    parser.add_argument(
+        "--shard",
+        type=int,
+        default=0,
+        help="The shard of tanks to derive, from 0 to shards - 1.",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="The number of workers sharing the outbox.",
+    )
+    args = parser.parse_args(argv)
+    if not 0 <= args.shard < args.shards:
+        parser.error("--shard must be between 0 and --shards - 1")
+    return args
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    args = parse_args(argv)
+    derived = run(
+        Settings(),  # type: ignore
+        batch_size=args.batch_size,
+        poll_interval=args.poll_interval,
+        once=args.once,
+        shard=args.shard,
+        shards=args.shards,
+    )
+    print(f"Derived {derived} changes.")
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -1,36 +1,72 @@
-from datetime import timedelta
+from collections.abc import Iterable
+from datetime import date, datetime
 
+import sqlalchemy
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlmodel import Session, col
 
-from tanks.models import AverageSale
+from tanks.models import AverageSale, AverageSaleDeletion
 from tanks.schemas import Sale
+from tanks.windows import window_offsets
+
+
+def record_deletions(
+    connection: sqlalchemy.engine.Connection, tank_ids: Iterable[int]
+) -> None:
+    # Record that average sales of some tanks were just deleted.
+    tank_ids = sorted(set(tank_ids))
+    if not tank_ids:
+        return
+
+    now = datetime.utcnow()
+    connection.execute(
+        sqlalchemy.delete(AverageSaleDeletion).where(
+            col(AverageSaleDeletion.tank_id).in_(tank_ids)
+        )
+    )
+    connection.execute(
+        sqlalchemy.insert(AverageSaleDeletion),
+        [{"tank_id": tank_id, "deleted_at": now} for tank_id in tank_ids],
+    )
 
 
 class AvgSalesUpdater:
+    """Keep the average sales up to date with the sales.
+
+    Each change is committed, unless commit is unset, in which case it's left
+    in the session, to be flushed and committed by the caller.
+    """
+
     window_weeks = 5
 
-    def __init__(self, session: Session):
+    def __init__(self, session: Session, commit: bool = True):
         self._session = session
+        self._autocommit = commit
+
+    def _commit(self) -> None:
+        if self._autocommit:
+            self._session.commit()
 
     def _affected_avg_sales(self, sale: Sale) -> list[AverageSale]:
-        date = sale.created_at.date()
+        day = sale.created_at.date()
         affected_dates = [
-            date + timedelta(weeks=weeks) for weeks in range(self.window_weeks)
+            day + offset for offset in window_offsets("weekday", self.window_weeks)
         ]
         query = (
             self._session.query(AverageSale)
             .filter_by(tank_id=sale.tank_id)
             .filter(col(AverageSale.date).in_(affected_dates))
         )
-        result = query.all()
-
-        if not result:
-            return [
-                AverageSale(id=None, tank_id=sale.tank_id, date=date, sales=0, total=0)
-                for date in affected_dates
-            ]
+        # (tank_id, date) is unique, so there is at most one entry per date.
+        existing = {entry.date: entry for entry in query}
 
-        return result
+        return [
+            existing.get(affected_date)
+            or AverageSale(
+                id=None, tank_id=sale.tank_id, date=affected_date, sales=0, total=0
+            )
+            for affected_date in affected_dates
+        ]
 
     def handle_added_sale(self, sale: Sale) -> None:
         if sale.quantity <= 0:
@@ -44,7 +80,7 @@ class AvgSalesUpdater:
 
             self._session.add(entry)
 
-        self._session.commit()
+        self._commit()
 
     def _violates_invariant(self, sales: int, total: float) -> bool:
         return total < 0.0 or ((sales == 0 or total == 0.0) and sales != total)
@@ -72,4 +108,200 @@ class AvgSalesUpdater:
                 self._session.delete(entry)
                 continue
 
-        self._session.commit()
+        if any(entry.total == 0.0 for entry in affected_avg_sales):
+            record_deletions(self._session.connection(), [sale.tank_id])
+
+        self._commit()
+
+    def _window_deltas(
+        self, added: list[Sale], deleted: list[Sale]
+    ) -> dict[tuple[int, date], tuple[int, float]]:
+        deltas: dict[tuple[int, date], tuple[int, float]] = {}
+
+        for sign, sales in ((1, added), (-1, deleted)):
+            for sale in sales:
+                if sale.quantity <= 0:
+                    raise ValueError(
+                        f"Expected positive sale.quantity. Received {sale.quantity}."
+                    )
+
+                sale_date = sale.created_at.date()
+                for offset in window_offsets("weekday", self.window_weeks):
+                    key = (sale.tank_id, sale_date + offset)
+                    sales_delta, total_delta = deltas.get(key, (0, 0.0))
+                    deltas[key] = (
+                        sales_delta + sign,
+                        total_delta + sign * sale.quantity,
+                    )
+
+        return deltas
+
+    def handle_sales(self, added: list[Sale], deleted: list[Sale]) -> None:
+        # Handle many added and deleted sales with a single commit.
+        #
+        # The deltas of all sales are aggregated per tank and date, so each affected
+        # AverageSale row is loaded and written once.
+        deltas = self._window_deltas(added=added, deleted=deleted)
+        if not deltas:
+            return
+
+        existing = {
+            (entry.tank_id, entry.date): entry
+            for entry in self._session.query(AverageSale).filter(
+                sqlalchemy.tuple_(col(AverageSale.tank_id), col(AverageSale.date)).in_(
+                    list(deltas)
+                )
+            )
+        }
+
+        entries = [
+            existing.get(key)
+            or AverageSale(id=None, tank_id=key[0], date=key[1], sales=0, total=0)
+            for key in deltas
+        ]
+
+        for entry in entries:
+            sales_delta, total_delta = deltas[(entry.tank_id, entry.date)]
+            if self._violates_invariant(
+                sales=entry.sales + sales_delta,
+                total=entry.total + total_delta,
+            ):
+                raise ValueError(
+                    f"Applying {deltas[(entry.tank_id, entry.date)]} is "
+                    f"inconsistent with the existing {entry}."
+                )
+
+        deleted_tank_ids = []
+        for entry in entries:
+            sales_delta, total_delta = deltas[(entry.tank_id, entry.date)]
+            entry.sales += sales_delta
+            entry.total += total_delta
+
+            if entry.sales == 0:
+                if entry.id is not None:
+                    self._session.delete(entry)
+                    deleted_tank_ids.append(entry.tank_id)
+                continue
+
+            self._session.add(entry)
+
+        record_deletions(self._session.connection(), deleted_tank_ids)
+        self._commit()
+
+
+_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+class UpsertAvgSalesUpdater(AvgSalesUpdater):
+    """An AvgSalesUpdater applying sales with set-based statements.
+
+    The deltas of sales are added to their window's entries with a single
+    INSERT ... ON CONFLICT DO UPDATE, relying on the unique (tank_id, date)
+    index, so concurrent workers can't overwrite each other's updates.
+    Entries losing sales are locked and checked before they're updated.
+    """
+
+    def _upsert(self, deltas: dict[tuple[int, date], tuple[int, float]]) -> None:
+        dialect = self._session.get_bind().dialect.name
+        if dialect not in _INSERTS:
+            raise NotImplementedError(f"Upserts aren't supported on {dialect}.")
+
+        now = datetime.utcnow()
+        insert = _INSERTS[dialect](AverageSale).values(
+            [
+                {
+                    "tank_id": tank_id,
+                    "date": day,
+                    "sales": sales,
+                    "total": total,
+                    "updated_at": now,
+                }
+                for (tank_id, day), (sales, total) in deltas.items()
+            ]
+        )
+        self._session.execute(
+            insert.on_conflict_do_update(
+                index_elements=[AverageSale.tank_id, AverageSale.date],
+                set_={
+                    "sales": AverageSale.sales + insert.excluded.sales,
+                    "total": AverageSale.total + insert.excluded.total,
+                    "updated_at": insert.excluded.updated_at,
+                },
+            )
+        )
+
+    def _check_decrements(
+        self, deltas: dict[tuple[int, date], tuple[int, float]]
+    ) -> None:
+        existing = {
+            (entry.tank_id, entry.date): entry
+            for entry in self._session.query(AverageSale)
+            .filter(
+                sqlalchemy.tuple_(col(AverageSale.tank_id), col(AverageSale.date)).in_(
+                    list(deltas)
+                )
+            )
+            .with_for_update()
+        }
+
+        for key, (sales_delta, total_delta) in deltas.items():
+            entry = existing.get(key)
+            sales = entry.sales if entry else 0
+            total = entry.total if entry else 0.0
+            if self._violates_invariant(
+                sales=sales + sales_delta, total=total + total_delta
+            ):
+                raise ValueError(
+                    f"Applying {(sales_delta, total_delta)} is "
+                    f"inconsistent with the existing {entry or key}."
+                )
+
+    def _apply(self, deltas: dict[tuple[int, date], tuple[int, float]]) -> None:
+        deltas = {key: delta for key, delta in deltas.items() if delta != (0, 0.0)}
+        if not deltas:
+            return
+
+        # Deltas that may break the invariant of their entry are checked first.
+        decrements = {
+            key: (sales_delta, total_delta)
+            for key, (sales_delta, total_delta) in deltas.items()
+            if sales_delta <= 0 or total_delta <= 0
+        }
+        if decrements:
+            self._check_decrements(decrements)
+
+        self._upsert(deltas)
+
+        if decrements:
+            deleted = self._session.connection().execute(
+                sqlalchemy.delete(AverageSale).where(
+                    sqlalchemy.tuple_(
+                        col(AverageSale.tank_id), col(AverageSale.date)
+                    ).in_(list(decrements)),
+                    AverageSale.sales == 0,
+                )
+            )
+            if deleted.rowcount:
+                record_deletions(
+                    self._session.connection(),
+                    [tank_id for tank_id, _day in decrements],
+                )
+
+        # The statements bypass the ORM, so loaded entries are stale.
+        for instance in list(self._session.identity_map.values()):
+            if isinstance(instance, AverageSale):
+                self._session.expire(instance)
+
+        self._commit()
+
+    def handle_added_sale(self, sale: Sale) -> None:
+        self._apply(self._window_deltas(added=[sale], deleted=[]))
+
+    def handle_deleted_sale(self, sale: Sale) -> None:
+        self._apply(self._window_deltas(added=[], deleted=[sale]))
+
+    def handle_sales(self, added: list[Sale], deleted: list[Sale]) -> None:
+        self._apply(self._window_deltas(added=added, deleted=deleted))
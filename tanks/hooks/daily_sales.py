@@ -0,0 +1,334 @@
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import sqlalchemy
+from sqlmodel import Session, col
+
+from tanks.models import DailySale, DailySaleWatermark, TankVolume
+from tanks.sales_series import derive_windowed_sales, get_volume_series
+from tanks.schemas import Sale
+
+DAILY_SALE_COLUMNS = (
+    "tank_id",
+    "date",
+    "sales",
+    "total",
+    "cumulative_sales",
+    "cumulative_total",
+)
+
+
+def _watermark(connection: sqlalchemy.engine.Connection, tank_id: int) -> date | None:
+    return connection.execute(
+        sqlalchemy.select(DailySaleWatermark.date).where(
+            DailySaleWatermark.tank_id == tank_id
+        )
+    ).scalar()
+
+
+def _stored_running_sums(
+    connection: sqlalchemy.engine.Connection, tank_id: int, day: date
+) -> tuple[int, float]:
+    row = connection.execute(
+        sqlalchemy.select(DailySale.cumulative_sales, DailySale.cumulative_total)
+        .where(DailySale.tank_id == tank_id, DailySale.date <= day)
+        .order_by(col(DailySale.date).desc())
+        .limit(1)
+    ).first()
+    if row is None:
+        return 0, 0.0
+    cumulative_sales, cumulative_total = row
+    return cumulative_sales, cumulative_total
+
+
+def get_running_sums(
+    connection: sqlalchemy.engine.Connection, tank_id: int, day: date
+) -> tuple[int, float]:
+    # Get the running sums of the sales of a tank up to a day.
+    #
+    # From the tank's watermark on, they're those of the day before it, plus the sales
+    # of the days from the watermark to day.
+    watermark = _watermark(connection, tank_id)
+    if watermark is None or day < watermark:
+        return _stored_running_sums(connection, tank_id, day)
+
+    base_sales, base_total = _stored_running_sums(
+        connection, tank_id, watermark - timedelta(days=1)
+    )
+    sales, total = connection.execute(
+        sqlalchemy.select(
+            sqlalchemy.func.coalesce(sqlalchemy.func.sum(DailySale.sales), 0),
+            sqlalchemy.func.coalesce(sqlalchemy.func.sum(DailySale.total), 0.0),
+        ).where(
+            DailySale.tank_id == tank_id,
+            DailySale.date >= watermark,
+            DailySale.date <= day,
+        )
+    ).one()
+    return base_sales + sales, base_total + total
+
+
+def get_daily_sales(
+    connection: sqlalchemy.engine.Connection, tank_id: int, start: date
+) -> list[tuple[date, int, float, int, float]]:
+    # Get the daily sales of a tank from start on, with their running sums.
+    #
+    # The stale running sums, from the tank's watermark on, are worked out.
+    watermark = _watermark(connection, tank_id)
+    rows = connection.execute(
+        sqlalchemy.select(
+            DailySale.date,
+            DailySale.sales,
+            DailySale.total,
+            DailySale.cumulative_sales,
+            DailySale.cumulative_total,
+        )
+        .where(DailySale.tank_id == tank_id, DailySale.date >= start)
+        .order_by(DailySale.date)
+    ).all()
+    cumulative_sales, cumulative_total = (
+        (0, 0.0)
+        if watermark is None
+        else get_running_sums(
+            connection, tank_id, max(start, watermark) - timedelta(days=1)
+        )
+    )
+    daily_sales = []
+    for day, sales, total, running_sales, running_total in rows:
+        if watermark is not None and day >= watermark:
+            cumulative_sales += sales
+            cumulative_total += total
+            running_sales, running_total = cumulative_sales, cumulative_total
+        daily_sales.append((day, sales, total, running_sales, running_total))
+
+    return daily_sales
+
+
+def compute_daily_sales(
+    connection: sqlalchemy.engine.Connection, tank_id: int, start: date
+) -> list[tuple[date, int, float, int, float]]:
+    # Compute the daily sales of a tank from start on, from its volumes.
+    #
+    # The running sums go on from those of the day before start. Returns the days with
+    # sales, with their numbers and totals of sales and running sums.
+    last_created_at = connection.execute(
+        sqlalchemy.select(sqlalchemy.func.max(TankVolume.created_at)).where(
+            TankVolume.tank_id == tank_id
+        )
+    ).scalar()
+    if last_created_at is None or last_created_at.date() < start:
+        return []
+
+    created_at, volumes = get_volume_series(
+        connection, tank_id, start, last_created_at.date()
+    )
+    days, sales, totals = derive_windowed_sales(
+        created_at,
+        volumes,
+        "day",
+        1,
+        datetime.combine(start, datetime.min.time()),
+        last_created_at,
+    )
+    if len(days) == 0:
+        return []
+
+    base_sales, base_total = get_running_sums(
+        connection, tank_id, start - timedelta(days=1)
+    )
+
+    return list(
+        zip(
+            days.astype("datetime64[D]").tolist(),
+            sales.tolist(),
+            totals.tolist(),
+            (base_sales + np.cumsum(sales)).tolist(),
+            (base_total + np.cumsum(totals)).tolist(),
+        )
+    )
+
+
+def rebuild_daily_sales(
+    connection: sqlalchemy.engine.Connection, tank_id: int, start: date
+) -> int:
+    # Rebuild the daily sales of a tank from start on.
+    #
+    # The running sums go on from those of the day before start, so every later day is
+    # rebuilt. If the tank's running sums are stale from an earlier day, they're rebuilt
+    # from that day, and are fresh again. Returns the number of daily sales written.
+    watermark = _watermark(connection, tank_id)
+    if watermark is not None:
+        start = min(start, watermark)
+        connection.execute(
+            sqlalchemy.delete(DailySaleWatermark).where(
+                DailySaleWatermark.tank_id == tank_id
+            )
+        )
+
+    daily_sales = compute_daily_sales(connection, tank_id, start)
+
+    connection.execute(
+        sqlalchemy.delete(DailySale).where(
+            DailySale.tank_id == tank_id, DailySale.date >= start
+        )
+    )
+    if daily_sales:
+        connection.execute(
+            sqlalchemy.insert(DailySale),
+            [dict(zip(DAILY_SALE_COLUMNS, (tank_id, *row))) for row in daily_sales],
+        )
+
+    return len(daily_sales)
+
+
+def settle_running_sums(connection: sqlalchemy.engine.Connection, tank_id: int) -> int:
+    # Store the stale running sums of a tank, from its watermark on.
+    #
+    # They're worked out from the daily sales, without the volumes, and the watermark is
+    # removed, so reads of the running sums are two lookups again. Returns the number of
+    # daily sales updated.
+    watermark = _watermark(connection, tank_id)
+    if watermark is None:
+        return 0
+
+    daily_sales = get_daily_sales(connection, tank_id, watermark)
+    if daily_sales:
+        connection.execute(
+            sqlalchemy.update(DailySale)
+            .where(
+                DailySale.tank_id == tank_id,
+                DailySale.date == sqlalchemy.bindparam("day"),
+            )
+            .values(
+                cumulative_sales=sqlalchemy.bindparam("running_sales"),
+                cumulative_total=sqlalchemy.bindparam("running_total"),
+            ),
+            [
+                {"day": day, "running_sales": sales, "running_total": total}
+                for day, _sales, _total, sales, total in daily_sales
+            ],
+        )
+    connection.execute(
+        sqlalchemy.delete(DailySaleWatermark).where(
+            DailySaleWatermark.tank_id == tank_id
+        )
+    )
+
+    return len(daily_sales)
+
+
+def _sale_deltas(
+    added: list[Sale], deleted: list[Sale]
+) -> dict[tuple[int, date], tuple[int, float]]:
+    # Aggregate the deltas of the sales per tank and day, but those cancelling out.
+    deltas: dict[tuple[int, date], tuple[int, float]] = {}
+    for sign, sales in ((1, added), (-1, deleted)):
+        for sale in sales:
+            key = (sale.tank_id, sale.created_at.date())
+            sales_delta, total_delta = deltas.get(key, (0, 0.0))
+            deltas[key] = (sales_delta + sign, total_delta + sign * sale.quantity)
+
+    return {key: delta for key, delta in deltas.items() if delta != (0, 0.0)}
+
+
+class DailySalesUpdater:
+    """Keep the daily sales of the tanks and their running sums up to date.
+
+    A sale changes the row of its day, running sums included. Sales on the
+    latest day of a tank, the usual case, have no later days, so the tank's
+    latest row, read once per batch, is all they need. Otherwise, the running
+    sums of the later days are left stale, and the tank's watermark is moved
+    back to the day after the sale, so a sale writes a single row. The
+    derivation worker settles them later.
+
+    Changes are left in the session, to be flushed and committed by the caller
+    with those of the other observers of the sales.
+    """
+
+    def __init__(self, session: Session):
+        self._session = session
+
+    def _last(self, tank_id: int, before: date | None = None) -> DailySale | None:
+        query = self._session.query(DailySale).filter(DailySale.tank_id == tank_id)
+        if before is not None:
+            query = query.filter(DailySale.date < before)
+        return query.order_by(col(DailySale.date).desc()).first()
+
+    def _mark_later_days(self, tank_id: int, day: date) -> None:
+        # Mark the running sums of the days after day stale.
+        next_day = day + timedelta(days=1)
+        watermark = self._session.get(DailySaleWatermark, tank_id)
+        if watermark is None:
+            self._session.add(DailySaleWatermark(tank_id=tank_id, date=next_day))
+        elif watermark.date > next_day:
+            watermark.date = next_day
+
+    def handle_added_sale(self, sale: Sale) -> None:
+        self.handle_sales(added=[sale], deleted=[])
+
+    def handle_deleted_sale(self, sale: Sale) -> None:
+        self.handle_sales(added=[], deleted=[sale])
+
+    def handle_sales(self, added: list[Sale], deleted: list[Sale]) -> None:
+        # Handle many added and deleted sales at once.
+        #
+        # The deltas of all sales are aggregated per tank and day, and applied in order
+        # of day.
+        deltas = _sale_deltas(added, deleted)
+        if not deltas:
+            return
+
+        existing = {
+            (entry.tank_id, entry.date): entry
+            for entry in self._session.query(DailySale).filter(
+                sqlalchemy.tuple_(col(DailySale.tank_id), col(DailySale.date)).in_(
+                    list(deltas)
+                )
+            )
+        }
+
+        for key, (sales_delta, total_delta) in deltas.items():
+            entry = existing.get(key)
+            if (entry.sales if entry else 0) + sales_delta < 0:
+                raise ValueError(
+                    f"Applying {(sales_delta, total_delta)} is "
+                    f"inconsistent with the existing {entry or key}."
+                )
+
+        latest = {tank_id: self._last(tank_id) for tank_id, _day in sorted(deltas)}
+
+        for (tank_id, day), (sales_delta, total_delta) in sorted(deltas.items()):
+            last = latest[tank_id]
+            entry = existing.get((tank_id, day))
+            if entry is None:
+                previous = (
+                    last
+                    if last is None or last.date < day
+                    else self._last(tank_id, day)
+                )
+                entry = DailySale(
+                    id=None,
+                    tank_id=tank_id,
+                    date=day,
+                    sales=0,
+                    total=0,
+                    cumulative_sales=previous.cumulative_sales if previous else 0,
+                    cumulative_total=previous.cumulative_total if previous else 0,
+                )
+
+            entry.sales += sales_delta
+            entry.total += total_delta
+            entry.cumulative_sales += sales_delta
+            entry.cumulative_total += total_delta
+
+            if entry.sales == 0:
+                if entry.id is not None:
+                    self._session.delete(entry)
+            else:
+                self._session.add(entry)
+
+            if last is not None and last.date > day:
+                self._mark_later_days(tank_id, day)
+            else:
+                # Emptied, it still has the running sums of the day before.
+                latest[tank_id] = entry
@@ -1,10 +1,24 @@
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
+from datetime import datetime
+from itertools import groupby
+from operator import attrgetter
 from typing import Protocol
 
-from sqlmodel import Session, asc, desc
+import numpy as np
+import sqlalchemy
+from sqlalchemy.orm import aliased
+from sqlmodel import Session, asc, desc, func
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from tanks.cache import TTLCache
 from tanks.models import TankVolume
+from tanks.sales_series import derive_sales
 from tanks.schemas import Sale
 
+# The newest volume of each tank, as of the last volume appended to it.
+LATEST_VOLUMES: TTLCache[int, TankVolume] = TTLCache(maxsize=10000, ttl=300.0)
+
 
 class SalesObserver(Protocol):
     def handle_added_sale(self, sale: Sale) -> None:
@@ -13,91 +27,421 @@ class SalesObserver(Protocol):
     def handle_deleted_sale(self, sale: Sale) -> None:
         ...  # pragma: no cover
 
+    def handle_sales(self, added: list[Sale], deleted: list[Sale]) -> None:
+        ...  # pragma: no cover
+
+
+class SalesObservers:
+    """Forward sales to several observers, in order.
+
+    The observers leave their changes in the session, and they're flushed at
+    once after all of them, to be committed together by the caller. If one
+    fails, the caller rolls back the changes of all, so they don't disagree.
+    """
+
+    def __init__(self, session: Session, *observers: SalesObserver):
+        self._session = session
+        self._observers = observers
+
+    def handle_added_sale(self, sale: Sale) -> None:
+        for observer in self._observers:
+            observer.handle_added_sale(sale)
+        self._session.flush()
+
+    def handle_deleted_sale(self, sale: Sale) -> None:
+        for observer in self._observers:
+            observer.handle_deleted_sale(sale)
+        self._session.flush()
+
+    def handle_sales(self, added: list[Sale], deleted: list[Sale]) -> None:
+        for observer in self._observers:
+            observer.handle_sales(added=added, deleted=deleted)
+        self._session.flush()
+
+
+def _neighbor_probe(tank_volume: TankVolume, previous: bool) -> sqlalchemy.sql.Select:
+    # Select the volume before or after the given one, in its tank.
+    #
+    # The probe follows ix_tankvolume_tank_id_created_at: it filters by tank_id, ranges
+    # and orders by created_at, and reads only indexed columns.
+    probe = sqlalchemy.select(TankVolume).where(
+        TankVolume.tank_id == tank_volume.tank_id
+    )
+    if previous:
+        probe = probe.where(TankVolume.created_at < tank_volume.created_at).order_by(
+            desc(TankVolume.tank_id), desc(TankVolume.created_at)
+        )
+    else:
+        probe = probe.where(TankVolume.created_at > tank_volume.created_at).order_by(
+            asc(TankVolume.tank_id), asc(TankVolume.created_at)
+        )
+    return probe.limit(1)
+
 
 def get_contiguous_volumes(
     session: Session, tank_volume: TankVolume
 ) -> tuple[TankVolume | None, TankVolume | None]:
-    query = session.query(TankVolume).filter_by(tank_id=tank_volume.tank_id)
-    previous_volume = (
-        query.filter(TankVolume.created_at < tank_volume.created_at)
-        .order_by(desc(TankVolume.created_at))
-        .limit(1)
-    ).first()
-
-    next_volume = (
-        query.filter(TankVolume.created_at > tank_volume.created_at)
-        .order_by(asc(TankVolume.created_at))
-        .limit(1)
-    ).first()
+    # Get the volumes before and after the given one, in its tank.
+    #
+    # Both probes run in a single query, as a UNION ALL.
+    probes = sqlalchemy.union_all(
+        sqlalchemy.select(_neighbor_probe(tank_volume, previous=True).subquery()),
+        sqlalchemy.select(_neighbor_probe(tank_volume, previous=False).subquery()),
+    ).subquery()
+    neighbors = session.query(aliased(TankVolume, probes)).all()
+
+    previous_volume = next(
+        (
+            neighbor
+            for neighbor in neighbors
+            if neighbor.created_at < tank_volume.created_at
+        ),
+        None,
+    )
+    next_volume = next(
+        (
+            neighbor
+            for neighbor in neighbors
+            if neighbor.created_at > tank_volume.created_at
+        ),
+        None,
+    )
 
     return (previous_volume, next_volume)
 
 
+def _newest_volumes_probe(tank_id: int, since: datetime) -> sqlalchemy.sql.Select:
+    # Select the two newest volumes of a tank since a time.
+    #
+    # The probe is a backward scan of ix_tankvolume_tank_id_created_at.
+    return (
+        sqlalchemy.select(TankVolume)
+        .where(TankVolume.tank_id == tank_id, TankVolume.created_at >= since)
+        .order_by(desc(TankVolume.tank_id), desc(TankVolume.created_at))
+        .limit(2)
+    )
+
+
+def get_appended_volume_previous(
+    session: Session, tank_volume: TankVolume, since: datetime
+) -> TankVolume | None:
+    # Get the volume before one appended to its tank, if it's since a time.
+    #
+    # None is returned unless the appended volume is the newest, with no next neighbor,
+    # and its previous volume is since then.
+    newest = (
+        session.execute(_newest_volumes_probe(tank_volume.tank_id, since))
+        .scalars()
+        .all()
+    )
+
+    if (
+        len(newest) < 2
+        or newest[0].id != tank_volume.id
+        or newest[1].created_at >= tank_volume.created_at
+    ):
+        return None
+
+    return newest[1]
+
+
+def get_contiguous_volumes_many(
+    session: Session, tank_id: int, created_ats: Sequence[datetime]
+) -> list[tuple[TankVolume | None, TankVolume | None]]:
+    # Get the volumes before and after each of the given times, in a tank.
+    #
+    # All neighbors are found with a single query, over the span of the times.
+    if not created_ats:
+        return []
+
+    span = get_volumes_span(
+        session=session, tank_id=tank_id, start=min(created_ats), end=max(created_ats)
+    )
+    span_created_ats = [tank_volume.created_at for tank_volume in span]
+
+    def neighbors(
+        created_at: datetime,
+    ) -> tuple[TankVolume | None, TankVolume | None]:
+        before = bisect_left(span_created_ats, created_at)
+        after = bisect_right(span_created_ats, created_at)
+        return (
+            span[before - 1] if before > 0 else None,
+            span[after] if after < len(span) else None,
+        )
+
+    return [neighbors(created_at) for created_at in created_ats]
+
+
+def get_volumes_span(
+    session: Session, tank_id: int, start: datetime, end: datetime
+) -> list[TankVolume]:
+    # Get a tank's volumes between start and end, sorted by creation time and id.
+    #
+    # The span is widened to include the last volume before start and the first volume
+    # after end, so that every volume in it has its neighbors at hand.
+    query = session.query(TankVolume).filter_by(tank_id=tank_id)
+    lower = (
+        sqlalchemy.select(func.max(TankVolume.created_at))
+        .where(TankVolume.tank_id == tank_id, TankVolume.created_at < start)
+        .scalar_subquery()
+    )
+    upper = (
+        sqlalchemy.select(func.min(TankVolume.created_at))
+        .where(TankVolume.tank_id == tank_id, TankVolume.created_at > end)
+        .scalar_subquery()
+    )
+    return (
+        query.filter(
+            TankVolume.created_at >= func.coalesce(lower, start),
+            TankVolume.created_at <= func.coalesce(upper, end),
+        )
+        .order_by(asc(TankVolume.created_at), asc(TankVolume.id))
+        .all()
+    )
+
+
+def get_sales(
+    consecutive_volumes: Sequence[tuple[TankVolume, TankVolume]]
+) -> list[Sale]:
+    # Get the sales between pairs of consecutive volumes.
+    #
+    # A sale is dated at the later volume of the pair.
+    return [
+        Sale(
+            tank_id=current.tank_id,
+            created_at=current.created_at,
+            quantity=current.volume - previous.volume,
+        )
+        for previous, current in consecutive_volumes
+        if previous.volume < current.volume
+    ]
+
+
+def _series_sales(tank_volumes: Sequence[TankVolume]) -> set[tuple[datetime, float]]:
+    # Get the dates and quantities of the sales of volumes sorted by date.
+    created_at, quantities = derive_sales(
+        np.array(
+            [tank_volume.created_at for tank_volume in tank_volumes],
+            dtype="datetime64[us]",
+        ),
+        np.array(
+            [tank_volume.volume for tank_volume in tank_volumes], dtype=np.float64
+        ),
+    )
+    return set(zip(created_at.tolist(), quantities.tolist()))
+
+
+def _to_sales(tank_id: int, sales: set[tuple[datetime, float]]) -> list[Sale]:
+    return [
+        Sale(tank_id=tank_id, created_at=created_at, quantity=quantity)
+        for created_at, quantity in sorted(sales)
+    ]
+
+
 class SalesMonitor:
-    def __init__(self, session: Session, avgsales_updater: SalesObserver):
+    """Derive the sales from changes of tank volumes.
+
+    The sales derived from each change are handled by the observer in one
+    batch, so it can apply them with one commit.
+    """
+
+    def __init__(
+        self,
+        session: Session,
+        avgsales_updater: SalesObserver,
+        latest_volumes: TTLCache[int, TankVolume] = LATEST_VOLUMES,
+    ):
         self._session = session
         self._sales_observable = avgsales_updater
+        self._latest_volumes = latest_volumes
 
-    def handle_added_tank_volume(self, tank_volume: TankVolume) -> None:
-        previous_volume, next_volume = get_contiguous_volumes(
-            session=self._session, tank_volume=tank_volume
-        )
+    def _remember_latest_volume(self, tank_volume: TankVolume) -> None:
+        # A detached copy, so it outlives the session.
+        self._latest_volumes.set(tank_volume.tank_id, TankVolume(**tank_volume.dict()))
 
-        def sale(value: float):
-            return Sale(
-                tank_id=tank_volume.tank_id,
-                created_at=tank_volume.created_at,
-                quantity=value,
-            )
+    def _handle_appended_tank_volume(self, tank_volume: TankVolume) -> bool:
+        # Handle a volume appended after the high-water mark of its tank.
+        #
+        # The mark is the latest volume known to the monitor, so detecting an append
+        # costs no query. Then a single query confirms it, and finds the previous
+        # volume, and at most one sale is added. Returns whether the volume was handled.
+        latest_volume = self._latest_volumes.get(tank_volume.tank_id)
+        if latest_volume is None or tank_volume.created_at <= latest_volume.created_at:
+            return False
 
-        if (
-            previous_volume
-            and next_volume
-            and previous_volume.volume < next_volume.volume
-        ):
-            value = next_volume.volume - previous_volume.volume
-            self._sales_observable.handle_deleted_sale(sale(value))
+        previous_volume = get_appended_volume_previous(
+            session=self._session,
+            tank_volume=tank_volume,
+            since=latest_volume.created_at,
+        )
+        if previous_volume is None:
+            return False
 
-        if previous_volume is not None and previous_volume.volume < tank_volume.volume:
-            value = tank_volume.volume - previous_volume.volume
-            self._sales_observable.handle_added_sale(sale(value))
+        added = []
+        if previous_volume.volume < tank_volume.volume:
+            added.append(
+                Sale(
+                    tank_id=tank_volume.tank_id,
+                    created_at=tank_volume.created_at,
+                    quantity=tank_volume.volume - previous_volume.volume,
+                )
+            )
+        self._sales_observable.handle_sales(added=added, deleted=[])
+        return True
 
-        if next_volume is not None and tank_volume.volume < next_volume.volume:
-            value = next_volume.volume - tank_volume.volume
-            self._sales_observable.handle_added_sale(sale(value))
+    def handle_added_tank_volume(self, tank_volume: TankVolume) -> None:
+        # Handle an added volume.
+        #
+        # Volumes appended in time order take a fast path. Others, backfilled in the
+        # middle of their tank's volumes, may also replace the sale between their
+        # neighbors.
+        if self._handle_appended_tank_volume(tank_volume):
+            self._remember_latest_volume(tank_volume)
+            return
 
-    def handle_deleted_tank_volume(self, tank_volume: TankVolume) -> None:
-        previous_volume, next_volume = get_contiguous_volumes(
+        neighbors = get_contiguous_volumes(
             session=self._session, tank_volume=tank_volume
         )
+        added: list[Sale] = []
+        deleted: list[Sale] = []
+        self._added_tank_volume_sales(
+            tank_volume, *neighbors, added=added, deleted=deleted
+        )
+        self._sales_observable.handle_sales(added=added, deleted=deleted)
 
-        def sale(value: float):
-            return Sale(
-                tank_id=tank_volume.tank_id,
-                created_at=tank_volume.created_at,
-                quantity=value,
-            )
+        if neighbors[1] is None:
+            self._remember_latest_volume(tank_volume)
 
-        if previous_volume and previous_volume.volume < tank_volume.volume:
-            value = tank_volume.volume - previous_volume.volume
-            self._sales_observable.handle_deleted_sale(sale(value))
+    def _added_tank_volume_sales(
+        self,
+        tank_volume: TankVolume,
+        previous_volume: TankVolume | None,
+        next_volume: TankVolume | None,
+        added: list[Sale],
+        deleted: list[Sale],
+    ) -> None:
+        if previous_volume is not None and next_volume is not None:
+            deleted += get_sales([(previous_volume, next_volume)])
+        if previous_volume is not None:
+            added += get_sales([(previous_volume, tank_volume)])
+        if next_volume is not None:
+            added += get_sales([(tank_volume, next_volume)])
 
-        if next_volume and tank_volume.volume < next_volume.volume:
-            value = next_volume.volume - tank_volume.volume
-            self._sales_observable.handle_deleted_sale(sale(value))
+    def handle_deleted_tank_volume(self, tank_volume: TankVolume) -> None:
+        self._latest_volumes.invalidate(tank_volume.tank_id)
+        added: list[Sale] = []
+        deleted: list[Sale] = []
+        self._deleted_tank_volume_sales(
+            tank_volume,
+            *get_contiguous_volumes(session=self._session, tank_volume=tank_volume),
+            added=added,
+            deleted=deleted,
+        )
+        self._sales_observable.handle_sales(added=added, deleted=deleted)
 
-        if (
-            previous_volume
-            and next_volume
-            and previous_volume.volume < next_volume.volume
-        ):
-            value = next_volume.volume - previous_volume.volume
-            self._sales_observable.handle_added_sale(sale(value))
+    def _deleted_tank_volume_sales(
+        self,
+        tank_volume: TankVolume,
+        previous_volume: TankVolume | None,
+        next_volume: TankVolume | None,
+        added: list[Sale],
+        deleted: list[Sale],
+    ) -> None:
+        if previous_volume is not None:
+            deleted += get_sales([(previous_volume, tank_volume)])
+        if next_volume is not None:
+            deleted += get_sales([(tank_volume, next_volume)])
+        if previous_volume is not None and next_volume is not None:
+            added += get_sales([(previous_volume, next_volume)])
 
     def handle_updated_tank_volume(
         self, new_tank_volume: TankVolume, old_volume: float
     ) -> None:
+        self._latest_volumes.invalidate(new_tank_volume.tank_id)
         old_tank_volume = TankVolume(**new_tank_volume.dict())
         old_tank_volume.volume = old_volume
-        self.handle_deleted_tank_volume(old_tank_volume)
-        self.handle_added_tank_volume(new_tank_volume)
+        # The update keeps created_at, so the old and new volumes share neighbors.
+        neighbors = get_contiguous_volumes(
+            session=self._session, tank_volume=new_tank_volume
+        )
+        added: list[Sale] = []
+        deleted: list[Sale] = []
+        self._deleted_tank_volume_sales(
+            old_tank_volume, *neighbors, added=added, deleted=deleted
+        )
+        self._added_tank_volume_sales(
+            new_tank_volume, *neighbors, added=added, deleted=deleted
+        )
+        self._sales_observable.handle_sales(added=added, deleted=deleted)
+
+    def handle_added_tank_volumes(self, tank_volumes: list[TankVolume]) -> None:
+        # Handle many added volumes, possibly of different tanks, at once.
+        #
+        # The volumes must already be flushed. The sales of each tank's span are derived
+        # with derive_sales, with and without the added volumes, and the differences are
+        # handled in one batch.
+        added: list[Sale] = []
+        deleted: list[Sale] = []
+
+        by_tank = attrgetter("tank_id")
+        for tank_id, group in groupby(sorted(tank_volumes, key=by_tank), key=by_tank):
+            tank_added = list(group)
+            added_ids = {tank_volume.id for tank_volume in tank_added}
+            span = get_volumes_span(
+                session=self._session,
+                tank_id=tank_id,
+                start=min(tank_volume.created_at for tank_volume in tank_added),
+                end=max(tank_volume.created_at for tank_volume in tank_added),
+            )
+            old_span = [
+                tank_volume for tank_volume in span if tank_volume.id not in added_ids
+            ]
+
+            # Volumes of a tank have distinct dates, so a sale is known by its date.
+            old_sales = _series_sales(old_span)
+            new_sales = _series_sales(span)
+            deleted += _to_sales(tank_id, old_sales - new_sales)
+            added += _to_sales(tank_id, new_sales - old_sales)
+
+            if span[-1].id in added_ids:
+                self._remember_latest_volume(span[-1])
+            else:
+                self._latest_volumes.invalidate(tank_id)
+
+        self._sales_observable.handle_sales(added=added, deleted=deleted)
+
+
+class AsyncSalesMonitor:
+    """An asyncio SalesMonitor, running its handlers on an AsyncSession.
+
+    The observer is called synchronously, so it must use the session's
+    sync_session.
+    """
+
+    def __init__(self, session: AsyncSession, avgsales_updater: SalesObserver):
+        self._session = session
+        self._sales_monitor = SalesMonitor(session.sync_session, avgsales_updater)
+
+    async def handle_added_tank_volume(self, tank_volume: TankVolume) -> None:
+        await self._session.run_sync(
+            lambda _session: self._sales_monitor.handle_added_tank_volume(tank_volume)
+        )
+
+    async def handle_deleted_tank_volume(self, tank_volume: TankVolume) -> None:
+        await self._session.run_sync(
+            lambda _session: self._sales_monitor.handle_deleted_tank_volume(tank_volume)
+        )
+
+    async def handle_updated_tank_volume(
+        self, new_tank_volume: TankVolume, old_volume: float
+    ) -> None:
+        await self._session.run_sync(
+            lambda _session: self._sales_monitor.handle_updated_tank_volume(
+                new_tank_volume=new_tank_volume, old_volume=old_volume
+            )
+        )
+
+    async def handle_added_tank_volumes(self, tank_volumes: list[TankVolume]) -> None:
+        await self._session.run_sync(
+            lambda _session: self._sales_monitor.handle_added_tank_volumes(tank_volumes)
+        )
@@ -0,0 +1,71 @@
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from tanks.models import TankVolume, VolumeChange
+
+
+class SalesOutbox:
+    """Record changes of tank volumes, for a worker to derive their sales.
+
+    It stands in for SalesMonitor. The changes are only added to the session,
+    to be committed with the volumes they record.
+    """
+
+    def __init__(self, session: Session):
+        self._session = session
+
+    def _record(self, tank_volumes: list[TankVolume]) -> None:
+        self._session.add_all(
+            VolumeChange(
+                id=None, tank_id=tank_volume.tank_id, created_at=tank_volume.created_at
+            )
+            for tank_volume in tank_volumes
+        )
+        self._session.flush()
+
+    def handle_added_tank_volume(self, tank_volume: TankVolume) -> None:
+        self._record([tank_volume])
+
+    def handle_deleted_tank_volume(self, tank_volume: TankVolume) -> None:
+        self._record([tank_volume])
+
+    def handle_updated_tank_volume(  # pylint: disable=unused-argument
+        self, new_tank_volume: TankVolume, old_volume: float
+    ) -> None:
+        # The old volume isn't recorded, as the sales are derived again anyway.
+        self._record([new_tank_volume])
+
+    def handle_added_tank_volumes(self, tank_volumes: list[TankVolume]) -> None:
+        self._record(tank_volumes)
+
+
+class AsyncSalesOutbox:
+    """An asyncio SalesOutbox, recording changes on an AsyncSession."""
+
+    def __init__(self, session: AsyncSession):
+        self._session = session
+        self._sales_outbox = SalesOutbox(session.sync_session)
+
+    async def handle_added_tank_volume(self, tank_volume: TankVolume) -> None:
+        await self._session.run_sync(
+            lambda _session: self._sales_outbox.handle_added_tank_volume(tank_volume)
+        )
+
+    async def handle_deleted_tank_volume(self, tank_volume: TankVolume) -> None:
+        await self._session.run_sync(
+            lambda _session: self._sales_outbox.handle_deleted_tank_volume(tank_volume)
+        )
+
+    async def handle_updated_tank_volume(
+        self, new_tank_volume: TankVolume, old_volume: float
+    ) -> None:
+        await self._session.run_sync(
+            lambda _session: self._sales_outbox.handle_updated_tank_volume(
+                new_tank_volume=new_tank_volume, old_volume=old_volume
+            )
+        )
+
+    async def handle_added_tank_volumes(self, tank_volumes: list[TankVolume]) -> None:
+        await self._session.run_sync(
+            lambda _session: self._sales_outbox.handle_added_tank_volumes(tank_volumes)
+        )
@@ -0,0 +1,161 @@
+from collections.abc import Iterable
+from datetime import datetime, timedelta
+
+import sqlalchemy
+from sqlmodel import Session, col
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from tanks.models import HourlyVolume, TankVolume
+from tanks.sql import hour_of
+
+HOURLY_VOLUME_COLUMNS = (
+    "tank_id",
+    "hour",
+    "count",
+    "min_volume",
+    "max_volume",
+    "total_volume",
+    "last_volume",
+)
+
+
+def _truncate_hour(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _hourly_volumes(
+    tank_id: int, lower: datetime, upper: datetime
+) -> sqlalchemy.sql.Select:
+    # Select the hourly volumes of a tank from lower until before upper.
+    #
+    # Their columns are HOURLY_VOLUME_COLUMNS, and they're aggregated from the volumes
+    # in one statement.
+    hour = hour_of(TankVolume.created_at)
+    volumes = (
+        sqlalchemy.select(
+            hour.label("hour"),
+            TankVolume.volume,
+            sqlalchemy.func.row_number()
+            .over(
+                partition_by=hour,
+                order_by=(col(TankVolume.created_at).desc(), col(TankVolume.id).desc()),
+            )
+            .label("recency"),
+        )
+        .where(
+            TankVolume.tank_id == tank_id,
+            TankVolume.created_at >= lower,
+            TankVolume.created_at < upper,
+        )
+        .subquery()
+    )
+
+    return sqlalchemy.select(
+        sqlalchemy.literal(tank_id),
+        volumes.c.hour,
+        sqlalchemy.func.count(),
+        sqlalchemy.func.min(volumes.c.volume),
+        sqlalchemy.func.max(volumes.c.volume),
+        sqlalchemy.func.sum(volumes.c.volume),
+        sqlalchemy.func.max(
+            sqlalchemy.case(
+                (volumes.c.recency == 1, volumes.c.volume),
+            )
+        ),
+    ).group_by(volumes.c.hour)
+
+
+def compute_hourly_volumes(
+    connection: sqlalchemy.engine.Connection,
+    tank_id: int,
+    start: datetime,
+    end: datetime,
+) -> list[tuple[datetime, int, float, float, float, float]]:
+    # Compute the hourly volumes of a tank, from the hour of start to end's.
+    #
+    # Returns the hours with volumes, with their count, minimum, maximum, total and last
+    # volumes.
+    lower = _truncate_hour(start)
+    upper = _truncate_hour(end) + timedelta(hours=1)
+
+    return [
+        (hour, count, minimum, maximum, total, last)
+        for _tank_id, hour, count, minimum, maximum, total, last in connection.execute(
+            _hourly_volumes(tank_id, lower, upper).order_by("hour")
+        )
+    ]
+
+
+def refresh_hourly_volumes(
+    connection: sqlalchemy.engine.Connection,
+    tank_id: int,
+    start: datetime,
+    end: datetime,
+) -> None:
+    # Rebuild the hourly volumes of a tank, from the hour of start to end's.
+    #
+    # Rebuilding them whole, rather than applying deltas, keeps the minimum and maximum
+    # right when volumes are deleted or updated.
+    lower = _truncate_hour(start)
+    upper = _truncate_hour(end) + timedelta(hours=1)
+
+    connection.execute(
+        sqlalchemy.delete(HourlyVolume).where(
+            HourlyVolume.tank_id == tank_id,
+            HourlyVolume.hour >= lower,
+            HourlyVolume.hour < upper,
+        )
+    )
+    connection.execute(
+        sqlalchemy.insert(HourlyVolume).from_select(
+            HOURLY_VOLUME_COLUMNS, _hourly_volumes(tank_id, lower, upper)
+        )
+    )
+
+
+class VolumeRollupUpdater:  # pylint: disable=too-few-public-methods
+    """Keep the hourly volumes up to date with the volumes.
+
+    Changes are only flushed, to be committed by the caller, so the volumes
+    handed to it aren't expired.
+    """
+
+    def __init__(self, session: Session):
+        self._session = session
+
+    def handle_changed_tank_volumes(self, tank_volumes: Iterable[TankVolume]) -> None:
+        # Rebuild the hours of volumes added, updated or deleted.
+        #
+        # The hours are rebuilt in one span per tank.
+        spans: dict[int, tuple[datetime, datetime]] = {}
+        for tank_volume in tank_volumes:
+            start, end = spans.get(
+                tank_volume.tank_id, (tank_volume.created_at, tank_volume.created_at)
+            )
+            spans[tank_volume.tank_id] = (
+                min(start, tank_volume.created_at),
+                max(end, tank_volume.created_at),
+            )
+
+        # The rollup is rebuilt from the database, so pending volumes go first.
+        self._session.flush()
+        connection = self._session.connection()
+        for tank_id, (start, end) in spans.items():
+            refresh_hourly_volumes(connection, tank_id, start, end)
+
+
+class AsyncVolumeRollupUpdater:  # pylint: disable=too-few-public-methods
+    """An asyncio VolumeRollupUpdater, running its updates on an AsyncSession."""
+
+    def __init__(self, session: AsyncSession):
+        self._session = session
+        self._volume_rollup = VolumeRollupUpdater(session.sync_session)
+
+    async def handle_changed_tank_volumes(
+        self, tank_volumes: Iterable[TankVolume]
+    ) -> None:
+        await self._session.run_sync(
+            lambda _session: self._volume_rollup.handle_changed_tank_volumes(
+                tank_volumes
+            )
+        )
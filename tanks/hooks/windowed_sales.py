@@ -0,0 +1,229 @@
+from collections.abc import Sequence
+from datetime import datetime, timedelta
+from typing import Any
+
+import numpy as np
+import sqlalchemy
+from sqlmodel import Session, col
+
+from tanks.models import SalesWindow, WindowedSale
+from tanks.sales_series import (
+    derive_windowed_sales,
+    get_next_created_at,
+    get_volume_series,
+)
+from tanks.schemas import Sale
+from tanks.windows import bucket_of, window_offsets, window_span
+
+WINDOWED_SALE_COLUMNS = ("window_id", "start", "sales", "total", "updated_at")
+
+
+def _window_ranges(
+    connection: sqlalchemy.engine.Connection,
+    tank_id: int,
+    windows: Sequence[Any],
+    first_created_at: datetime,
+    last_created_at: datetime,
+) -> dict[int, tuple[datetime, datetime, timedelta]]:
+    # Get the start, end and span of the windowed sales of each window that changes
+    # of volumes in a span affect.
+    last_sale_created_at = (
+        get_next_created_at(connection, tank_id, last_created_at) or last_created_at
+    )
+    return {
+        window_id: (
+            bucket_of(calendar, first_created_at),
+            bucket_of(calendar, last_sale_created_at) + window_span(calendar, length),
+            window_span(calendar, length),
+        )
+        for window_id, calendar, length in windows
+    }
+
+
+def _derive_windowed_sales(
+    created_at: np.ndarray,
+    volumes: np.ndarray,
+    calendar: str,
+    length: int,
+    start: datetime,
+    end: datetime,
+) -> list[tuple[datetime, int, float]]:
+    starts, sales, totals = derive_windowed_sales(
+        created_at, volumes, calendar, length, start, end
+    )
+    return list(zip(starts.tolist(), sales.tolist(), totals.tolist()))
+
+
+def compute_windowed_sales(
+    connection: sqlalchemy.engine.Connection,
+    tank_id: int,
+    first_created_at: datetime,
+    last_created_at: datetime,
+) -> list[tuple[int, datetime, datetime, list[tuple[datetime, int, float]]]]:
+    # Compute the windowed sales of a tank that changes of volumes in a span affect.
+    #
+    # In each window, they span from the bucket of the first change to the windows of
+    # the sale of the volume following the last one. The volumes are read once for all
+    # the windows of the tank.
+    #
+    # Returns each window with the start and end of its span, and its windowed sales in
+    # it.
+    windows = connection.execute(
+        sqlalchemy.select(SalesWindow.id, SalesWindow.calendar, SalesWindow.length)
+        .where(SalesWindow.tank_id == tank_id)
+        .order_by(SalesWindow.id)
+    ).all()
+    if not windows:
+        return []
+
+    ranges = _window_ranges(
+        connection, tank_id, windows, first_created_at, last_created_at
+    )
+    created_at, volumes = get_volume_series(
+        connection,
+        tank_id,
+        min(start - span for start, _end, span in ranges.values()).date(),
+        max(end for _start, end, _span in ranges.values()).date(),
+    )
+
+    windowed_sales = []
+    for window_id, calendar, length in windows:
+        start, end, _span = ranges[window_id]
+        windowed_sales.append(
+            (
+                window_id,
+                start,
+                end,
+                _derive_windowed_sales(
+                    created_at, volumes, calendar, length, start, end
+                ),
+            )
+        )
+
+    return windowed_sales
+
+
+def rebuild_windowed_sales(
+    connection: sqlalchemy.engine.Connection,
+    tank_id: int,
+    first_created_at: datetime,
+    last_created_at: datetime,
+) -> int:
+    # Rebuild the windowed sales of a tank that changes of volumes in a span affect.
+    #
+    # See compute_windowed_sales for the span. Returns the number of windowed sales
+    # written.
+    now = datetime.utcnow()
+    written = 0
+    for window_id, start, end, rows in compute_windowed_sales(
+        connection, tank_id, first_created_at, last_created_at
+    ):
+        connection.execute(
+            sqlalchemy.delete(WindowedSale).where(
+                WindowedSale.window_id == window_id,
+                WindowedSale.start >= start,
+                WindowedSale.start <= end,
+            )
+        )
+        if not rows:
+            continue
+
+        connection.execute(
+            sqlalchemy.insert(WindowedSale),
+            [dict(zip(WINDOWED_SALE_COLUMNS, (window_id, *row, now))) for row in rows],
+        )
+        written += len(rows)
+
+    return written
+
+
+class WindowedSalesUpdater:
+    """Keep the windowed sales of the tanks' sales windows up to date with the sales.
+
+    Each sale is applied to all the windows of its tank in a single pass, with
+    the offsets of each window computed once per calendar and length.
+
+    Changes are left in the session, to be flushed and committed by the caller
+    with those of the other observers of the sales.
+    """
+
+    def __init__(self, session: Session):
+        self._session = session
+
+    def _window_deltas(
+        self, added: list[Sale], deleted: list[Sale]
+    ) -> dict[tuple[int, datetime], tuple[int, float]]:
+        tank_ids = {sale.tank_id for sale in (*added, *deleted)}
+        if not tank_ids:
+            return {}
+
+        windows: dict[int, list[SalesWindow]] = {}
+        for window in self._session.query(SalesWindow).filter(
+            col(SalesWindow.tank_id).in_(tank_ids)
+        ):
+            windows.setdefault(window.tank_id, []).append(window)
+
+        deltas: dict[tuple[int, datetime], tuple[int, float]] = {}
+        for sign, sales in ((1, added), (-1, deleted)):
+            for sale in sales:
+                for window in windows.get(sale.tank_id, []):
+                    bucket = bucket_of(window.calendar, sale.created_at)
+                    for offset in window_offsets(window.calendar, window.length):
+                        key = (window.id, bucket + offset)
+                        sales_delta, total_delta = deltas.get(key, (0, 0.0))
+                        deltas[key] = (
+                            sales_delta + sign,
+                            total_delta + sign * sale.quantity,
+                        )
+
+        return deltas
+
+    def handle_added_sale(self, sale: Sale) -> None:
+        self.handle_sales(added=[sale], deleted=[])
+
+    def handle_deleted_sale(self, sale: Sale) -> None:
+        self.handle_sales(added=[], deleted=[sale])
+
+    def handle_sales(self, added: list[Sale], deleted: list[Sale]) -> None:
+        # Handle many added and deleted sales at once.
+        #
+        # The deltas of all sales are aggregated per window and bucket, so each affected
+        # WindowedSale row is loaded and written once.
+        deltas = self._window_deltas(added=added, deleted=deleted)
+        if not deltas:
+            return
+
+        existing = {
+            (entry.window_id, entry.start): entry
+            for entry in self._session.query(WindowedSale).filter(
+                sqlalchemy.tuple_(
+                    col(WindowedSale.window_id), col(WindowedSale.start)
+                ).in_(list(deltas))
+            )
+        }
+
+        entries = [
+            existing.get(key)
+            or WindowedSale(id=None, window_id=key[0], start=key[1], sales=0, total=0)
+            for key in deltas
+        ]
+
+        for entry in entries:
+            sales_delta, _total_delta = deltas[(entry.window_id, entry.start)]
+            if entry.sales + sales_delta < 0:
+                raise ValueError(
+                    f"Applying {deltas[(entry.window_id, entry.start)]} is "
+                    f"inconsistent with the existing {entry}."
+                )
+
+        for entry in entries:
+            sales_delta, total_delta = deltas[(entry.window_id, entry.start)]
+            entry.sales += sales_delta
+            entry.total += total_delta
+
+            if entry.sales == 0:
+                if entry.id is not None:
+                    self._session.delete(entry)
+                continue
+
+            self._session.add(entry)
@@ -0,0 +1,77 @@
+"""
+Serialize the changes of each tank across processes and nodes.
+"""
+from collections.abc import Iterable
+
+import sqlalchemy
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+# The first key of the advisory locks of tanks, so they don't clash with others.
+TANK_LOCKS = 0x74616E6B
+
+# The dialects with advisory locks. SQLite serializes writing transactions.
+LOCKING_DIALECTS = ("postgresql",)
+
+# The key of the tanks a session locks in its info.
+LOCKED_TANKS = "locked_tanks"
+
+
+def _lock_tanks(
+    connection: sqlalchemy.engine.Connection,
+    tank_ids: list[int],
+    lock: str = "pg_advisory_xact_lock",
+) -> None:
+    # Take Postgres' advisory locks of tanks, of a transaction by default.
+    for tank_id in tank_ids:
+        connection.execute(
+            sqlalchemy.select(getattr(sqlalchemy.func, lock)(TANK_LOCKS, tank_id))
+        )
+
+
+def lock_tanks(
+    connection: sqlalchemy.engine.Connection, tank_ids: Iterable[int]
+) -> None:
+    # Lock tanks until the end of the connection's transaction.
+    #
+    # While a transaction holds the lock of a tank, others changing the tank wait for it
+    # to end, so its derived data is read and written by one at a time. Different tanks
+    # proceed in parallel. Locks are taken in order of tank id, so transactions locking
+    # many tanks don't deadlock.
+    #
+    # Only Postgres is locked. SQLite serializes writing transactions anyway.
+    if connection.dialect.name in LOCKING_DIALECTS:
+        _lock_tanks(connection, sorted(set(tank_ids)))
+
+
+def lock_session_tanks(session: Session, tank_ids: Iterable[int]) -> None:
+    # Lock tanks until the session is closed and unlocked by unlock_session_tanks.
+    #
+    # Outside a unit of work, a change is committed before its sales are derived, so the
+    # locks are Postgres' session-level ones, which outlast the commits. They're held by
+    # the session's connection, so the session must be bound to a connection of its own,
+    # as get_session's are.
+    connection = session.connection()
+    if connection.dialect.name not in LOCKING_DIALECTS:
+        return
+
+    locked_tanks = session.info.setdefault(LOCKED_TANKS, set())
+    tank_ids = set(tank_ids) - locked_tanks
+    _lock_tanks(connection, sorted(tank_ids), lock="pg_advisory_lock")
+    locked_tanks.update(tank_ids)
+
+
+def unlock_session_tanks(
+    connection: sqlalchemy.engine.Connection, session: Session
+) -> None:
+    # Unlock the tanks a closed session locked on its connection.
+    #
+    # The connection is the session's own, so all its advisory locks are released.
+    if session.info.pop(LOCKED_TANKS, None):
+        connection.execute(sqlalchemy.select(sqlalchemy.func.pg_advisory_unlock_all()))
+
+
+async def lock_tanks_async(session: AsyncSession, tank_ids: Iterable[int]) -> None:
+    await session.run_sync(
+        lambda sync_session: lock_session_tanks(sync_session, tank_ids)
+    )
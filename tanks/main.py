@@ -2,19 +2,51 @@ from fastapi import FastAPI
 from fastapi.responses import JSONResponse
 from sqlalchemy.exc import NoResultFound
 
+from .bulk_import import InvalidImport
+from .crud import InvalidCursor
 from .dependencies import get_settings
-from .routers.tank_volumes import router as tank_volumes_router
-from .routers.tanksr import router as tanks_router
+from .routers import (
+    average_sales,
+    average_sales_async,
+    sales_windows,
+    sales_windows_async,
+    tank_volumes,
+    tank_volumes_async,
+    tanksr,
+    tanksr_async,
+)
 
 
 def handle_not_found(_request, _exc):
     return JSONResponse(content={"message": "Item not found."}, status_code=404)
 
 
+def handle_invalid_cursor(_request, _exc):
+    return JSONResponse(content={"message": "Invalid cursor."}, status_code=400)
+
+
+def handle_invalid_import(_request, exc):
+    return JSONResponse(content={"message": str(exc)}, status_code=400)
+
+
 def create_app():
-    get_settings()
+    settings = get_settings()
     app = FastAPI()
-    app.include_router(tanks_router)
-    app.include_router(tank_volumes_router)
+    # The average sales routes go first, so /tanks/average-sales isn't taken
+    # for a tank.
+    if settings.database_async:
+        app.include_router(average_sales_async.router)
+        app.include_router(tanksr_async.router)
+        app.include_router(tank_volumes_async.router)
+        app.include_router(tank_volumes_async.batch_router)
+        app.include_router(sales_windows_async.router)
+    else:
+        app.include_router(average_sales.router)
+        app.include_router(tanksr.router)
+        app.include_router(tank_volumes.router)
+        app.include_router(tank_volumes.batch_router)
+        app.include_router(sales_windows.router)
     app.add_exception_handler(NoResultFound, handle_not_found)
+    app.add_exception_handler(InvalidCursor, handle_invalid_cursor)
+    app.add_exception_handler(InvalidImport, handle_invalid_import)
     return app
@@ -1,5 +1,6 @@
 import datetime
 
+import sqlalchemy
 from sqlmodel import Field, SQLModel
 
 from .schemas import BaseTank, BaseTankVolume
@@ -10,18 +11,172 @@ class Tank(SQLModel, BaseTank, table=True):
 
 
 class TankVolume(SQLModel, BaseTankVolume, table=True):
+    __table_args__ = (
+        # Covers the neighbors lookups, so Postgres can run them as index-only scans.
+        sqlalchemy.Index(
+            "ix_tankvolume_tank_id_created_at",
+            "tank_id",
+            "created_at",
+            postgresql_include=["id", "volume", "updated_at"],
+        ),
+    )
+
     id: int | None = Field(primary_key=True)
     tank_id: int = Field(foreign_key=Tank.id)
     created_at: datetime.datetime = Field(index=True)
+    updated_at: datetime.datetime = Field(
+        default_factory=datetime.datetime.utcnow,
+        sa_column_kwargs={"onupdate": datetime.datetime.utcnow},
+        index=True,
+    )
+
+
+class TankVolumeDeletion(SQLModel, table=True):
+    """A deleted volume of a tank.
+
+    Deleted volumes leave no updated_at behind, so this is how changes since a
+    time find the tanks that lost volumes.
+    """
+
+    id: int | None = Field(primary_key=True)
+    tank_id: int = Field(foreign_key=Tank.id)
+    created_at: datetime.datetime
+    deleted_at: datetime.datetime = Field(
+        default_factory=datetime.datetime.utcnow, index=True
+    )
 
 
 class AverageSale(SQLModel, table=True):
+    __table_args__ = (
+        sqlalchemy.Index("ix_averagesale_tank_id_date", "tank_id", "date", unique=True),
+    )
+
     id: int | None = Field(primary_key=True)
     tank_id: int = Field(foreign_key=Tank.id)
     date: datetime.date
     sales: int
     total: float
+    updated_at: datetime.datetime = Field(
+        default_factory=datetime.datetime.utcnow,
+        sa_column_kwargs={"onupdate": datetime.datetime.utcnow},
+        index=True,
+    )
+
+    @property
+    def average(self) -> float:
+        return self.total / self.sales
+
+
+class AverageSaleDeletion(SQLModel, table=True):
+    """The last deletion of average sales of a tank.
+
+    Deleted rows leave no updated_at behind, so the last modification of the
+    average sales of a tank is the latest of their updates and this.
+    """
+
+    tank_id: int = Field(foreign_key=Tank.id, primary_key=True)
+    deleted_at: datetime.datetime
+
+
+class HourlyVolume(SQLModel, table=True):
+    """The volumes of a tank aggregated per hour, for downsampled series."""
+
+    __table_args__ = (
+        sqlalchemy.Index(
+            "ix_hourlyvolume_tank_id_hour", "tank_id", "hour", unique=True
+        ),
+    )
+
+    id: int | None = Field(primary_key=True)
+    tank_id: int = Field(foreign_key=Tank.id)
+    hour: datetime.datetime
+    count: int
+    min_volume: float
+    max_volume: float
+    total_volume: float
+    last_volume: float
+
+
+class VolumeChange(SQLModel, table=True):
+    """A change of the volumes of a tank, whose sales are yet to be derived."""
+
+    id: int | None = Field(primary_key=True)
+    tank_id: int = Field(foreign_key=Tank.id)
+    created_at: datetime.datetime
+
+
+class SalesWindow(SQLModel, table=True):
+    """A window the sales of a tank are averaged over, besides the average sales.
+
+    See tanks.windows for its calendar and length.
+    """
+
+    __table_args__ = (
+        sqlalchemy.Index(
+            "ix_saleswindow_tank_id_calendar_length",
+            "tank_id",
+            "calendar",
+            "length",
+            unique=True,
+        ),
+    )
+
+    id: int | None = Field(primary_key=True)
+    tank_id: int = Field(foreign_key=Tank.id)
+    calendar: str
+    length: int
+
+
+class WindowedSale(SQLModel, table=True):
+    """The sales of a sales window, in its window ending at the bucket of start."""
+
+    __table_args__ = (
+        sqlalchemy.Index(
+            "ix_windowedsale_window_id_start", "window_id", "start", unique=True
+        ),
+    )
+
+    id: int | None = Field(primary_key=True)
+    window_id: int = Field(foreign_key=SalesWindow.id)
+    start: datetime.datetime
+    sales: int
+    total: float
+    updated_at: datetime.datetime = Field(
+        default_factory=datetime.datetime.utcnow,
+        sa_column_kwargs={"onupdate": datetime.datetime.utcnow},
+    )
 
     @property
     def average(self) -> float:
         return self.total / self.sales
+
+
+class DailySale(SQLModel, table=True):
+    """The sales of a tank on a day, with their running sums up to the day.
+
+    The sales between two days are the difference of their running sums.
+    """
+
+    __table_args__ = (
+        sqlalchemy.Index("ix_dailysale_tank_id_date", "tank_id", "date", unique=True),
+    )
+
+    id: int | None = Field(primary_key=True)
+    tank_id: int = Field(foreign_key=Tank.id)
+    date: datetime.date
+    sales: int
+    total: float
+    cumulative_sales: int
+    cumulative_total: float
+
+
+class DailySaleWatermark(SQLModel, table=True):
+    """The first day of a tank whose daily running sums are stale.
+
+    Sales before the latest day of their tank leave the running sums of the
+    later days as they are. Those are worked out on read instead, from the
+    running sums of the day before the watermark, until they're rebuilt.
+    """
+
+    tank_id: int = Field(foreign_key=Tank.id, primary_key=True)
+    date: datetime.date
@@ -0,0 +1,194 @@
+import hashlib
+from datetime import date, datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Annotated
+
+import sqlalchemy
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from sqlmodel import Session as SyncSession
+from sqlmodel import col
+
+from ..dependencies import Session
+from ..hooks.daily_sales import get_running_sums
+from ..models import AverageSale, AverageSaleDeletion
+from ..schemas import AverageSaleRead, SalesRead
+
+router = APIRouter(prefix="/tanks")
+
+Weekday = Annotated[int | None, Query(ge=0, le=6)]
+
+
+def _statement(
+    tank_ids: list[int] | None,
+    start: date | None,
+    end: date | None,
+    weekday: int | None,
+) -> sqlalchemy.sql.Select:
+    statement = sqlalchemy.select(AverageSale)
+
+    if tank_ids is not None:
+        statement = statement.where(col(AverageSale.tank_id).in_(tank_ids))
+    if start is not None:
+        statement = statement.where(AverageSale.date >= start)
+    if end is not None:
+        statement = statement.where(AverageSale.date <= end)
+    if weekday is not None:
+        # The day of week is numbered from Sunday, as in SQL, but weekday from
+        # Monday, as in date.weekday().
+        statement = statement.where(
+            sqlalchemy.extract("dow", AverageSale.date) == (weekday + 1) % 7
+        )
+
+    return statement
+
+
+def _validators(
+    session: SyncSession, statement: sqlalchemy.sql.Select, tank_ids: list[int] | None
+) -> tuple[str, datetime | None]:
+    # Get the ETag and Last-Modified of the selected averages.
+    #
+    # They're derived from an aggregate over the selection, without loading it. Any
+    # update or deletion changes the latest update, the count or the sums. Deleted
+    # averages aren't in the selection, so Last-Modified also accounts for the last
+    # deletion of averages of the selected tanks.
+    selection = statement.subquery()
+    count, last_updated, sales, total = session.execute(
+        sqlalchemy.select(
+            sqlalchemy.func.count(),
+            sqlalchemy.func.max(selection.c.updated_at),
+            sqlalchemy.func.sum(selection.c.sales),
+            sqlalchemy.func.sum(selection.c.total),
+        )
+    ).one()
+
+    digest = hashlib.sha1(
+        repr((count, last_updated, sales, total)).encode(), usedforsecurity=False
+    ).hexdigest()
+
+    if last_updated is None:
+        return f'"{digest}"', None
+
+    deletions = sqlalchemy.select(sqlalchemy.func.max(AverageSaleDeletion.deleted_at))
+    if tank_ids is not None:
+        deletions = deletions.where(col(AverageSaleDeletion.tank_id).in_(tank_ids))
+    last_deleted = session.execute(deletions).scalar()
+
+    return f'"{digest}"', max(last_updated, last_deleted or last_updated)
+
+
+def _is_not_modified(
+    request: Request, etag: str, last_modified: datetime | None
+) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+
+    return last_modified.replace(microsecond=0, tzinfo=timezone.utc) <= since
+
+
+def get_average_sales(
+    session: SyncSession,
+    request: Request,
+    response: Response,
+    tank_ids: list[int] | None = None,
+    start: date | None = None,
+    end: date | None = None,
+    weekday: int | None = None,
+) -> list[AverageSaleRead]:
+    # Get the maintained averages, or raise a 304 if the client's copy is fresh.
+    statement = _statement(tank_ids=tank_ids, start=start, end=end, weekday=weekday)
+    etag, last_modified = _validators(session, statement, tank_ids)
+
+    response.headers["ETag"] = etag
+    if last_modified is not None:
+        response.headers["Last-Modified"] = format_datetime(
+            last_modified.replace(tzinfo=timezone.utc), usegmt=True
+        )
+
+    if _is_not_modified(request, etag, last_modified):
+        raise HTTPException(status_code=304, headers=dict(response.headers))
+
+    return [
+        AverageSaleRead(
+            tank_id=average_sale.tank_id,
+            date=average_sale.date,
+            sales=average_sale.sales,
+            total=average_sale.total,
+            average=average_sale.average,
+        )
+        for average_sale in session.execute(
+            statement.order_by(AverageSale.tank_id, AverageSale.date)
+        ).scalars()
+    ]
+
+
+def get_sales(session: SyncSession, tank_id: int, start: date, end: date) -> SalesRead:
+    # Get the sales of a tank from start to end, whatever the window.
+    #
+    # They're the difference of the running sums up to end and up to the day before
+    # start, so any window costs two index lookups, and a sum of the days with stale
+    # running sums, if any.
+    if start > end:
+        raise HTTPException(status_code=400, detail="start is after end")
+
+    connection = session.connection()
+    end_sales, end_total = get_running_sums(connection, tank_id, end)
+    start_sales, start_total = get_running_sums(
+        connection, tank_id, start - timedelta(days=1)
+    )
+    sales, total = end_sales - start_sales, end_total - start_total
+
+    return SalesRead(
+        tank_id=tank_id,
+        start=start,
+        end=end,
+        sales=sales,
+        total=total,
+        average=total / sales if sales else None,
+    )
+
+
+@router.get("/average-sales")
+def get_many_tanks(
+    session: Session,
+    request: Request,
+    response: Response,
+    tank_id: Annotated[list[int] | None, Query()] = None,
+    start: date | None = None,
+    end: date | None = None,
+    weekday: Weekday = None,
+) -> list[AverageSaleRead]:
+    return get_average_sales(session, request, response, tank_id, start, end, weekday)
+
+
+@router.get("/{tank_id}/average-sales")
+def get_one_tank(
+    session: Session,
+    request: Request,
+    response: Response,
+    tank_id: int,
+    start: date | None = None,
+    end: date | None = None,
+    weekday: Weekday = None,
+) -> list[AverageSaleRead]:
+    return get_average_sales(session, request, response, [tank_id], start, end, weekday)
+
+
+@router.get("/{tank_id}/sales")
+def get_one_tank_sales(
+    session: Session, tank_id: int, start: date, end: date
+) -> SalesRead:
+    return get_sales(session, tank_id, start, end)
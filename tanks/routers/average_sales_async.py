@@ -0,0 +1,53 @@
+from datetime import date
+from typing import Annotated
+
+from fastapi import APIRouter, Query, Request, Response
+
+from ..dependencies import AsyncSession
+from ..schemas import AverageSaleRead, SalesRead
+from .average_sales import Weekday, get_average_sales, get_sales
+
+router = APIRouter(prefix="/tanks")
+
+
+@router.get("/average-sales")
+async def get_many_tanks(
+    session: AsyncSession,
+    request: Request,
+    response: Response,
+    tank_id: Annotated[list[int] | None, Query()] = None,
+    start: date | None = None,
+    end: date | None = None,
+    weekday: Weekday = None,
+) -> list[AverageSaleRead]:
+    return await session.run_sync(
+        lambda sync_session: get_average_sales(
+            sync_session, request, response, tank_id, start, end, weekday
+        )
+    )
+
+
+@router.get("/{tank_id}/average-sales")
+async def get_one_tank(
+    session: AsyncSession,
+    request: Request,
+    response: Response,
+    tank_id: int,
+    start: date | None = None,
+    end: date | None = None,
+    weekday: Weekday = None,
+) -> list[AverageSaleRead]:
+    return await session.run_sync(
+        lambda sync_session: get_average_sales(
+            sync_session, request, response, [tank_id], start, end, weekday
+        )
+    )
+
+
+@router.get("/{tank_id}/sales")
+async def get_one_tank_sales(
+    session: AsyncSession, tank_id: int, start: date, end: date
+) -> SalesRead:
+    return await session.run_sync(
+        lambda sync_session: get_sales(sync_session, tank_id, start, end)
+    )
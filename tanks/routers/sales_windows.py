@@ -0,0 +1,137 @@
+from datetime import datetime
+
+import sqlalchemy
+from fastapi import APIRouter, HTTPException
+from sqlmodel import Session as SyncSession
+
+from ..dependencies import Session
+from ..hooks.windowed_sales import rebuild_windowed_sales
+from ..locks import lock_tanks
+from ..models import SalesWindow, TankVolume, WindowedSale
+from ..schemas import BaseSalesWindow, WindowedSaleRead
+from .tanksr import check_tank
+
+router = APIRouter(prefix="/tanks/{tank_id}/sales-windows")
+
+
+def create_sales_window(
+    session: SyncSession, tank_id: int, sales_window: BaseSalesWindow
+) -> SalesWindow:
+    # Create a sales window of a tank, with its windowed sales so far.
+    check_tank(session, tank_id)
+    lock_tanks(session.connection(), [tank_id])
+
+    if (
+        session.query(SalesWindow.id)
+        .filter_by(tank_id=tank_id, **sales_window.dict())
+        .first()
+        is not None
+    ):
+        raise HTTPException(status_code=409, detail="Sales window already exists")
+
+    created_sales_window = SalesWindow(id=None, tank_id=tank_id, **sales_window.dict())
+    session.add(created_sales_window)
+    session.flush()
+
+    first_created_at, last_created_at = (
+        session.query(
+            sqlalchemy.func.min(TankVolume.created_at),
+            sqlalchemy.func.max(TankVolume.created_at),
+        )
+        .filter_by(tank_id=tank_id)
+        .one()
+    )
+    if first_created_at is not None:
+        rebuild_windowed_sales(
+            session.connection(), tank_id, first_created_at, last_created_at
+        )
+
+    session.commit()
+    session.refresh(created_sales_window)
+    return created_sales_window
+
+
+def get_sales_windows(session: SyncSession, tank_id: int) -> list[SalesWindow]:
+    return (
+        session.query(SalesWindow)
+        .filter_by(tank_id=tank_id)
+        .order_by(SalesWindow.id)
+        .all()
+    )
+
+
+def get_sales_window(session: SyncSession, tank_id: int, window_id: int) -> SalesWindow:
+    # Get a sales window of a tank, or raise NoResultFound.
+    return session.query(SalesWindow).filter_by(id=window_id, tank_id=tank_id).one()
+
+
+def delete_sales_window(session: SyncSession, tank_id: int, window_id: int) -> None:
+    sales_window = get_sales_window(session, tank_id, window_id)
+    session.query(WindowedSale).filter_by(window_id=window_id).delete()
+    session.delete(sales_window)
+    session.commit()
+
+
+def get_windowed_sales(
+    session: SyncSession,
+    tank_id: int,
+    window_id: int,
+    start: datetime | None = None,
+    end: datetime | None = None,
+) -> list[WindowedSaleRead]:
+    # Get the windowed sales of a sales window, by the start of their bucket.
+    get_sales_window(session, tank_id, window_id)
+
+    statement = sqlalchemy.select(WindowedSale).where(
+        WindowedSale.window_id == window_id
+    )
+    if start is not None:
+        statement = statement.where(WindowedSale.start >= start)
+    if end is not None:
+        statement = statement.where(WindowedSale.start <= end)
+
+    return [
+        WindowedSaleRead(
+            window_id=windowed_sale.window_id,
+            start=windowed_sale.start,
+            sales=windowed_sale.sales,
+            total=windowed_sale.total,
+            average=windowed_sale.average,
+        )
+        for windowed_sale in session.execute(
+            statement.order_by(WindowedSale.start)
+        ).scalars()
+    ]
+
+
+@router.post("/", status_code=201)
+def create(
+    session: Session, tank_id: int, sales_window: BaseSalesWindow
+) -> SalesWindow:
+    return create_sales_window(session, tank_id, sales_window)
+
+
+@router.get("/")
+def get_many(session: Session, tank_id: int) -> list[SalesWindow]:
+    return get_sales_windows(session, tank_id)
+
+
+@router.get("/{window_id}")
+def get_one(session: Session, tank_id: int, window_id: int) -> SalesWindow:
+    return get_sales_window(session, tank_id, window_id)
+
+
+@router.delete("/{window_id}", status_code=204)
+def delete(session: Session, tank_id: int, window_id: int):
+    delete_sales_window(session, tank_id, window_id)
+
+
+@router.get("/{window_id}/sales")
+def get_sales(
+    session: Session,
+    tank_id: int,
+    window_id: int,
+    start: datetime | None = None,
+    end: datetime | None = None,
+) -> list[WindowedSaleRead]:
+    return get_windowed_sales(session, tank_id, window_id, start=start, end=end)
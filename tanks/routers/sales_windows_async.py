@@ -0,0 +1,61 @@
+from datetime import datetime
+
+from fastapi import APIRouter
+
+from ..dependencies import AsyncSession
+from ..models import SalesWindow
+from ..schemas import BaseSalesWindow, WindowedSaleRead
+from .sales_windows import (
+    create_sales_window,
+    delete_sales_window,
+    get_sales_window,
+    get_sales_windows,
+    get_windowed_sales,
+)
+
+router = APIRouter(prefix="/tanks/{tank_id}/sales-windows")
+
+
+@router.post("/", status_code=201)
+async def create(
+    session: AsyncSession, tank_id: int, sales_window: BaseSalesWindow
+) -> SalesWindow:
+    return await session.run_sync(
+        lambda sync_session: create_sales_window(sync_session, tank_id, sales_window)
+    )
+
+
+@router.get("/")
+async def get_many(session: AsyncSession, tank_id: int) -> list[SalesWindow]:
+    return await session.run_sync(
+        lambda sync_session: get_sales_windows(sync_session, tank_id)
+    )
+
+
+@router.get("/{window_id}")
+async def get_one(session: AsyncSession, tank_id: int, window_id: int) -> SalesWindow:
+    return await session.run_sync(
+        lambda sync_session: get_sales_window(sync_session, tank_id, window_id)
+    )
+
+
+@router.delete("/{window_id}", status_code=204)
+async def delete(session: AsyncSession, tank_id: int, window_id: int):
+    await session.run_sync(
+        lambda sync_session: delete_sales_window(sync_session, tank_id, window_id)
+    )
+
+
+@router.get("/{window_id}/sales")
+async def get_sales(
+    session: AsyncSession,
+    tank_id: int,
+    window_id: int,
+    start: datetime | None = None,
+    end: datetime | None = None,
+) -> list[WindowedSaleRead]:
+    return await session.run_sync(
+        lambda sync_session: get_windowed_sales(
+            sync_session, tank_id, window_id, start=start, end=end
+        )
+    )
@@ -1,21 +1,53 @@
+import io
 import logging
+import tempfile
+from collections import Counter
 from datetime import datetime
+from typing import Annotated, Any
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session as SyncSession
+from sqlmodel import col, select, tuple_
 
-from ..crud import CollectionResource, SQLModelCRUD
-from ..dependencies import SalesMonitor, Session
-from ..models import TankVolume
-from ..schemas import BaseTankVolume, TankVolumePatch
+from ..buckets import buckets_statement, read_buckets
+from ..bulk_import import ImportResult, InvalidImport, import_volumes
+from ..crud import CollectionResource, Order, SQLModelCRUD, TotalMode
+from ..dependencies import SalesMonitor, Session, UnitOfWork, VolumeRollup
+from ..export import (
+    MEDIA_TYPES,
+    ExportFormat,
+    accepts_gzip,
+    encode,
+    export_statement,
+    gzip,
+)
+from ..locks import lock_session_tanks
+from ..models import TankVolume, TankVolumeDeletion
+from ..schemas import BaseTankVolume, TankVolumePatch, TankVolumeReading, VolumeBucket
+from .tanksr import check_tank
 
 router = APIRouter(prefix="/tanks/{tank_id}/volumes")
 
+batch_router = APIRouter(prefix="/tanks/volumes")
+
 logging.basicConfig(level=logging.ERROR)
 
 _LOGGER = logging.getLogger(__name__)
 
 
-def _handle_handler_error(err: ValueError):
+def _handle_handler_error(err: ValueError, unit_of_work: bool = False):
+    # Reject the change within a unit of work, which is rolled back, or log.
+    #
+    # Otherwise, the change is already committed, and the sales derived from it are
+    # rolled back.
+    if unit_of_work:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Tank volume change is inconsistent with the sales: {err}",
+        ) from err
+
     _LOGGER.error(
         "Tank volume changes handlers raises error: \n"
         "   %s\n"
@@ -25,47 +57,280 @@ def _handle_handler_error(err: ValueError):
     )
 
 
+def _created_between(start: datetime | None, end: datetime | None) -> list[Any]:
+    # Get the conditions selecting volumes created from start until before end.
+    #
+    # With the tank's equality filter, they're range scans of the (tank_id, created_at)
+    # index.
+    conditions = []
+    if start is not None:
+        conditions.append(TankVolume.created_at >= start)
+    if end is not None:
+        conditions.append(TankVolume.created_at < end)
+    return conditions
+
+
+def _new_tank_volume(tank_id: int, tank_volume: BaseTankVolume) -> TankVolume:
+    return TankVolume(
+        id=None,
+        tank_id=tank_id,
+        created_at=datetime.utcnow(),
+        volume=tank_volume.volume,
+    )
+
+
 def crud(session: Session) -> SQLModelCRUD[TankVolume, BaseTankVolume]:
-    return SQLModelCRUD[TankVolume, BaseTankVolume](session, TankVolume)
+    return SQLModelCRUD[TankVolume, BaseTankVolume](
+        session, TankVolume, keyset=(TankVolume.created_at, TankVolume.id)
+    )
 
 
 @router.post("/", status_code=201)
 def create(
     session: Session,
     sales_monitor: SalesMonitor,
+    volume_rollup: VolumeRollup,
+    unit_of_work: UnitOfWork,
     tank_id: int,
     tank_volume: BaseTankVolume,
 ) -> TankVolume:
+    check_tank(session, tank_id)
+    lock_session_tanks(session, [tank_id])
     created_tank_volume = crud(session).create(
+        _new_tank_volume(tank_id, tank_volume), commit=False
+    )
+    volume_rollup.handle_changed_tank_volumes([created_tank_volume])
+    if not unit_of_work:
+        session.commit()
+
+    try:
+        sales_monitor.handle_added_tank_volume(created_tank_volume)
+    except ValueError as err:
+        session.rollback()
+        _handle_handler_error(err, unit_of_work)
+
+    session.commit()
+
+    return created_tank_volume
+
+
+def _reading_volumes(readings: list[TankVolumeReading]) -> list[TankVolume]:
+    # Get the volumes of readings, rejecting readings of a tank at one time.
+    #
+    # Readings without a time are taken now, so a tank can have one of them. Volumes of
+    # a tank at the same time have no order to derive sales from.
+    now = datetime.utcnow()
+    tank_volumes = [
         TankVolume(
             id=None,
-            tank_id=tank_id,
-            created_at=datetime.now(),
-            volume=tank_volume.volume,
+            tank_id=reading.tank_id,
+            created_at=reading.created_at or now,
+            volume=reading.volume,
         )
+        for reading in readings
+    ]
+
+    times = Counter(
+        (tank_volume.tank_id, tank_volume.created_at) for tank_volume in tank_volumes
     )
+    duplicated = sorted(time for time, count in times.items() if count > 1)
+    if duplicated:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Readings of a tank must have distinct times: {duplicated}",
+        )
 
-    sales_monitor.handle_added_tank_volume(created_tank_volume)
+    return tank_volumes
 
-    return created_tank_volume
+
+def _check_stored_times(session: SyncSession, tank_volumes: list[TankVolume]) -> None:
+    # Reject volumes at the time of a stored volume of their tank.
+    stored = session.execute(
+        select(TankVolume.tank_id, TankVolume.created_at).where(
+            tuple_(col(TankVolume.tank_id), col(TankVolume.created_at)).in_(
+                [
+                    (tank_volume.tank_id, tank_volume.created_at)
+                    for tank_volume in tank_volumes
+                ]
+            )
+        )
+    ).all()
+    if stored:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Tanks already have volumes at: {sorted(map(tuple, stored))}",
+        )
+
+
+@batch_router.post("/batch", status_code=201)
+def create_many(
+    session: Session,
+    sales_monitor: SalesMonitor,
+    volume_rollup: VolumeRollup,
+    unit_of_work: UnitOfWork,
+    readings: list[TankVolumeReading],
+) -> list[TankVolume]:
+    tank_ids = sorted({reading.tank_id for reading in readings})
+    for tank_id in tank_ids:
+        check_tank(session, tank_id)
+    lock_session_tanks(session, tank_ids)
+
+    tank_volumes = _reading_volumes(readings)
+    _check_stored_times(session, tank_volumes)
+    session.add_all(tank_volumes)
+    session.flush()
+    volume_rollup.handle_changed_tank_volumes(tank_volumes)
+    if not unit_of_work:
+        session.commit()
+
+    try:
+        sales_monitor.handle_added_tank_volumes(tank_volumes)
+    except ValueError as err:
+        session.rollback()
+        _handle_handler_error(err, unit_of_work)
+
+    session.commit()
+
+    return tank_volumes
+
+
+def _export_headers(
+    tank_id: int, export_format: ExportFormat, compressed: bool
+) -> dict[str, str]:
+    headers = {
+        "Content-Disposition": (
+            f'attachment; filename="tank-{tank_id}-volumes.{export_format.value}"'
+        )
+    }
+    if compressed:
+        headers["Content-Encoding"] = "gzip"
+    return headers
+
+
+@router.get("/export")
+def export(
+    session: Session,
+    tank_id: int,
+    export_format: Annotated[ExportFormat, Query(alias="format")] = ExportFormat.NDJSON,
+    from_: Annotated[datetime | None, Query(alias="from")] = None,
+    to_: Annotated[datetime | None, Query(alias="to")] = None,
+    accept_encoding: Annotated[str | None, Header()] = None,
+) -> StreamingResponse:
+    # Stream the volumes of a tank from a server-side cursor, by date.
+    #
+    # The stream is gzipped if the client accepts it.
+    partitions = session.execute(export_statement(tank_id, from_, to_)).partitions()
+    chunks = encode(partitions, export_format)
+
+    compressed = accepts_gzip(accept_encoding)
+    if compressed:
+        chunks = gzip(chunks)
+
+    return StreamingResponse(
+        chunks,
+        media_type=MEDIA_TYPES[export_format],
+        headers=_export_headers(tank_id, export_format, compressed),
+    )
+
+
+@router.get("/buckets")
+def get_buckets(
+    session: Session,
+    tank_id: int,
+    bucket: Annotated[int, Query(gt=0)] = 3600,
+    from_: Annotated[datetime | None, Query(alias="from")] = None,
+    to_: Annotated[datetime | None, Query(alias="to")] = None,
+) -> list[VolumeBucket]:
+    # Get the volumes of a tank downsampled into buckets of seconds.
+    #
+    # Each bucket has the count, minimum, maximum, average and last volume.
+    return read_buckets(session.execute(buckets_statement(tank_id, bucket, from_, to_)))
+
+
+# Imported files bigger than this are spooled to disk.
+IMPORT_SPOOL_SIZE = 16 * 1024 * 1024
+
+
+async def _spool(request: Request) -> tempfile.SpooledTemporaryFile:
+    # Spool the request's body, so it can be read by blocking code.
+    #
+    # The caller owns the spooled file, and closes it.
+    # pylint: disable-next=consider-using-with
+    body = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_SIZE)
+    async for chunk in request.stream():
+        body.write(chunk)
+    body.seek(0)
+    return body
+
+
+def _import_csv(session: Session, body: tempfile.SpooledTemporaryFile) -> ImportResult:
+    try:
+        with io.TextIOWrapper(body, encoding="utf-8", newline="") as file:
+            result = import_volumes(session.connection(), file)
+    except InvalidImport:
+        session.rollback()
+        raise
+
+    session.commit()
+    return result
+
+
+@batch_router.post("/import", status_code=201)
+async def import_csv(session: Session, request: Request) -> ImportResult:
+    # Import volumes from a CSV body, and derive their average sales at once.
+    #
+    # The route is asynchronous to stream the body, and imports it in a thread.
+    body = await _spool(request)
+    return await run_in_threadpool(_import_csv, session, body)
 
 
 @router.get("/{tank_volume_id}")
 def get_one(session: Session, tank_volume_id: int, tank_id: int) -> TankVolume:
     tank_volume = crud(session).get_one(tank_volume_id)
 
-    if tank_volume.id != tank_id:
+    if tank_volume.tank_id != tank_id:
         raise HTTPException(status_code=404, detail="Item not found")
 
     return tank_volume
 
 
+def get_tank_volumes(
+    session: SyncSession,
+    tank_id: int,
+    limit: int,
+    offset: int = 0,
+    cursor: str | None = None,
+    total: TotalMode | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    order: Order = Order.ASC,
+) -> CollectionResource[TankVolume]:
+    # Get a page of the volumes of a tank, created from start until before end.
+    return crud(session).get_many(
+        limit=limit,
+        offset=offset,
+        filters={TankVolume.tank_id: tank_id},
+        cursor=cursor,
+        total=total,
+        conditions=_created_between(start, end),
+        order=order,
+    )
+
+
 @router.get("/")
 def get_many(
-    session: Session, tank_id: int, offset: int, limit: int
+    session: Session,
+    tank_id: int,
+    limit: int,
+    offset: int = 0,
+    cursor: str | None = None,
+    total: TotalMode | None = None,
+    from_: Annotated[datetime | None, Query(alias="from")] = None,
+    to_: Annotated[datetime | None, Query(alias="to")] = None,
+    order: Order = Order.ASC,
 ) -> CollectionResource[TankVolume]:
-    return crud(session).get_many(
-        offset=offset, limit=limit, filters={TankVolume.tank_id: tank_id}
+    return get_tank_volumes(
+        session, tank_id, limit, offset, cursor, total, from_, to_, order
     )
 
 
@@ -76,7 +341,11 @@ def update(
     tank_volume_id: int,
     patch: TankVolumePatch,
     sales_monitor: SalesMonitor,
+    volume_rollup: VolumeRollup,
+    unit_of_work: UnitOfWork,
 ) -> TankVolume:
+    lock_session_tanks(session, [tank_id])
+
     tank_volume = session.query(TankVolume).filter_by(id=tank_volume_id).one()
     if tank_volume.tank_id != tank_id:
         raise HTTPException(status_code=404, detail="Item not found")
@@ -84,15 +353,21 @@ def update(
     old_volume = tank_volume.volume
 
     tank_volume.volume = patch.volume
-    session.commit()
-    session.refresh(tank_volume)
+    session.flush()
+    volume_rollup.handle_changed_tank_volumes([tank_volume])
+    if not unit_of_work:
+        session.commit()
+        session.refresh(tank_volume)
 
     try:
         sales_monitor.handle_updated_tank_volume(
             new_tank_volume=tank_volume, old_volume=old_volume
         )
     except ValueError as err:
-        _handle_handler_error(err)
+        session.rollback()
+        _handle_handler_error(err, unit_of_work)
+
+    session.commit()
 
     return tank_volume
 
@@ -103,15 +378,27 @@ def delete(
     tank_id: int,
     tank_volume_id: int,
     sales_monitor: SalesMonitor,
+    volume_rollup: VolumeRollup,
+    unit_of_work: UnitOfWork,
 ):
+    lock_session_tanks(session, [tank_id])
+
     tank_volume = session.query(TankVolume).filter_by(id=tank_volume_id).one()
     if tank_volume.tank_id != tank_id:
         raise HTTPException(status_code=404, detail="Item not found")
 
     session.query(TankVolume).filter_by(id=tank_volume_id).delete()
-    session.commit()
+    session.add(
+        TankVolumeDeletion(id=None, tank_id=tank_id, created_at=tank_volume.created_at)
+    )
+    volume_rollup.handle_changed_tank_volumes([tank_volume])
+    if not unit_of_work:
+        session.commit()
 
     try:
         sales_monitor.handle_deleted_tank_volume(tank_volume)
     except ValueError as err:
-        _handle_handler_error(err)
+        session.rollback()
+        _handle_handler_error(err, unit_of_work)
+
+    session.commit()
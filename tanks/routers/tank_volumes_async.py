@@ -0,0 +1,259 @@
+from collections.abc import AsyncIterator
+from datetime import datetime
+from typing import Annotated, Any, cast
+
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from ..buckets import buckets_statement, read_buckets
+from ..bulk_import import ImportResult
+from ..crud import AsyncSQLModelCRUD, CollectionResource, Order, TotalMode
+from ..dependencies import (
+    AsyncSalesMonitor,
+    AsyncSession,
+    AsyncVolumeRollup,
+    UnitOfWork,
+)
+from ..export import (
+    MEDIA_TYPES,
+    ExportFormat,
+    accepts_gzip,
+    encode_async,
+    export_statement,
+    gzip_async,
+)
+from ..locks import lock_tanks_async
+from ..models import TankVolume, TankVolumeDeletion
+from ..schemas import BaseTankVolume, TankVolumePatch, TankVolumeReading, VolumeBucket
+from .tank_volumes import (
+    _check_stored_times,
+    _export_headers,
+    _handle_handler_error,
+    _import_csv,
+    _new_tank_volume,
+    _reading_volumes,
+    _spool,
+    get_tank_volumes,
+)
+from .tanksr_async import check_tank
+
+router = APIRouter(prefix="/tanks/{tank_id}/volumes")
+
+batch_router = APIRouter(prefix="/tanks/volumes")
+
+
+def crud(session: AsyncSession) -> AsyncSQLModelCRUD[TankVolume, BaseTankVolume]:
+    return AsyncSQLModelCRUD[TankVolume, BaseTankVolume](
+        session, TankVolume, keyset=(TankVolume.created_at, TankVolume.id)
+    )
+
+
+@router.post("/", status_code=201)
+async def create(
+    session: AsyncSession,
+    sales_monitor: AsyncSalesMonitor,
+    volume_rollup: AsyncVolumeRollup,
+    unit_of_work: UnitOfWork,
+    tank_id: int,
+    tank_volume: BaseTankVolume,
+) -> TankVolume:
+    await check_tank(session, tank_id)
+    await lock_tanks_async(session, [tank_id])
+    created_tank_volume = await crud(session).create(
+        _new_tank_volume(tank_id, tank_volume), commit=False
+    )
+    await volume_rollup.handle_changed_tank_volumes([created_tank_volume])
+    if not unit_of_work:
+        await session.commit()
+
+    try:
+        await sales_monitor.handle_added_tank_volume(created_tank_volume)
+    except ValueError as err:
+        await session.rollback()
+        _handle_handler_error(err, unit_of_work)
+        # The rollback expires the committed volume, which can't load lazily.
+        await session.refresh(created_tank_volume)
+
+    await session.commit()
+
+    return created_tank_volume
+
+
+@batch_router.post("/batch", status_code=201)
+async def create_many(
+    session: AsyncSession,
+    sales_monitor: AsyncSalesMonitor,
+    volume_rollup: AsyncVolumeRollup,
+    unit_of_work: UnitOfWork,
+    readings: list[TankVolumeReading],
+) -> list[TankVolume]:
+    tank_ids = sorted({reading.tank_id for reading in readings})
+    for tank_id in tank_ids:
+        await check_tank(session, tank_id)
+    await lock_tanks_async(session, tank_ids)
+
+    tank_volumes = _reading_volumes(readings)
+    await session.run_sync(_check_stored_times, tank_volumes)
+    session.add_all(tank_volumes)
+    await session.flush()
+    await volume_rollup.handle_changed_tank_volumes(tank_volumes)
+    if not unit_of_work:
+        await session.commit()
+
+    try:
+        await sales_monitor.handle_added_tank_volumes(tank_volumes)
+    except ValueError as err:
+        await session.rollback()
+        _handle_handler_error(err, unit_of_work)
+        for tank_volume in tank_volumes:
+            await session.refresh(tank_volume)
+
+    await session.commit()
+
+    return tank_volumes
+
+
+@router.get("/export")
+async def export(
+    session: AsyncSession,
+    tank_id: int,
+    export_format: Annotated[ExportFormat, Query(alias="format")] = ExportFormat.NDJSON,
+    from_: Annotated[datetime | None, Query(alias="from")] = None,
+    to_: Annotated[datetime | None, Query(alias="to")] = None,
+    accept_encoding: Annotated[str | None, Header()] = None,
+) -> StreamingResponse:
+    result = await session.stream(export_statement(tank_id, from_, to_))
+    # An async generator, which the stubs type as a coroutine.
+    partitions = cast(AsyncIterator[list[Any]], result.partitions())
+    chunks = encode_async(partitions, export_format)
+
+    compressed = accepts_gzip(accept_encoding)
+    if compressed:
+        chunks = gzip_async(chunks)
+
+    return StreamingResponse(
+        chunks,
+        media_type=MEDIA_TYPES[export_format],
+        headers=_export_headers(tank_id, export_format, compressed),
+    )
+
+
+@router.get("/buckets")
+async def get_buckets(
+    session: AsyncSession,
+    tank_id: int,
+    bucket: Annotated[int, Query(gt=0)] = 3600,
+    from_: Annotated[datetime | None, Query(alias="from")] = None,
+    to_: Annotated[datetime | None, Query(alias="to")] = None,
+) -> list[VolumeBucket]:
+    return read_buckets(
+        await session.execute(buckets_statement(tank_id, bucket, from_, to_))
+    )
+
+
+@batch_router.post("/import", status_code=201)
+async def import_csv(session: AsyncSession, request: Request) -> ImportResult:
+    body = await _spool(request)
+    return await session.run_sync(lambda sync_session: _import_csv(sync_session, body))
+
+
+@router.get("/{tank_volume_id}")
+async def get_one(
+    session: AsyncSession, tank_volume_id: int, tank_id: int
+) -> TankVolume:
+    tank_volume = await crud(session).get_one(tank_volume_id)
+
+    if tank_volume.tank_id != tank_id:
+        raise HTTPException(status_code=404, detail="Item not found")
+
+    return tank_volume
+
+
+@router.get("/")
+async def get_many(
+    session: AsyncSession,
+    tank_id: int,
+    limit: int,
+    offset: int = 0,
+    cursor: str | None = None,
+    total: TotalMode | None = None,
+    from_: Annotated[datetime | None, Query(alias="from")] = None,
+    to_: Annotated[datetime | None, Query(alias="to")] = None,
+    order: Order = Order.ASC,
+) -> CollectionResource[TankVolume]:
+    return await session.run_sync(
+        lambda sync_session: get_tank_volumes(
+            sync_session, tank_id, limit, offset, cursor, total, from_, to_, order
+        )
+    )
+
+
+@router.patch("/{tank_volume_id}")
+async def update(
+    session: AsyncSession,
+    tank_id: int,
+    tank_volume_id: int,
+    patch: TankVolumePatch,
+    sales_monitor: AsyncSalesMonitor,
+    volume_rollup: AsyncVolumeRollup,
+    unit_of_work: UnitOfWork,
+) -> TankVolume:
+    await lock_tanks_async(session, [tank_id])
+
+    tank_volume = await crud(session).get_one(tank_volume_id)
+    if tank_volume.tank_id != tank_id:
+        raise HTTPException(status_code=404, detail="Item not found")
+
+    old_volume = tank_volume.volume
+
+    tank_volume.volume = patch.volume
+    await session.flush()
+    await volume_rollup.handle_changed_tank_volumes([tank_volume])
+    if not unit_of_work:
+        await session.commit()
+        await session.refresh(tank_volume)
+
+    try:
+        await sales_monitor.handle_updated_tank_volume(
+            new_tank_volume=tank_volume, old_volume=old_volume
+        )
+    except ValueError as err:
+        await session.rollback()
+        _handle_handler_error(err, unit_of_work)
+        await session.refresh(tank_volume)
+
+    await session.commit()
+
+    return tank_volume
+
+
+@router.delete("/{tank_volume_id}", status_code=204)
+async def delete(
+    session: AsyncSession,
+    tank_id: int,
+    tank_volume_id: int,
+    sales_monitor: AsyncSalesMonitor,
+    volume_rollup: AsyncVolumeRollup,
+    unit_of_work: UnitOfWork,
+):
+    await lock_tanks_async(session, [tank_id])
+
+    tank_volume = await crud(session).get_one(tank_volume_id)
+    if tank_volume.tank_id != tank_id:
+        raise HTTPException(status_code=404, detail="Item not found")
+
+    await crud(session).delete(tank_volume_id)
+    session.add(
+        TankVolumeDeletion(id=None, tank_id=tank_id, created_at=tank_volume.created_at)
+    )
+    await volume_rollup.handle_changed_tank_volumes([tank_volume])
+    if not unit_of_work:
+        await session.commit()
+
+    try:
+        await sales_monitor.handle_deleted_tank_volume(tank_volume)
+    except ValueError as err:
+        await session.rollback()
+        _handle_handler_error(err, unit_of_work)
+
+    await session.commit()
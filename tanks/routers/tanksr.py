@@ -1,13 +1,29 @@
 import sqlalchemy
 from fastapi import APIRouter
 
-from ..crud import CollectionResource, SQLModelCRUD
+from ..cache import TTLCache
+from ..crud import CollectionResource, SQLModelCRUD, TotalMode
 from ..dependencies import Session
 from ..models import Tank
 from ..schemas import BaseTank
 
 router = APIRouter(prefix="/tanks")
 
+# The tanks known to exist, so volume writes needn't look them up. Missing tanks
+# aren't cached, so tanks created meanwhile are found.
+KNOWN_TANKS: TTLCache[int, bool] = TTLCache(maxsize=10000, ttl=300.0)
+
+
+def check_tank(session: Session, tank_id: int) -> None:
+    # Raise NoResultFound unless the tank exists.
+    if KNOWN_TANKS.get(tank_id):
+        return
+
+    if session.query(Tank.id).filter_by(id=tank_id).first() is None:
+        raise sqlalchemy.exc.NoResultFound()
+
+    KNOWN_TANKS.set(tank_id, True)
+
 
 def crud(session: Session) -> SQLModelCRUD[Tank, BaseTank]:
     return SQLModelCRUD[Tank, BaseTank](session, Tank)
@@ -24,27 +40,30 @@ def get_one(session: Session, tank_id: int) -> Tank:
 
 
 @router.get("/")
-def get_many(session: Session, offset: int, limit: int) -> CollectionResource[Tank]:
-    return crud(session).get_many(offset=offset, limit=limit)
+def get_many(
+    session: Session,
+    limit: int,
+    offset: int = 0,
+    cursor: str | None = None,
+    total: TotalMode | None = None,
+) -> CollectionResource[Tank]:
+    return crud(session).get_many(
+        limit=limit, offset=offset, cursor=cursor, total=total
+    )
 
 
 @router.put("/{tank_id}")
 def update(session: Session, tank_id: int, tank: BaseTank) -> Tank:
-    deleted_rows = session.query(Tank).filter_by(id=tank_id).delete()
-
-    if deleted_rows == 0:
-        raise sqlalchemy.exc.NoResultFound()
-
-    tank = Tank(id=tank_id, **tank.dict())
-    session.add(tank)
-    session.commit()
-
-    return tank
+    KNOWN_TANKS.invalidate(tank_id)
+    return crud(session).update(tank_id, tank)
 
 
 @router.delete("/{tank_id}", status_code=204)
 def delete(session: Session, tank_id: int):
+    KNOWN_TANKS.invalidate(tank_id)
     deleted_rows = session.query(Tank).filter_by(id=tank_id).delete()
 
     if deleted_rows == 0:
         raise sqlalchemy.exc.NoResultFound()
+
+    session.commit()
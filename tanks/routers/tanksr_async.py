@@ -0,0 +1,54 @@
+from fastapi import APIRouter
+
+from ..crud import AsyncSQLModelCRUD, CollectionResource, TotalMode
+from ..dependencies import AsyncSession
+from ..models import Tank
+from ..schemas import BaseTank
+from .tanksr import KNOWN_TANKS
+from .tanksr import check_tank as check_tank_sync
+
+router = APIRouter(prefix="/tanks")
+
+
+async def check_tank(session: AsyncSession, tank_id: int) -> None:
+    await session.run_sync(lambda sync_session: check_tank_sync(sync_session, tank_id))
+
+
+def crud(session: AsyncSession) -> AsyncSQLModelCRUD[Tank, BaseTank]:
+    return AsyncSQLModelCRUD[Tank, BaseTank](session, Tank)
+
+
+@router.post("/", status_code=201)
+async def create(session: AsyncSession, tank: BaseTank) -> Tank:
+    return await crud(session).create(tank)
+
+
+@router.get("/{tank_id}")
+async def get_one(session: AsyncSession, tank_id: int) -> Tank:
+    return await crud(session).get_one(tank_id)
+
+
+@router.get("/")
+async def get_many(
+    session: AsyncSession,
+    limit: int,
+    offset: int = 0,
+    cursor: str | None = None,
+    total: TotalMode | None = None,
+) -> CollectionResource[Tank]:
+    return await crud(session).get_many(
+        limit=limit, offset=offset, cursor=cursor, total=total
+    )
+
+
+@router.put("/{tank_id}")
+async def update(session: AsyncSession, tank_id: int, tank: BaseTank) -> Tank:
+    KNOWN_TANKS.invalidate(tank_id)
+    return await crud(session).update(tank_id, tank)
+
+
+@router.delete("/{tank_id}", status_code=204)
+async def delete(session: AsyncSession, tank_id: int):
+    KNOWN_TANKS.invalidate(tank_id)
+    await crud(session).delete(tank_id)
+    await session.commit()
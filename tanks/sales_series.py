@@ -0,0 +1,168 @@
+"""
+Derive the sales and average sales of a tank from its volume series, with NumPy.
+"""
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import sqlalchemy
+
+from .hooks.avgsales_updater import AvgSalesUpdater
+from .models import TankVolume
+from .windows import CALENDARS, bucket_of
+
+WINDOW_WEEKS = AvgSalesUpdater.window_weeks
+
+
+def get_volume_series(
+    connection: sqlalchemy.engine.Connection, tank_id: int, start: date, end: date
+) -> tuple[np.ndarray, np.ndarray]:
+    # Read the dates and volumes of a tank from start to end, in order.
+    #
+    # The volume preceding start is included, so the first sale of the range isn't
+    # missed. On Postgres, the volumes are read from ix_tankvolume_tank_id_created_at
+    # alone.
+    lower = datetime.combine(start, datetime.min.time())
+    upper = datetime.combine(end + timedelta(days=1), datetime.min.time())
+
+    previous_created_at = (
+        sqlalchemy.select(sqlalchemy.func.max(TankVolume.created_at))
+        .where(TankVolume.tank_id == tank_id, TankVolume.created_at < lower)
+        .scalar_subquery()
+    )
+    rows = connection.execute(
+        sqlalchemy.select(TankVolume.created_at, TankVolume.volume)
+        .where(
+            TankVolume.tank_id == tank_id,
+            TankVolume.created_at
+            >= sqlalchemy.func.coalesce(previous_created_at, lower),
+            TankVolume.created_at < upper,
+        )
+        .order_by(TankVolume.created_at, TankVolume.id)
+    ).all()
+
+    return (
+        np.array([created_at for created_at, _volume in rows], dtype="datetime64[us]"),
+        np.array([volume for _created_at, volume in rows], dtype=np.float64),
+    )
+
+
+def get_next_created_at(
+    connection: sqlalchemy.engine.Connection, tank_id: int, created_at: datetime
+) -> datetime | None:
+    # Get the date of the volume of a tank following a time, if any.
+    return connection.execute(
+        sqlalchemy.select(sqlalchemy.func.min(TankVolume.created_at)).where(
+            TankVolume.tank_id == tank_id,
+            TankVolume.created_at > created_at,
+        )
+    ).scalar()
+
+
+def derive_sales(
+    created_at: np.ndarray, volumes: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    # Derive the sales of a tank from its volumes, sorted by date.
+    #
+    # As in SalesMonitor, a sale is an increase between consecutive volumes, dated at
+    # the later one. Returns the dates and quantities of the sales.
+    increases = np.diff(volumes)
+    sold = increases > 0
+    return created_at[1:][sold], increases[sold]
+
+
+def _window_layout(
+    calendar: str, length: int, start: datetime, end: datetime
+) -> tuple[np.datetime64, np.timedelta64, int, int, int]:
+    # Lay the windows from start to end out in buckets of the calendar.
+    #
+    # Returns the first bucket, of the span of the window before start, the length of
+    # a bucket, the buckets in a step, the buckets before start and the buckets in all.
+    bucket, step = CALENDARS[calendar]
+    unit = np.timedelta64(bucket, "us")
+    steps = step // bucket
+    window_start = steps * (length - 1)
+    first_bucket = bucket_of(calendar, start)
+    size = window_start + max(
+        (bucket_of(calendar, end) - first_bucket) // bucket + 1, 0
+    )
+    first = np.datetime64(first_bucket, "us") - window_start * unit
+    return first, unit, steps, window_start, size
+
+
+def _window_sums(
+    sale_created_at: np.ndarray,
+    quantities: np.ndarray,
+    first: np.datetime64,
+    unit: np.timedelta64,
+    steps: int,
+    window_start: int,
+    size: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    # Sum the sales per bucket, then the buckets over the windows from start.
+    buckets = ((sale_created_at - first) // unit).astype(np.int64)
+    in_range = (buckets >= 0) & (buckets < size)
+    bucket_sales = np.bincount(buckets[in_range], minlength=size)
+    bucket_totals = np.bincount(
+        buckets[in_range], weights=quantities[in_range], minlength=size
+    )
+
+    # Summed from the oldest step on, as the updaters add the sales.
+    sales = np.zeros(size, dtype=np.int64)
+    totals = np.zeros(size, dtype=np.float64)
+    for shift in reversed(range(0, window_start + 1, steps)):
+        sales[shift:] += bucket_sales[: size - shift]
+        totals[shift:] += bucket_totals[: size - shift]
+
+    return sales[window_start:], totals[window_start:]
+
+
+def derive_windowed_sales(
+    created_at: np.ndarray,
+    volumes: np.ndarray,
+    calendar: str,
+    length: int,
+    start: datetime,
+    end: datetime,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Derive the windowed sales of a tank from start to end, from its volumes.
+    #
+    # The sales are counted and summed per bucket of the calendar, and the buckets are
+    # summed over the windows: the sales of a bucket count for that bucket and those one
+    # step later, up to the length. The volumes must cover the windows, from the span of
+    # the window before start.
+    #
+    # Returns the buckets, numbers and totals of the windows with sales.
+    first, unit, steps, window_start, size = _window_layout(
+        calendar, length, start, end
+    )
+    sales, totals = _window_sums(
+        *derive_sales(created_at, volumes), first, unit, steps, window_start, size
+    )
+    with_sales = np.flatnonzero(sales)
+
+    return (
+        first + (window_start + with_sales) * unit,
+        sales[with_sales],
+        totals[with_sales],
+    )
+
+
+def derive_average_sales(
+    created_at: np.ndarray, volumes: np.ndarray, start: date, end: date
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Derive the average sales of a tank from start to end, from its volumes.
+    #
+    # The average sales are the windows of WINDOW_WEEKS weeks of the weekday calendar,
+    # as in AvgSalesUpdater. The volumes must cover the windows, from WINDOW_WEEKS - 1
+    # weeks before start.
+    #
+    # Returns the dates, numbers and totals of the average sales with sales.
+    days, sales, totals = derive_windowed_sales(
+        created_at,
+        volumes,
+        "weekday",
+        WINDOW_WEEKS,
+        datetime.combine(start, datetime.min.time()),
+        datetime.combine(end, datetime.min.time()),
+    )
+    return days.astype("datetime64[D]"), sales, totals
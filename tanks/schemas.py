@@ -1,6 +1,8 @@
-from datetime import datetime
+from datetime import date, datetime
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+from .windows import Calendar
 
 
 class BaseTank(BaseModel):
@@ -11,6 +13,11 @@ class BaseTankVolume(BaseModel):
     volume: float
 
 
+class TankVolumeReading(BaseTankVolume):
+    tank_id: int
+    created_at: datetime | None = None
+
+
 class TankVolumePatch(BaseModel):
     volume: float
 
@@ -19,3 +26,42 @@ class Sale(BaseModel):
     tank_id: int
     quantity: float
     created_at: datetime
+
+
+class AverageSaleRead(BaseModel):
+    tank_id: int
+    date: date
+    sales: int
+    total: float
+    average: float
+
+
+class SalesRead(BaseModel):
+    tank_id: int
+    start: date
+    end: date
+    sales: int
+    total: float
+    average: float | None
+
+
+class VolumeBucket(BaseModel):
+    start: datetime
+    count: int
+    min: float
+    max: float
+    avg: float
+    last: float
+
+
+class BaseSalesWindow(BaseModel):
+    calendar: Calendar
+    length: int = Field(ge=1, le=366)
+
+
+class WindowedSaleRead(BaseModel):
+    window_id: int
+    start: datetime
+    sales: int
+    total: float
+    average: float
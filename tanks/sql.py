@@ -0,0 +1,52 @@
+"""
+Provide SQL functions whose syntax differs between the supported databases.
+"""
+from typing import Any
+
+import sqlalchemy
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+
+class hour_of(FunctionElement):  # pylint: disable=invalid-name,too-many-ancestors
+    """Truncate a datetime to its hour."""
+
+    type = sqlalchemy.DateTime()  # type: ignore[assignment]
+    inherit_cache = True
+
+
+@compiles(hour_of)
+def _compile_hour_of(element: hour_of, compiler: Any, **kwargs: Any) -> str:
+    return f"date_trunc('hour', {compiler.process(element.clauses, **kwargs)})"
+
+
+@compiles(hour_of, "sqlite")
+def _compile_hour_of_sqlite(element: hour_of, compiler: Any, **kwargs: Any) -> str:
+    # Formatted as SQLAlchemy stores datetimes on SQLite, so they compare.
+    return (
+        "strftime('%Y-%m-%d %H:00:00.000000', "
+        f"{compiler.process(element.clauses, **kwargs)})"
+    )
+
+
+class epoch_of(FunctionElement):  # pylint: disable=invalid-name,too-many-ancestors
+    """Get the whole seconds from the Unix epoch to a UTC datetime."""
+
+    type = sqlalchemy.BigInteger()  # type: ignore[assignment]
+    inherit_cache = True
+
+
+@compiles(epoch_of)
+def _compile_epoch_of(element: epoch_of, compiler: Any, **kwargs: Any) -> str:
+    return (
+        f"CAST(extract(epoch FROM {compiler.process(element.clauses, **kwargs)}) "
+        "AS BIGINT)"
+    )
+
+
+@compiles(epoch_of, "sqlite")
+def _compile_epoch_of_sqlite(element: epoch_of, compiler: Any, **kwargs: Any) -> str:
+    return (
+        f"CAST(strftime('%s', {compiler.process(element.clauses, **kwargs)}) "
+        "AS INTEGER)"
+    )
@@ -0,0 +1,43 @@
+"""
+Describe the windows over which sales are averaged.
+
+A window sums the sales of a bucket, a day or an hour, with those of the
+buckets one step earlier, up to its length. The calendar of a window sets its
+bucket and step:
+
+- weekday: days, summed with the same weekday of the previous weeks.
+- day: days, summed with the previous days.
+- hour_of_week: hours, summed with the same hour and weekday of the previous
+  weeks.
+"""
+from datetime import datetime, timedelta
+from functools import cache
+from typing import Literal
+
+Calendar = Literal["weekday", "day", "hour_of_week"]
+
+CALENDARS: dict[str, tuple[timedelta, timedelta]] = {
+    "weekday": (timedelta(days=1), timedelta(weeks=1)),
+    "day": (timedelta(days=1), timedelta(days=1)),
+    "hour_of_week": (timedelta(hours=1), timedelta(weeks=1)),
+}
+
+
+def bucket_of(calendar: str, moment: datetime) -> datetime:
+    # Get the start of the bucket of a moment.
+    bucket = CALENDARS[calendar][0]
+    return moment - (moment - datetime.min) % bucket
+
+
+@cache
+def window_offsets(calendar: str, length: int) -> tuple[timedelta, ...]:
+    # Get the offsets from the bucket of a sale to the windows it counts for.
+    #
+    # They're computed once per calendar and length, rather than per sale.
+    step = CALENDARS[calendar][1]
+    return tuple(step * steps for steps in range(length))
+
+
+def window_span(calendar: str, length: int) -> timedelta:
+    # Get the offset from the first bucket of a window to its last.
+    return window_offsets(calendar, length)[-1]
@@ -1,12 +1,21 @@
-from typing import Callable, TypeVar
+from collections.abc import AsyncIterator, Iterator
+from pathlib import Path
+from typing import Protocol, TypeVar
 
 from fastapi.testclient import TestClient
 from pytest import MonkeyPatch, fixture
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel.pool import StaticPool
 
-from tanks.dependencies import get_session
+import tanks.locks
+from tanks.config import Settings
+from tanks.database import get_async_database_url
+from tanks.dependencies import get_async_session, get_session, get_settings
+from tanks.hooks.sales_monitor import LATEST_VOLUMES
 from tanks.main import create_app
+from tanks.routers.tanksr import KNOWN_TANKS
 
 
 @fixture(name="database_url", autouse=True)
@@ -16,6 +25,36 @@ def database_url_fixture(monkeypatch: MonkeyPatch):
     return database_url
 
 
+@fixture(autouse=True)
+def clear_caches_fixture() -> Iterator[None]:
+    # Each test has its own database, so ids cached by others don't hold.
+    yield
+    LATEST_VOLUMES.clear()
+    KNOWN_TANKS.clear()
+
+
+@fixture(name="file_database_url")
+def file_database_url_fixture(monkeypatch: MonkeyPatch, tmp_path: Path):
+    database_url = f"sqlite:///{tmp_path / 'tanks.db'}"
+    monkeypatch.setenv("DATABASE_URL", database_url)
+    return database_url
+
+
+@fixture(name="settings")
+def settings_fixture(database_url: str) -> Settings:
+    return Settings(database_url=database_url)
+
+
+@fixture(name="unit_of_work")
+def unit_of_work_fixture(monkeypatch: MonkeyPatch) -> Iterator[None]:
+    monkeypatch.setenv("UNIT_OF_WORK", "true")
+    get_settings.cache_clear()
+
+    yield
+
+    get_settings.cache_clear()
+
+
 @fixture(name="session")
 def session_fixture(database_url: str):
     engine = create_engine(
@@ -25,9 +64,27 @@ def session_fixture(database_url: str):
     return Session(engine)
 
 
+@fixture(name="locks")
+def locks_fixture(session: Session, monkeypatch: MonkeyPatch) -> list[tuple]:
+    # Lock the tanks on the session's SQLite, recording the locks taken.
+    locks: list[tuple] = []
+    connection = session.connection().connection
+    for function in ("pg_advisory_xact_lock", "pg_advisory_lock"):
+        connection.create_function(function, 2, lambda *key: locks.append(key))
+    connection.create_function(
+        "pg_advisory_unlock_all", 0, lambda: locks.append(("unlock_all",))
+    )
+    session.commit()
+    monkeypatch.setattr(tanks.locks, "LOCKING_DIALECTS", ("sqlite",))
+    return locks
+
+
 T = TypeVar("T", bound=SQLModel)
 
-CreateDBRowsFunction = Callable[[T], list[T]]
+
+class CreateDBRowsFunction(Protocol):  # pylint: disable=too-few-public-methods
+    def __call__(self, *instances: T) -> list[T]:
+        ...
 
 
 @fixture(name="create_db_rows")
@@ -51,3 +108,24 @@ def client_fixture(session: Session):
     app = create_app()
     app.dependency_overrides[get_session] = lambda: session
     return TestClient(app)
+
+
+@fixture(name="async_client")
+def async_client_fixture(
+    monkeypatch: MonkeyPatch, file_database_url: str, session: Session
+) -> Iterator[TestClient]:
+    monkeypatch.setenv("DATABASE_ASYNC", "true")
+    get_settings.cache_clear()
+    engine = create_async_engine(get_async_database_url(file_database_url))
+
+    async def get_async_session_override() -> AsyncIterator[AsyncSession]:
+        async with AsyncSession(engine, expire_on_commit=False) as async_session:
+            yield async_session
+
+    app = create_app()
+    app.dependency_overrides[get_async_session] = get_async_session_override
+    app.dependency_overrides[get_session] = lambda: session
+
+    yield TestClient(app)
+
+    get_settings.cache_clear()
@@ -1,6 +1,28 @@
+from collections.abc import AsyncIterable, AsyncIterator
+from contextlib import asynccontextmanager
 from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import IO, Any
 
+import httpx
 import pytest
+import sqlalchemy
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import Session, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from tanks.models import AverageSale, Tank
+
+# Readings of two tanks, with sales on a few days.
+READINGS = [
+    {"tank_id": 1, "volume": 10.0, "created_at": "2023-01-01T10:00:00"},
+    {"tank_id": 1, "volume": 30.0, "created_at": "2023-01-02T10:00:00"},
+    {"tank_id": 1, "volume": 20.0, "created_at": "2023-01-09T10:00:00"},
+    {"tank_id": 1, "volume": 25.0, "created_at": "2023-01-09T12:00:00"},
+    {"tank_id": 2, "volume": 5.0, "created_at": "2023-01-03T10:00:00"},
+    {"tank_id": 2, "volume": 15.0, "created_at": "2023-01-10T10:00:00"},
+]
 
 
 @dataclass
@@ -15,3 +37,118 @@ def parametrize(*cases: BaseTestCase):
         )(test_function)
 
     return wrapper
+
+
+@asynccontextmanager
+async def new_async_session(*instances: SQLModel) -> AsyncIterator[AsyncSession]:
+    # Open an AsyncSession on a new in-memory database, with the instances added.
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as connection:
+        await connection.run_sync(SQLModel.metadata.create_all)
+
+    async with AsyncSession(engine) as session:
+        session.add_all(instances)
+        yield session
+
+
+def create_tanks(
+    session: Session, client: TestClient, readings: list[dict[str, Any]]
+) -> list[dict[str, Any]]:
+    # Create the tanks of READINGS, and the volumes of readings in one batch.
+    session.add(Tank(id=1, name="ULS Diesel"))
+    session.add(Tank(id=2, name="Top Diesel"))
+    session.commit()
+
+    response = client.post("/tanks/volumes/batch", json=readings)
+    assert response.status_code == 201
+    return response.json()
+
+
+def create_inconsistent_tank_volumes(session: Session, client: TestClient) -> list[int]:
+    # Create volumes of a tank, and lose their average sales since.
+    session.add(Tank(id=1, name="ULS Diesel"))
+    session.commit()
+    response = client.post(
+        "/tanks/volumes/batch",
+        json=[
+            {"tank_id": 1, "volume": 10.0, "created_at": "2023-01-01T10:00:00"},
+            {"tank_id": 1, "volume": 20.0, "created_at": "2123-01-01T10:00:00"},
+        ],
+    )
+    assert response.status_code == 201
+    session.query(AverageSale).delete()
+    session.commit()
+    return [tank_volume["id"] for tank_volume in response.json()]
+
+
+def import_tank_volumes(session: Session, client: TestClient) -> httpx.Response:
+    # Create a tank, and import two of its volumes from a CSV file.
+    session.add(Tank(id=1, name="USL Diesel"))
+    session.commit()
+
+    return client.post(
+        "/tanks/volumes/import",
+        content=(
+            "tank_id,created_at,volume\n"
+            "1,2023-01-01T10:00:00,10.0\n"
+            "1,2023-01-03T10:00:00,20.0\n"
+        ),
+        headers={"Content-Type": "text/csv"},
+    )
+
+
+class CopyingCursor:
+    """A DB-API cursor recording the COPYs sent to it with copy_expert."""
+
+    def __init__(self):
+        self.copies: list[tuple[str, str]] = []
+
+    def __enter__(self) -> "CopyingCursor":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        pass
+
+    def copy_expert(self, sql: str, file: IO[str]) -> None:
+        self.copies.append((sql, file.read()))
+
+
+class CopyingDriverConnection:  # pylint: disable=too-few-public-methods
+    """An asyncpg connection recording the COPYs sent to it with copy_to_table."""
+
+    def __init__(self):
+        self.copies: list[tuple[str, list[str], str]] = []
+
+    async def copy_to_table(
+        self,
+        table_name: str,
+        *,
+        source: AsyncIterable[bytes],
+        columns: list[str],
+        format: str,  # pylint: disable=redefined-builtin
+    ) -> None:
+        assert format == "csv"
+        data = b"".join([chunk async for chunk in source])
+        self.copies.append((table_name, columns, data.decode()))
+
+
+class PostgresConnection:  # pylint: disable=too-few-public-methods
+    """A connection passing for a psycopg2 or asyncpg one, over another connection.
+
+    Everything else is done by the other connection, and COPYs are recorded
+    by the cursor, or the driver connection with asyncpg.
+    """
+
+    def __init__(
+        self, connection: sqlalchemy.engine.Connection, driver: str = "psycopg2"
+    ):
+        self._connection = connection
+        self.dialect = SimpleNamespace(name="postgresql", driver=driver)
+        self.cursor = CopyingCursor()
+        self.driver_connection = CopyingDriverConnection()
+        self.connection = SimpleNamespace(
+            cursor=lambda: self.cursor, driver_connection=self.driver_connection
+        )
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._connection, name)
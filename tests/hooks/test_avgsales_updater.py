@@ -2,11 +2,13 @@ from dataclasses import dataclass
 from datetime import date, datetime
 from typing import Callable, Type
 
-from pytest import fixture, raises
+from pytest import MonkeyPatch, fixture, raises
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import Session
 
-from tanks.hooks.avgsales_updater import AvgSalesUpdater
-from tanks.models import AverageSale
+import tanks.hooks.avgsales_updater
+from tanks.hooks.avgsales_updater import AvgSalesUpdater, UpsertAvgSalesUpdater
+from tanks.models import AverageSale, AverageSaleDeletion
 from tanks.schemas import Sale
 
 from ..conftest import CreateDBRowsFunction
@@ -15,9 +17,9 @@ from ..helpers import BaseTestCase, parametrize
 TANK_ID = 1
 
 
-@fixture(name="avgsales_updater")
-def sales_fixture(session: Session) -> AvgSalesUpdater:
-    return AvgSalesUpdater(session)
+@fixture(name="avgsales_updater", params=[AvgSalesUpdater, UpsertAvgSalesUpdater])
+def sales_fixture(session: Session, request) -> AvgSalesUpdater:
+    return request.param(session)
 
 
 @fixture(name="five_saturdays")
@@ -308,3 +310,204 @@ def test_inconsistent_delete(
         total=10,
         average=10,
     )
+
+
+def test_handle_sales(
+    session: Session,
+    five_saturdays: list[datetime],
+    create_sales: CreateSalesFunction,
+    avgsales_updater: AvgSalesUpdater,
+):
+    create_sales([10])
+
+    avgsales_updater.handle_sales(
+        added=[
+            Sale(tank_id=TANK_ID, created_at=five_saturdays[0], quantity=20),
+            Sale(tank_id=TANK_ID, created_at=five_saturdays[0], quantity=30),
+        ],
+        deleted=[Sale(tank_id=TANK_ID, created_at=five_saturdays[0], quantity=10)],
+    )
+
+    assert session.query(AverageSale).filter_by(tank_id=TANK_ID).count() == 5
+    assert_avg_sales_equal(
+        session=session,
+        dates=five_saturdays,
+        sales=2,
+        total=50,
+        average=25,
+    )
+    assert session.get(AverageSaleDeletion, TANK_ID) is None
+
+
+def test_handle_sales_creating_and_deleting_rows(
+    session: Session,
+    five_saturdays: list[datetime],
+    create_sales: CreateSalesFunction,
+    avgsales_updater: AvgSalesUpdater,
+):
+    create_sales([10])
+
+    avgsales_updater.handle_sales(
+        added=[Sale(tank_id=TANK_ID, created_at=five_saturdays[1], quantity=10)],
+        deleted=[Sale(tank_id=TANK_ID, created_at=five_saturdays[0], quantity=10)],
+    )
+
+    rows = (
+        session.query(AverageSale)
+        .filter_by(tank_id=TANK_ID)
+        .order_by(AverageSale.date)
+        .all()
+    )
+    assert [row.date for row in rows] == [day.date() for day in five_saturdays[1:]] + [
+        datetime(2023, 2, 5).date()
+    ]
+    assert all(row.sales == 1 and row.total == 10 for row in rows)
+    deletion = session.get(AverageSaleDeletion, TANK_ID)
+    assert deletion
+    assert (datetime.utcnow() - deletion.deleted_at).total_seconds() < 1
+
+
+def test_delete_records_deletion(
+    session: Session,
+    five_saturdays: list[datetime],
+    create_sales: CreateSalesFunction,
+    avgsales_updater: AvgSalesUpdater,
+):
+    create_sales([10, 20])
+
+    avgsales_updater.handle_deleted_sale(
+        Sale(tank_id=TANK_ID, created_at=five_saturdays[0], quantity=10)
+    )
+    assert session.get(AverageSaleDeletion, TANK_ID) is None
+
+    avgsales_updater.handle_deleted_sale(
+        Sale(tank_id=TANK_ID, created_at=five_saturdays[0], quantity=20)
+    )
+    assert session.get(AverageSaleDeletion, TANK_ID)
+
+
+def test_handle_no_sales(session: Session, avgsales_updater: AvgSalesUpdater):
+    avgsales_updater.handle_sales(added=[], deleted=[])
+
+    assert session.query(AverageSale).count() == 0
+
+
+@parametrize(
+    TestCase(
+        name="non positive sale",
+        existing_sales=[10],
+        quantity=0,
+        expected_rows_count=5,
+        expected_sales=1,
+        expected_total=10,
+        expected_average=10,
+        expected_error=ValueError,
+    ),
+    TestCase(
+        name="non existing sale",
+        existing_sales=[],
+        quantity=10,
+        expected_rows_count=0,
+        expected_sales=0,
+        expected_total=0,
+        expected_average=0,
+        expected_error=ValueError,
+    ),
+    TestCase(
+        name="more than total sales",
+        existing_sales=[20],
+        quantity=40,
+        expected_rows_count=5,
+        expected_sales=1,
+        expected_total=20,
+        expected_average=20,
+        expected_error=ValueError,
+    ),
+)
+def test_handle_sales_inconsistent_delete(
+    session: Session,
+    five_saturdays: list[datetime],
+    create_sales: CreateSalesFunction,
+    avgsales_updater: AvgSalesUpdater,
+    case: TestCase,
+):
+    create_sales(case.existing_sales)
+
+    sale = Sale(tank_id=TANK_ID, created_at=five_saturdays[0], quantity=case.quantity)
+
+    with raises(ValueError):
+        avgsales_updater.handle_sales(added=[], deleted=[sale])
+
+    assert (
+        session.query(AverageSale).filter_by(tank_id=TANK_ID).count()
+        == case.expected_rows_count
+    )
+    if case.expected_rows_count > 0:
+        assert_avg_sales_equal(
+            session=session,
+            dates=five_saturdays,
+            sales=case.expected_sales,
+            total=case.expected_total,
+            average=case.expected_average,
+        )
+
+
+def test_add_sale_completing_window(
+    session: Session,
+    five_saturdays: list[datetime],
+    create_db_rows: CreateDBRowsFunction,
+    avgsales_updater: AvgSalesUpdater,
+):
+    create_db_rows(
+        AverageSale(id=None, tank_id=TANK_ID, date=five_saturdays[1], sales=1, total=10)
+    )
+
+    avgsales_updater.handle_added_sale(
+        Sale(tank_id=TANK_ID, created_at=five_saturdays[1], quantity=10)
+    )
+
+    rows = session.query(AverageSale).filter_by(tank_id=TANK_ID).all()
+    assert len(rows) == 5
+    assert sorted((row.sales, row.total) for row in rows) == [(1, 10)] * 4 + [(2, 20)]
+
+
+def test_unique_tank_id_and_date(
+    session: Session,
+    five_saturdays: list[datetime],
+    create_sales: CreateSalesFunction,
+):
+    create_sales([10])
+
+    session.add(
+        AverageSale(id=None, tank_id=TANK_ID, date=five_saturdays[0], sales=1, total=5)
+    )
+
+    with raises(IntegrityError):
+        session.commit()
+
+
+def test_add_sale_refreshes_loaded_entries(
+    five_saturdays: list[datetime],
+    create_sales: CreateSalesFunction,
+    avgsales_updater: AvgSalesUpdater,
+):
+    entries = create_sales([10])
+
+    avgsales_updater.handle_added_sale(
+        Sale(tank_id=TANK_ID, created_at=five_saturdays[0], quantity=20)
+    )
+
+    assert [(entry.sales, entry.total) for entry in entries[:5]] == [(2, 30)] * 5
+
+
+def test_upsert_unsupported_database(
+    monkeypatch: MonkeyPatch,
+    session: Session,
+    five_saturdays: list[datetime],
+):
+    monkeypatch.setattr(tanks.hooks.avgsales_updater, "_INSERTS", {})
+
+    with raises(NotImplementedError):
+        UpsertAvgSalesUpdater(session).handle_added_sale(
+            Sale(tank_id=TANK_ID, created_at=five_saturdays[0], quantity=20)
+        )
@@ -0,0 +1,240 @@
+from datetime import date, datetime
+
+import sqlalchemy
+from pytest import fixture, raises
+from sqlmodel import Session
+
+from tanks.hooks.daily_sales import (
+    DailySalesUpdater,
+    get_daily_sales,
+    get_running_sums,
+    rebuild_daily_sales,
+    settle_running_sums,
+)
+from tanks.models import DailySale, DailySaleWatermark, Tank, TankVolume
+from tanks.schemas import Sale
+
+from ..conftest import CreateDBRowsFunction
+
+
+@fixture(name="tanks")
+def tanks_fixture(create_db_rows: CreateDBRowsFunction) -> list[Tank]:
+    return create_db_rows(Tank(id=1, name="ULS Diesel"), Tank(id=2, name="Top Diesel"))
+
+
+def _daily_sales(session: Session) -> list[tuple]:
+    session.flush()
+    return [
+        (tank_id, *row)
+        for tank_id in (1, 2)
+        for row in get_daily_sales(session.connection(), tank_id, date.min)
+    ]
+
+
+def _stored_daily_sales(session: Session) -> list[tuple]:
+    session.flush()
+    session.expire_all()
+    return [
+        (row.date, row.sales, row.total, row.cumulative_sales, row.cumulative_total)
+        for row in session.query(DailySale)
+        .filter_by(tank_id=1)
+        .order_by(DailySale.date)
+    ]
+
+
+def _sale(day: int, quantity: float, tank_id: int = 1) -> Sale:
+    return Sale(
+        tank_id=tank_id, quantity=quantity, created_at=datetime(2023, 1, day, 10)
+    )
+
+
+def test_handle_added_sale(
+    session: Session, tanks: list[Tank]
+):  # pylint: disable=unused-argument
+    daily_sales = DailySalesUpdater(session)
+
+    daily_sales.handle_added_sale(_sale(2, 10))
+    daily_sales.handle_added_sale(_sale(2, 5))
+    daily_sales.handle_added_sale(_sale(4, 20))
+    daily_sales.handle_added_sale(_sale(3, 1, tank_id=2))
+
+    assert _daily_sales(session) == [
+        (1, date(2023, 1, 2), 2, 15, 2, 15),
+        (1, date(2023, 1, 4), 1, 20, 3, 35),
+        (2, date(2023, 1, 3), 1, 1, 1, 1),
+    ]
+
+
+def test_handle_added_sale_on_latest_day(
+    session: Session, tanks: list[Tank]
+):  # pylint: disable=unused-argument
+    daily_sales = DailySalesUpdater(session)
+    daily_sales.handle_added_sale(_sale(2, 10))
+    session.flush()
+    statements: list[str] = []
+
+    @sqlalchemy.event.listens_for(session.get_bind(), "before_cursor_execute")
+    def record(_conn, _cursor, statement, *_args):
+        statements.append(statement.split()[0])
+
+    daily_sales.handle_added_sale(_sale(3, 5))
+    session.flush()
+
+    # The rows of the day and the latest one, then the new row.
+    assert statements == ["SELECT", "SELECT", "INSERT"]
+
+
+def test_handle_added_sale_before_later_days(
+    session: Session, tanks: list[Tank]
+):  # pylint: disable=unused-argument
+    daily_sales = DailySalesUpdater(session)
+    daily_sales.handle_sales(added=[_sale(2, 10), _sale(4, 20)], deleted=[])
+
+    daily_sales.handle_added_sale(_sale(3, 5))
+    daily_sales.handle_added_sale(_sale(1, 1))
+
+    assert _daily_sales(session) == [
+        (1, date(2023, 1, 1), 1, 1, 1, 1),
+        (1, date(2023, 1, 2), 1, 10, 2, 11),
+        (1, date(2023, 1, 3), 1, 5, 3, 16),
+        (1, date(2023, 1, 4), 1, 20, 4, 36),
+    ]
+    # Only the rows of the sales were written, and the later ones are stale.
+    assert _stored_daily_sales(session) == [
+        (date(2023, 1, 1), 1, 1, 1, 1),
+        (date(2023, 1, 2), 1, 10, 1, 10),
+        (date(2023, 1, 3), 1, 5, 2, 15),
+        (date(2023, 1, 4), 1, 20, 2, 30),
+    ]
+    watermark = session.get(DailySaleWatermark, 1)
+    assert watermark
+    assert watermark.date == date(2023, 1, 2)
+
+
+def test_get_running_sums(
+    session: Session, tanks: list[Tank]
+):  # pylint: disable=unused-argument
+    daily_sales = DailySalesUpdater(session)
+    daily_sales.handle_sales(added=[_sale(2, 10), _sale(4, 20)], deleted=[])
+    daily_sales.handle_added_sale(_sale(3, 5))
+    session.flush()
+    connection = session.connection()
+
+    assert [
+        get_running_sums(connection, 1, date(2023, 1, day)) for day in range(1, 6)
+    ] == [(0, 0), (1, 10), (2, 15), (3, 35), (3, 35)]
+    assert get_daily_sales(connection, 1, date(2023, 1, 4)) == [
+        (date(2023, 1, 4), 1, 20, 3, 35)
+    ]
+
+
+def test_settle_running_sums(
+    session: Session, tanks: list[Tank]
+):  # pylint: disable=unused-argument
+    daily_sales = DailySalesUpdater(session)
+    daily_sales.handle_sales(added=[_sale(2, 10), _sale(4, 20)], deleted=[])
+    daily_sales.handle_added_sale(_sale(1, 1))
+    expected = _daily_sales(session)
+    connection = session.connection()
+
+    assert settle_running_sums(connection, 1) == 2
+    assert settle_running_sums(connection, 1) == 0
+    assert session.query(DailySaleWatermark).count() == 0
+    assert _stored_daily_sales(session) == [row[1:] for row in expected]
+
+
+def test_handle_deleted_sale(
+    session: Session, tanks: list[Tank]
+):  # pylint: disable=unused-argument
+    daily_sales = DailySalesUpdater(session)
+    daily_sales.handle_sales(added=[_sale(2, 10), _sale(4, 20)], deleted=[])
+
+    daily_sales.handle_deleted_sale(_sale(2, 10))
+
+    assert _daily_sales(session) == [(1, date(2023, 1, 4), 1, 20, 1, 20)]
+
+
+def test_handle_sales_nets_deltas(
+    session: Session, tanks: list[Tank]
+):  # pylint: disable=unused-argument
+    DailySalesUpdater(session).handle_sales(
+        added=[_sale(2, 10)], deleted=[_sale(2, 10)]
+    )
+
+    assert not _daily_sales(session)
+
+
+def test_handle_deleted_sale_inconsistent(
+    session: Session, tanks: list[Tank]
+):  # pylint: disable=unused-argument
+    with raises(ValueError):
+        DailySalesUpdater(session).handle_deleted_sale(_sale(2, 10))
+
+
+def test_handle_sales_leaves_commit(
+    session: Session, tanks: list[Tank]
+):  # pylint: disable=unused-argument
+    DailySalesUpdater(session).handle_added_sale(_sale(2, 10))
+    session.rollback()
+
+    assert not _daily_sales(session)
+
+
+def test_rebuild_daily_sales(
+    session: Session, create_db_rows: CreateDBRowsFunction, tanks: list[Tank]
+):  # pylint: disable=unused-argument
+    volumes = [
+        TankVolume(id=1, tank_id=1, volume=10, created_at=datetime(2023, 1, 1, 10)),
+        TankVolume(id=2, tank_id=1, volume=30, created_at=datetime(2023, 1, 2, 10)),
+        TankVolume(id=3, tank_id=1, volume=20, created_at=datetime(2023, 1, 3, 10)),
+        TankVolume(id=4, tank_id=1, volume=25, created_at=datetime(2023, 1, 3, 12)),
+        TankVolume(id=5, tank_id=1, volume=40, created_at=datetime(2023, 1, 5, 10)),
+    ]
+    create_db_rows(*volumes)
+    DailySalesUpdater(session).handle_sales(
+        added=[_sale(2, 20), _sale(3, 5), _sale(5, 15)], deleted=[]
+    )
+    expected = _daily_sales(session)
+
+    session.query(DailySale).filter(DailySale.date >= date(2023, 1, 3)).delete()
+    written = rebuild_daily_sales(session.connection(), 1, date(2023, 1, 3))
+    session.commit()
+
+    assert written == 2
+    assert _daily_sales(session) == expected
+
+
+def test_rebuild_daily_sales_from_watermark(
+    session: Session, create_db_rows: CreateDBRowsFunction, tanks: list[Tank]
+):  # pylint: disable=unused-argument
+    create_db_rows(
+        TankVolume(id=1, tank_id=1, volume=10, created_at=datetime(2023, 1, 1, 10)),
+        TankVolume(id=2, tank_id=1, volume=30, created_at=datetime(2023, 1, 2, 10)),
+        TankVolume(id=3, tank_id=1, volume=40, created_at=datetime(2023, 1, 4, 10)),
+    )
+    daily_sales = DailySalesUpdater(session)
+    daily_sales.handle_added_sale(_sale(4, 10))
+    daily_sales.handle_added_sale(_sale(2, 20))
+    expected = _daily_sales(session)
+
+    written = rebuild_daily_sales(session.connection(), 1, date(2023, 1, 4))
+    session.commit()
+
+    # From the watermark, the day after the sale, on.
+    assert written == 1
+    assert session.query(DailySaleWatermark).count() == 0
+    assert _stored_daily_sales(session) == [row[1:] for row in expected]
+
+
+def test_rebuild_daily_sales_without_sales(
+    session: Session, create_db_rows: CreateDBRowsFunction, tanks: list[Tank]
+):  # pylint: disable=unused-argument
+    create_db_rows(
+        TankVolume(id=1, tank_id=1, volume=10, created_at=datetime(2023, 1, 1, 10)),
+        TankVolume(id=2, tank_id=1, volume=5, created_at=datetime(2023, 1, 2, 10)),
+    )
+    connection = session.connection()
+
+    assert rebuild_daily_sales(connection, 1, date(2023, 1, 1)) == 0
+    assert rebuild_daily_sales(connection, 1, date(2023, 1, 3)) == 0
+    assert rebuild_daily_sales(connection, 2, date(2023, 1, 1)) == 0
@@ -1,14 +1,23 @@
 from collections.abc import Callable
 from dataclasses import dataclass
 from datetime import datetime, timedelta
+from typing import Any, cast
 
-from pytest import fixture
+from pytest import MonkeyPatch, fixture
 from sqlmodel import Session
 
+import tanks.hooks.sales_monitor
+from tanks.cache import TTLCache
 from tanks.hooks.sales_monitor import (
     SalesMonitor,
     SalesObserver,
+    SalesObservers,
+    _neighbor_probe,
+    _newest_volumes_probe,
+    get_appended_volume_previous,
     get_contiguous_volumes,
+    get_contiguous_volumes_many,
+    get_volumes_span,
 )
 from tanks.models import Tank, TankVolume
 from tanks.schemas import Sale
@@ -34,6 +43,22 @@ class SalesFake(SalesObserver):
         self.count -= 1
         self.total -= sale.quantity
 
+    def handle_sales(self, added: list[Sale], deleted: list[Sale]) -> None:
+        for sale in added:
+            self.handle_added_sale(sale)
+        for sale in deleted:
+            self.handle_deleted_sale(sale)
+
+
+class SalesBatchesFake(SalesFake):
+    def __init__(self):
+        super().__init__()
+        self.batches: list[tuple[list[Sale], list[Sale]]] = []
+
+    def handle_sales(self, added: list[Sale], deleted: list[Sale]) -> None:
+        self.batches.append((added, deleted))
+        super().handle_sales(added=added, deleted=deleted)
+
 
 CreateTankVolumesFunction = Callable[[list[float]], list[TankVolume]]
 
@@ -123,6 +148,203 @@ def test_get_contiguous_volumes(
     )
 
 
+def test_get_contiguous_volumes_many(
+    session: Session, create_db_rows: CreateDBRowsFunction
+):
+    tank_volumes: list[TankVolume] = create_db_rows(
+        *[
+            TankVolume(id=None, tank_id=TANK_ID, created_at=dt, volume=i)
+            for i, dt in enumerate(FIVE_SEQUENTIAL_DAYS)
+        ],
+        TankVolume(
+            id=None, tank_id=TANK_ID + 1, created_at=datetime(2023, 1, 4, 12), volume=0
+        ),
+    )
+
+    assert get_contiguous_volumes_many(
+        session=session,
+        tank_id=TANK_ID,
+        created_ats=[
+            FIVE_SEQUENTIAL_DAYS[2],
+            FIVE_SEQUENTIAL_DAYS[0],
+            datetime(2023, 1, 4, 12),
+            datetime(2023, 1, 6),
+        ],
+    ) == [
+        (tank_volumes[1], tank_volumes[3]),
+        (None, tank_volumes[1]),
+        (tank_volumes[3], tank_volumes[4]),
+        (tank_volumes[4], None),
+    ]
+    assert not get_contiguous_volumes_many(
+        session=session, tank_id=TANK_ID, created_ats=[]
+    )
+
+
+def _query_plan(session: Session, statement: Any) -> str:
+    compiled = statement.compile(session.bind)
+    params = tuple(str(compiled.params[name]) for name in compiled.positiontup)
+    # SQLite's parameters are positional, which the stubs don't type.
+    return str(
+        session.connection()
+        .exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", cast(Any, params))
+        .all()
+    )
+
+
+def test_get_contiguous_volumes_uses_index(session: Session):
+    tank_volume = TankVolume(
+        id=None, tank_id=TANK_ID, created_at=datetime(2023, 1, 1), volume=0
+    )
+
+    for previous in (True, False):
+        plan = _query_plan(session, _neighbor_probe(tank_volume, previous=previous))
+
+        assert "ix_tankvolume_tank_id_created_at" in plan
+        assert "TEMP B-TREE" not in plan
+
+
+def test_get_appended_volume_previous(
+    session: Session, create_db_rows: CreateDBRowsFunction
+):
+    tank_volumes: list[TankVolume] = create_db_rows(
+        *[
+            TankVolume(id=None, tank_id=TANK_ID, created_at=dt, volume=i)
+            for i, dt in enumerate(FIVE_SEQUENTIAL_DAYS)
+        ],
+        TankVolume(
+            id=None, tank_id=TANK_ID + 1, created_at=datetime(2023, 1, 6), volume=0
+        ),
+    )
+
+    def previous(position: int, since_position: int):
+        return get_appended_volume_previous(
+            session=session,
+            tank_volume=tank_volumes[position],
+            since=FIVE_SEQUENTIAL_DAYS[since_position],
+        )
+
+    assert previous(4, 3) == tank_volumes[3]
+    assert previous(4, 0) == tank_volumes[3]
+    # The previous volume is before the time.
+    assert previous(4, 4) is None
+    # The volume has a next neighbor.
+    assert previous(3, 2) is None
+
+    tank_volumes += create_db_rows(
+        TankVolume(
+            id=None, tank_id=TANK_ID, created_at=FIVE_SEQUENTIAL_DAYS[4], volume=5
+        )
+    )
+    # The previous volume shares the time of the appended one.
+    assert previous(5, 3) is None
+
+
+def test_get_appended_volume_previous_uses_index(session: Session):
+    plan = _query_plan(session, _newest_volumes_probe(TANK_ID, datetime(2023, 1, 1)))
+
+    assert "ix_tankvolume_tank_id_created_at" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_handle_volume_appended(
+    session: Session,
+    create_tank_volumes: CreateTankVolumesFunction,
+    monkeypatch: MonkeyPatch,
+):
+    tank_volumes = create_tank_volumes([10, 20])
+    latest_volumes: TTLCache[int, TankVolume] = TTLCache(maxsize=1, ttl=60)
+    latest_volumes.set(TANK_ID, tank_volumes[1])
+    sales_fake = SalesBatchesFake()
+    sales_monitor = SalesMonitor(session, sales_fake, latest_volumes)
+
+    def get_contiguous_volumes_fail(*args, **kwargs):
+        raise AssertionError("Expected to skip the neighbors probes.")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(
+            tanks.hooks.sales_monitor,
+            "get_contiguous_volumes",
+            get_contiguous_volumes_fail,
+        )
+        for day, volume in ((5, 15), (6, 25)):
+            tank_volume = TankVolume(
+                id=None,
+                tank_id=TANK_ID,
+                created_at=datetime(2023, 1, day),
+                volume=volume,
+            )
+            session.add(tank_volume)
+            session.flush()
+            sales_monitor.handle_added_tank_volume(tank_volume)
+
+    assert [
+        ([sale.quantity for sale in added], deleted)
+        for added, deleted in sales_fake.batches
+    ] == [([], []), ([10], [])]
+    assert latest_volumes.get(TANK_ID) == tank_volume
+
+
+def test_handle_volume_appended_after_stale_mark(
+    session: Session, create_tank_volumes: CreateTankVolumesFunction
+):
+    tank_volumes = create_tank_volumes([10, 20, 15])
+    latest_volumes: TTLCache[int, TankVolume] = TTLCache(maxsize=1, ttl=60)
+    latest_volumes.set(TANK_ID, tank_volumes[0])
+    sales_fake = SalesFake()
+
+    # Another volume was appended meanwhile, so the neighbors are probed.
+    SalesMonitor(session, sales_fake, latest_volumes).handle_added_tank_volume(
+        tank_volumes[1]
+    )
+
+    # The sale from 10 to 15 is replaced by the one from 10 to 20.
+    assert sales_fake.count == 0
+    assert sales_fake.total == 5
+    assert latest_volumes.get(TANK_ID) == tank_volumes[0]
+
+
+def test_handle_volume_changed_invalidates_latest_volume(
+    session: Session, create_tank_volumes: CreateTankVolumesFunction
+):
+    tank_volumes = create_tank_volumes([10, 20])
+    latest_volumes: TTLCache[int, TankVolume] = TTLCache(maxsize=1, ttl=60)
+    sales_monitor = SalesMonitor(session, SalesFake(), latest_volumes)
+
+    latest_volumes.set(TANK_ID, tank_volumes[1])
+    sales_monitor.handle_updated_tank_volume(
+        new_tank_volume=tank_volumes[1], old_volume=20
+    )
+    assert latest_volumes.get(TANK_ID) is None
+
+    latest_volumes.set(TANK_ID, tank_volumes[1])
+    sales_monitor.handle_deleted_tank_volume(tank_volumes[1])
+    assert latest_volumes.get(TANK_ID) is None
+
+
+def test_handle_volumes_added_remembers_latest_volume(
+    session: Session, create_tank_volumes: CreateTankVolumesFunction
+):
+    create_tank_volumes([10])
+    latest_volumes: TTLCache[int, TankVolume] = TTLCache(maxsize=1, ttl=60)
+    sales_monitor = SalesMonitor(session, SalesFake(), latest_volumes)
+
+    def add(created_at: datetime) -> TankVolume:
+        tank_volume = TankVolume(
+            id=None, tank_id=TANK_ID, created_at=created_at, volume=20
+        )
+        session.add(tank_volume)
+        session.flush()
+        sales_monitor.handle_added_tank_volumes([tank_volume])
+        return tank_volume
+
+    appended = add(datetime(2023, 1, 2))
+    assert latest_volumes.get(TANK_ID) == appended
+
+    add(datetime(2022, 12, 31))
+    assert latest_volumes.get(TANK_ID) is None
+
+
 @dataclass
 class TestCase(BaseTestCase):
     name: str
@@ -354,3 +576,199 @@ def test_handle_tank_volume_updated(
 
     assert case.sales_fake.count == case.expected_sales
     assert case.sales_fake.total == case.expected_total
+
+
+@dataclass
+class SpanTestCase(BaseTestCase):
+    start: int
+    end: int
+    expected_positions: list[int]
+
+
+@parametrize(
+    SpanTestCase(
+        name="inner",
+        start=1,
+        end=3,
+        expected_positions=[0, 1, 2, 3, 4],
+    ),
+    SpanTestCase(
+        name="single",
+        start=2,
+        end=2,
+        expected_positions=[1, 2, 3],
+    ),
+    SpanTestCase(
+        name="from the beginning",
+        start=0,
+        end=1,
+        expected_positions=[0, 1, 2],
+    ),
+    SpanTestCase(
+        name="until the end",
+        start=3,
+        end=4,
+        expected_positions=[2, 3, 4],
+    ),
+)
+def test_get_volumes_span(
+    session: Session,
+    create_db_rows: CreateDBRowsFunction,
+    case: SpanTestCase,
+):
+    tank_volumes: list[TankVolume] = create_db_rows(
+        *[
+            TankVolume(id=None, tank_id=TANK_ID, created_at=dt, volume=i)
+            for i, dt in enumerate(FIVE_SEQUENTIAL_DAYS)
+        ],
+        TankVolume(
+            id=None, tank_id=TANK_ID + 1, created_at=FIVE_SEQUENTIAL_DAYS[2], volume=0
+        ),
+    )
+
+    assert get_volumes_span(
+        session=session,
+        tank_id=TANK_ID,
+        start=FIVE_SEQUENTIAL_DAYS[case.start],
+        end=FIVE_SEQUENTIAL_DAYS[case.end],
+    ) == [tank_volumes[position] for position in case.expected_positions]
+
+
+def test_get_volumes_span_at_the_same_time(
+    session: Session, create_db_rows: CreateDBRowsFunction
+):
+    tank_volumes: list[TankVolume] = create_db_rows(
+        TankVolume(id=2, tank_id=TANK_ID, created_at=FIVE_SEQUENTIAL_DAYS[0], volume=0),
+        TankVolume(id=1, tank_id=TANK_ID, created_at=FIVE_SEQUENTIAL_DAYS[0], volume=1),
+    )
+
+    assert get_volumes_span(
+        session=session,
+        tank_id=TANK_ID,
+        start=FIVE_SEQUENTIAL_DAYS[0],
+        end=FIVE_SEQUENTIAL_DAYS[0],
+    ) == [tank_volumes[1], tank_volumes[0]]
+
+
+@dataclass
+class BatchTestCase(BaseTestCase):
+    volumes: list[float]
+    sales_fake: SalesFake
+    added: list[tuple[int, float]]
+    expected_sales: int
+    expected_total: float
+
+
+@parametrize(
+    BatchTestCase(
+        name="appended",
+        volumes=[10, 20],
+        sales_fake=SalesFake(1, 10),
+        added=[(5, 15), (6, 30), (7, 40)],
+        expected_sales=3,
+        expected_total=35,
+    ),
+    BatchTestCase(
+        name="inserted in the middle",
+        volumes=[10, 30],
+        sales_fake=SalesFake(1, 20),
+        added=[(1, 20), (1, 0)],
+        expected_sales=2,
+        expected_total=40,
+    ),
+    BatchTestCase(
+        name="on an empty tank",
+        volumes=[],
+        sales_fake=SalesFake(0, 0),
+        added=[(0, 10), (1, 5), (2, 20)],
+        expected_sales=1,
+        expected_total=15,
+    ),
+)
+def test_handle_volumes_added(
+    session: Session,
+    create_tank_volumes: CreateTankVolumesFunction,
+    case: BatchTestCase,
+):
+    create_tank_volumes(case.volumes)
+    tank_volumes = [
+        TankVolume(
+            id=None,
+            tank_id=TANK_ID,
+            created_at=datetime(2023, 1, 1, 10 + hours, 0) + timedelta(days=days),
+            volume=volume,
+        )
+        for hours, (days, volume) in enumerate(case.added)
+    ]
+    session.add_all(tank_volumes)
+    session.flush()
+
+    handler = SalesMonitor(session, case.sales_fake)
+    handler.handle_added_tank_volumes(tank_volumes)
+
+    assert case.sales_fake.count == case.expected_sales
+    assert case.sales_fake.total == case.expected_total
+
+
+def test_handle_volumes_added_to_many_tanks(
+    session: Session,
+    create_tank_volumes: CreateTankVolumesFunction,
+):
+    create_tank_volumes([10])
+    tank_volumes = [
+        TankVolume(
+            id=None, tank_id=TANK_ID, created_at=datetime(2023, 1, 2), volume=20
+        ),
+        TankVolume(
+            id=None, tank_id=TANK_ID + 1, created_at=datetime(2023, 1, 2), volume=5
+        ),
+        TankVolume(
+            id=None, tank_id=TANK_ID + 1, created_at=datetime(2023, 1, 3), volume=10
+        ),
+    ]
+    session.add_all(tank_volumes)
+    session.flush()
+    sales_fake = SalesFake()
+
+    SalesMonitor(session, sales_fake).handle_added_tank_volumes(tank_volumes)
+
+    assert sales_fake.count == 2
+    assert sales_fake.total == 15
+
+
+def test_handle_tank_volume_updated_in_one_batch(
+    session: Session,
+    create_tank_volumes: CreateTankVolumesFunction,
+):
+    tank_volumes = create_tank_volumes([10, 20, 30])
+    sales_fake = SalesBatchesFake()
+
+    SalesMonitor(session, sales_fake).handle_updated_tank_volume(
+        new_tank_volume=next(tv for tv in tank_volumes if tv.volume == 20),
+        old_volume=15,
+    )
+
+    assert len(sales_fake.batches) == 1
+    added, deleted = sales_fake.batches[0]
+    # The sale bridging the neighbors is added and deleted within the batch.
+    assert sorted(sale.quantity for sale in added) == [10, 10, 20]
+    assert sorted(sale.quantity for sale in deleted) == [5, 15, 20]
+
+
+def test_sales_observers(session: Session):
+    first, second = SalesFake(), SalesBatchesFake()
+    sales_observers = SalesObservers(session, first, second)
+    sale = Sale(tank_id=TANK_ID, quantity=10, created_at=datetime(2023, 1, 1))
+
+    for handle in (
+        lambda: sales_observers.handle_added_sale(sale),
+        lambda: sales_observers.handle_sales(added=[sale], deleted=[]),
+        lambda: sales_observers.handle_deleted_sale(sale),
+    ):
+        # Stands for the changes of the observers.
+        session.add(Tank(name="USL Diesel"))
+        handle()
+        assert not session.new
+
+    assert (first.count, first.total) == (second.count, second.total) == (1, 10)
+    assert second.batches == [([sale], [])]
@@ -0,0 +1,54 @@
+import asyncio
+from datetime import datetime
+
+from sqlmodel import Session, select
+
+from tanks.hooks.sales_outbox import AsyncSalesOutbox, SalesOutbox
+from tanks.models import Tank, TankVolume, VolumeChange
+
+from ..conftest import CreateDBRowsFunction
+from ..helpers import new_async_session
+
+
+def test_sales_outbox(session: Session, create_db_rows: CreateDBRowsFunction):
+    create_db_rows(Tank(id=1, name="ULS Diesel"))
+    tank_volumes = create_db_rows(
+        TankVolume(id=1, tank_id=1, volume=10, created_at=datetime(2023, 1, 1)),
+        TankVolume(id=2, tank_id=1, volume=20, created_at=datetime(2023, 1, 2)),
+    )
+    sales_outbox = SalesOutbox(session)
+
+    sales_outbox.handle_added_tank_volume(tank_volumes[0])
+    sales_outbox.handle_updated_tank_volume(
+        new_tank_volume=tank_volumes[1], old_volume=15
+    )
+    sales_outbox.handle_deleted_tank_volume(tank_volumes[1])
+    sales_outbox.handle_added_tank_volumes(tank_volumes)
+    session.commit()
+
+    assert [
+        (change.tank_id, change.created_at.day)
+        for change in session.query(VolumeChange).order_by(VolumeChange.id)
+    ] == [(1, 1), (1, 2), (1, 2), (1, 1), (1, 2)]
+
+
+def test_async_sales_outbox():
+    tank_volume = TankVolume(
+        id=1, tank_id=1, volume=10, created_at=datetime(2023, 1, 1)
+    )
+
+    async def handle() -> int:
+        async with new_async_session(
+            Tank(id=1, name="ULS Diesel"), tank_volume
+        ) as session:
+            sales_outbox = AsyncSalesOutbox(session)
+            await sales_outbox.handle_added_tank_volume(tank_volume)
+            await sales_outbox.handle_updated_tank_volume(
+                new_tank_volume=tank_volume, old_volume=5
+            )
+            await sales_outbox.handle_added_tank_volumes([tank_volume])
+            await sales_outbox.handle_deleted_tank_volume(tank_volume)
+            result = await session.execute(select(VolumeChange))
+            return len(result.all())
+
+    assert asyncio.run(handle()) == 4
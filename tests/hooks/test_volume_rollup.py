@@ -0,0 +1,125 @@
+import asyncio
+from datetime import datetime
+
+from pytest import fixture
+from sqlalchemy.engine import Row
+from sqlmodel import Session, select
+
+from tanks.hooks.volume_rollup import (
+    AsyncVolumeRollupUpdater,
+    VolumeRollupUpdater,
+    refresh_hourly_volumes,
+)
+from tanks.models import HourlyVolume, Tank, TankVolume
+
+from ..conftest import CreateDBRowsFunction
+from ..helpers import new_async_session
+
+
+@fixture(name="tank_volumes")
+def tank_volumes_fixture(create_db_rows: CreateDBRowsFunction) -> list[TankVolume]:
+    create_db_rows(Tank(id=1, name="ULS Diesel"), Tank(id=2, name="Top Diesel"))
+    return create_db_rows(
+        TankVolume(id=1, tank_id=1, volume=10, created_at=datetime(2023, 1, 1, 10, 5)),
+        TankVolume(id=2, tank_id=1, volume=30, created_at=datetime(2023, 1, 1, 10, 50)),
+        TankVolume(id=3, tank_id=1, volume=20, created_at=datetime(2023, 1, 1, 10, 30)),
+        TankVolume(id=4, tank_id=1, volume=40, created_at=datetime(2023, 1, 1, 12, 0)),
+        TankVolume(id=5, tank_id=2, volume=5, created_at=datetime(2023, 1, 1, 10, 0)),
+    )
+
+
+def _hourly_volumes(session: Session) -> list[tuple]:
+    session.expire_all()
+    return [
+        (
+            row.tank_id,
+            row.hour,
+            row.count,
+            row.min_volume,
+            row.max_volume,
+            row.total_volume,
+            row.last_volume,
+        )
+        for row in session.query(HourlyVolume).order_by(
+            HourlyVolume.tank_id, HourlyVolume.hour
+        )
+    ]
+
+
+def test_refresh_hourly_volumes(
+    session: Session, tank_volumes: list[TankVolume]
+):  # pylint: disable=unused-argument
+    refresh_hourly_volumes(
+        session.connection(),
+        1,
+        datetime(2023, 1, 1, 10, 59),
+        datetime(2023, 1, 1, 12, 0),
+    )
+    session.commit()
+
+    assert _hourly_volumes(session) == [
+        (1, datetime(2023, 1, 1, 10), 3, 10, 30, 60, 30),
+        (1, datetime(2023, 1, 1, 12), 1, 40, 40, 40, 40),
+    ]
+
+
+def test_refresh_hourly_volumes_replaces_hours(
+    session: Session, tank_volumes: list[TankVolume]
+):  # pylint: disable=unused-argument
+    refresh_hourly_volumes(
+        session.connection(), 1, datetime(2023, 1, 1), datetime(2023, 1, 2)
+    )
+    session.query(TankVolume).filter_by(id=2).delete()
+    refresh_hourly_volumes(
+        session.connection(), 1, datetime(2023, 1, 1, 10), datetime(2023, 1, 1, 10)
+    )
+    session.commit()
+
+    assert _hourly_volumes(session) == [
+        (1, datetime(2023, 1, 1, 10), 2, 10, 20, 30, 20),
+        (1, datetime(2023, 1, 1, 12), 1, 40, 40, 40, 40),
+    ]
+
+
+def test_handle_changed_tank_volumes(session: Session, tank_volumes: list[TankVolume]):
+    VolumeRollupUpdater(session).handle_changed_tank_volumes(tank_volumes)
+    session.commit()
+
+    assert _hourly_volumes(session) == [
+        (1, datetime(2023, 1, 1, 10), 3, 10, 30, 60, 30),
+        (1, datetime(2023, 1, 1, 12), 1, 40, 40, 40, 40),
+        (2, datetime(2023, 1, 1, 10), 1, 5, 5, 5, 5),
+    ]
+
+
+def test_handle_changed_tank_volumes_flushes(
+    session: Session, tank_volumes: list[TankVolume]
+):
+    volume_rollup = VolumeRollupUpdater(session)
+    volume_rollup.handle_changed_tank_volumes(tank_volumes)
+
+    tank_volumes[3].volume = 50
+    volume_rollup.handle_changed_tank_volumes([tank_volumes[3]])
+    session.commit()
+
+    assert _hourly_volumes(session)[1] == (1, datetime(2023, 1, 1, 12), 1, *[50] * 4)
+
+
+def test_async_handle_changed_tank_volumes():
+    tank_volume = TankVolume(
+        id=1, tank_id=1, volume=10, created_at=datetime(2023, 1, 1, 10, 5)
+    )
+
+    async def handle_changed_tank_volumes() -> list[Row]:
+        async with new_async_session(
+            Tank(id=1, name="ULS Diesel"), tank_volume
+        ) as session:
+            await AsyncVolumeRollupUpdater(session).handle_changed_tank_volumes(
+                [tank_volume]
+            )
+            result = await session.execute(
+                select(HourlyVolume.count, HourlyVolume.last_volume)
+            )
+            return result.all()
+
+    assert asyncio.run(handle_changed_tank_volumes()) == [(1, 10)]
@@ -0,0 +1,160 @@
+from datetime import datetime
+
+from pytest import fixture, raises
+from sqlmodel import Session
+
+from tanks.hooks.windowed_sales import WindowedSalesUpdater, rebuild_windowed_sales
+from tanks.models import SalesWindow, Tank, TankVolume, WindowedSale
+from tanks.schemas import Sale
+
+from ..conftest import CreateDBRowsFunction
+
+
+@fixture(name="sales_windows")
+def sales_windows_fixture(create_db_rows: CreateDBRowsFunction) -> list[SalesWindow]:
+    create_db_rows(Tank(id=1, name="ULS Diesel"), Tank(id=2, name="Top Diesel"))
+    return create_db_rows(
+        SalesWindow(id=1, tank_id=1, calendar="day", length=2),
+        SalesWindow(id=2, tank_id=1, calendar="hour_of_week", length=2),
+    )
+
+
+def _windowed_sales(session: Session) -> list[tuple]:
+    session.flush()
+    session.expire_all()
+    return [
+        (row.window_id, row.start, row.sales, row.total)
+        for row in session.query(WindowedSale).order_by(
+            WindowedSale.window_id, WindowedSale.start
+        )
+    ]
+
+
+def test_handle_added_sale(
+    session: Session, sales_windows: list[SalesWindow]
+):  # pylint: disable=unused-argument
+    WindowedSalesUpdater(session).handle_added_sale(
+        Sale(tank_id=1, quantity=10, created_at=datetime(2023, 1, 2, 10, 30))
+    )
+
+    assert _windowed_sales(session) == [
+        (1, datetime(2023, 1, 2), 1, 10),
+        (1, datetime(2023, 1, 3), 1, 10),
+        (2, datetime(2023, 1, 2, 10), 1, 10),
+        (2, datetime(2023, 1, 9, 10), 1, 10),
+    ]
+
+
+def test_handle_deleted_sale(
+    session: Session, sales_windows: list[SalesWindow]
+):  # pylint: disable=unused-argument
+    windowed_sales = WindowedSalesUpdater(session)
+    windowed_sales.handle_sales(
+        added=[
+            Sale(tank_id=1, quantity=10, created_at=datetime(2023, 1, 2, 10, 30)),
+            Sale(tank_id=1, quantity=5, created_at=datetime(2023, 1, 3, 11, 0)),
+        ],
+        deleted=[],
+    )
+
+    windowed_sales.handle_deleted_sale(
+        Sale(tank_id=1, quantity=10, created_at=datetime(2023, 1, 2, 10, 30))
+    )
+
+    assert _windowed_sales(session) == [
+        (1, datetime(2023, 1, 3), 1, 5),
+        (1, datetime(2023, 1, 4), 1, 5),
+        (2, datetime(2023, 1, 3, 11), 1, 5),
+        (2, datetime(2023, 1, 10, 11), 1, 5),
+    ]
+
+
+def test_handle_sales_nets_deltas(
+    session: Session, sales_windows: list[SalesWindow]
+):  # pylint: disable=unused-argument
+    sale = Sale(tank_id=1, quantity=10, created_at=datetime(2023, 1, 2, 10, 30))
+
+    WindowedSalesUpdater(session).handle_sales(added=[sale], deleted=[sale])
+
+    assert not _windowed_sales(session)
+
+
+def test_handle_sales_without_windows(
+    session: Session, sales_windows: list[SalesWindow]
+):  # pylint: disable=unused-argument
+    windowed_sales = WindowedSalesUpdater(session)
+
+    windowed_sales.handle_sales(added=[], deleted=[])
+    windowed_sales.handle_added_sale(
+        Sale(tank_id=2, quantity=10, created_at=datetime(2023, 1, 2, 10, 30))
+    )
+
+    assert not _windowed_sales(session)
+
+
+def test_handle_deleted_sale_inconsistent(
+    session: Session, sales_windows: list[SalesWindow]
+):  # pylint: disable=unused-argument
+    with raises(ValueError):
+        WindowedSalesUpdater(session).handle_deleted_sale(
+            Sale(tank_id=1, quantity=10, created_at=datetime(2023, 1, 2, 10, 30))
+        )
+
+
+def test_handle_sales_leaves_commit(
+    session: Session, sales_windows: list[SalesWindow]
+):  # pylint: disable=unused-argument
+    WindowedSalesUpdater(session).handle_added_sale(
+        Sale(tank_id=1, quantity=10, created_at=datetime(2023, 1, 2, 10, 30))
+    )
+    session.rollback()
+
+    assert not _windowed_sales(session)
+
+
+def test_rebuild_windowed_sales(
+    session: Session,
+    create_db_rows: CreateDBRowsFunction,
+    sales_windows: list[SalesWindow],
+):  # pylint: disable=unused-argument
+    create_db_rows(
+        WindowedSale(window_id=1, start=datetime(2023, 1, 5), sales=9, total=90),
+        WindowedSale(window_id=1, start=datetime(2023, 2, 1), sales=9, total=90),
+        TankVolume(id=1, tank_id=1, volume=10, created_at=datetime(2023, 1, 1, 10)),
+        TankVolume(id=2, tank_id=1, volume=30, created_at=datetime(2023, 1, 2, 10)),
+        TankVolume(id=3, tank_id=1, volume=20, created_at=datetime(2023, 1, 3, 10)),
+        TankVolume(id=4, tank_id=1, volume=25, created_at=datetime(2023, 1, 4, 10)),
+        TankVolume(id=5, tank_id=2, volume=40, created_at=datetime(2023, 1, 2, 10)),
+    )
+
+    written = rebuild_windowed_sales(
+        session.connection(), 1, datetime(2023, 1, 2, 10), datetime(2023, 1, 3, 10)
+    )
+    session.commit()
+
+    assert written == 8
+    assert _windowed_sales(session) == [
+        (1, datetime(2023, 1, 2), 1, 20),
+        (1, datetime(2023, 1, 3), 1, 20),
+        (1, datetime(2023, 1, 4), 1, 5),
+        (1, datetime(2023, 1, 5), 1, 5),
+        (1, datetime(2023, 2, 1), 9, 90),
+        (2, datetime(2023, 1, 2, 10), 1, 20),
+        (2, datetime(2023, 1, 4, 10), 1, 5),
+        (2, datetime(2023, 1, 9, 10), 1, 20),
+        (2, datetime(2023, 1, 11, 10), 1, 5),
+    ]
+
+
+def test_rebuild_windowed_sales_without_sales(
+    session: Session, sales_windows: list[SalesWindow]
+):  # pylint: disable=unused-argument
+    connection = session.connection()
+
+    for tank_id in (1, 2):
+        assert (
+            rebuild_windowed_sales(
+                connection, tank_id, datetime(2023, 1, 1), datetime(2023, 1, 2)
+            )
+            == 0
+        )
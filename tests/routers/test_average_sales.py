@@ -0,0 +1,322 @@
+from datetime import date, datetime
+from typing import Type
+
+import pytest
+from fastapi.testclient import TestClient
+from pytest import fixture
+from sqlmodel import Session
+
+from tanks.hooks.avgsales_updater import AvgSalesUpdater, UpsertAvgSalesUpdater
+from tanks.models import AverageSale, DailySale, Tank
+from tanks.schemas import Sale
+
+from ..conftest import CreateDBRowsFunction
+
+
+@fixture(name="average_sales")
+def average_sales_fixture(create_db_rows: CreateDBRowsFunction) -> list[AverageSale]:
+    create_db_rows(Tank(id=1, name="ULS Diesel"), Tank(id=2, name="Top Diesel"))
+    return create_db_rows(
+        # 2023-01-02 is a Monday.
+        AverageSale(id=1, tank_id=1, date=date(2023, 1, 2), sales=1, total=10),
+        AverageSale(id=2, tank_id=1, date=date(2023, 1, 3), sales=2, total=30),
+        AverageSale(id=3, tank_id=1, date=date(2023, 1, 9), sales=2, total=20),
+        AverageSale(id=4, tank_id=2, date=date(2023, 1, 2), sales=4, total=10),
+    )
+
+
+def test_get_one_tank(
+    client: TestClient, average_sales: list[AverageSale]
+):  # pylint: disable=unused-argument
+    response = client.get("/tanks/1/average-sales")
+
+    assert response.status_code == 200
+    assert response.json() == [
+        {"tank_id": 1, "date": "2023-01-02", "sales": 1, "total": 10, "average": 10},
+        {"tank_id": 1, "date": "2023-01-03", "sales": 2, "total": 30, "average": 15},
+        {"tank_id": 1, "date": "2023-01-09", "sales": 2, "total": 20, "average": 10},
+    ]
+    assert response.headers["etag"]
+    assert response.headers["last-modified"]
+
+
+def test_get_one_tank_filtered(
+    client: TestClient, average_sales: list[AverageSale]
+):  # pylint: disable=unused-argument
+    response = client.get(
+        "/tanks/1/average-sales?start=2023-01-03&end=2023-01-09&weekday=0"
+    )
+
+    assert response.status_code == 200
+    assert [row["date"] for row in response.json()] == ["2023-01-09"]
+
+
+def test_get_one_tank_invalid_weekday(client: TestClient):
+    response = client.get("/tanks/1/average-sales?weekday=7")
+
+    assert response.status_code == 422
+
+
+def test_get_one_tank_empty(client: TestClient):
+    response = client.get("/tanks/1/average-sales")
+
+    assert response.status_code == 200
+    assert response.json() == []
+    assert "last-modified" not in response.headers
+
+
+def test_get_many_tanks(
+    client: TestClient, average_sales: list[AverageSale]
+):  # pylint: disable=unused-argument
+    response = client.get("/tanks/average-sales?tank_id=1&tank_id=2&weekday=0")
+
+    assert response.status_code == 200
+    assert [(row["tank_id"], row["date"]) for row in response.json()] == [
+        (1, "2023-01-02"),
+        (1, "2023-01-09"),
+        (2, "2023-01-02"),
+    ]
+
+
+def test_get_many_tanks_unfiltered(
+    client: TestClient, average_sales: list[AverageSale]
+):
+    response = client.get("/tanks/average-sales")
+
+    assert response.status_code == 200
+    assert len(response.json()) == len(average_sales)
+
+
+def test_if_none_match(
+    client: TestClient, average_sales: list[AverageSale]
+):  # pylint: disable=unused-argument
+    etag = client.get("/tanks/1/average-sales").headers["etag"]
+
+    response = client.get("/tanks/1/average-sales", headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert not response.content
+
+
+def test_if_none_match_weak(
+    client: TestClient, average_sales: list[AverageSale]
+):  # pylint: disable=unused-argument
+    etag = client.get("/tanks/1/average-sales").headers["etag"]
+
+    response = client.get(
+        "/tanks/1/average-sales", headers={"If-None-Match": f'"other", W/{etag}'}
+    )
+
+    assert response.status_code == 304
+
+
+def test_if_none_match_changed(
+    session: Session, client: TestClient, average_sales: list[AverageSale]
+):  # pylint: disable=unused-argument
+    etag = client.get("/tanks/1/average-sales").headers["etag"]
+    average_sale = session.get(AverageSale, 2)
+    assert average_sale
+    average_sale.sales += 1
+    average_sale.total += 15
+    session.commit()
+
+    response = client.get("/tanks/1/average-sales", headers={"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()[1]["sales"] == 3
+
+
+def test_if_none_match_deleted(
+    session: Session, client: TestClient, average_sales: list[AverageSale]
+):  # pylint: disable=unused-argument
+    etag = client.get("/tanks/1/average-sales").headers["etag"]
+    session.query(AverageSale).filter_by(id=1).delete()
+    session.commit()
+
+    response = client.get("/tanks/1/average-sales", headers={"If-None-Match": etag})
+
+    assert response.status_code == 200
+
+
+def test_if_modified_since(
+    client: TestClient, average_sales: list[AverageSale]
+):  # pylint: disable=unused-argument
+    last_modified = client.get("/tanks/1/average-sales").headers["last-modified"]
+
+    response = client.get(
+        "/tanks/1/average-sales", headers={"If-Modified-Since": last_modified}
+    )
+
+    assert response.status_code == 304
+
+
+@pytest.mark.parametrize("avgsales_updater", [AvgSalesUpdater, UpsertAvgSalesUpdater])
+def test_if_modified_since_after_deletion(
+    session: Session,
+    client: TestClient,
+    create_db_rows: CreateDBRowsFunction,
+    avgsales_updater: Type[AvgSalesUpdater],
+):
+    create_db_rows(Tank(id=1, name="ULS Diesel"))
+    monday = Sale(tank_id=1, created_at=datetime(2023, 1, 2, 10), quantity=10)
+    tuesday = Sale(tank_id=1, created_at=datetime(2023, 1, 3, 10), quantity=20)
+    avgsales_updater(session).handle_sales(added=[monday, tuesday], deleted=[])
+    for average_sale in session.query(AverageSale):
+        average_sale.updated_at = datetime(2023, 1, average_sale.date.isoweekday())
+    session.commit()
+    last_modified = client.get("/tanks/1/average-sales").headers["last-modified"]
+
+    # The latest updated averages are deleted, leaving older ones.
+    avgsales_updater(session).handle_deleted_sale(tuesday)
+
+    response = client.get(
+        "/tanks/1/average-sales", headers={"If-Modified-Since": last_modified}
+    )
+
+    assert response.status_code == 200
+    assert [row["date"] for row in response.json()] == [
+        "2023-01-02",
+        "2023-01-09",
+        "2023-01-16",
+        "2023-01-23",
+        "2023-01-30",
+    ]
+    assert response.headers["last-modified"] != last_modified
+
+
+def test_if_modified_since_earlier(
+    client: TestClient, average_sales: list[AverageSale]
+):  # pylint: disable=unused-argument
+    response = client.get(
+        "/tanks/1/average-sales",
+        headers={"If-Modified-Since": "Sun, 01 Jan 2023 00:00:00 -0000"},
+    )
+
+    assert response.status_code == 200
+
+
+def test_if_modified_since_invalid(
+    client: TestClient, average_sales: list[AverageSale]
+):  # pylint: disable=unused-argument
+    response = client.get(
+        "/tanks/1/average-sales", headers={"If-Modified-Since": "yesterday"}
+    )
+
+    assert response.status_code == 200
+
+
+def test_if_modified_since_empty(client: TestClient):
+    response = client.get(
+        "/tanks/1/average-sales",
+        headers={"If-Modified-Since": "Sun, 01 Jan 2023 00:00:00 GMT"},
+    )
+
+    assert response.status_code == 200
+
+
+def test_updated_at_follows_updates(
+    session: Session, average_sales: list[AverageSale]
+):  # pylint: disable=unused-argument
+    average_sale = session.get(AverageSale, 1)
+    assert average_sale
+    average_sale.updated_at = datetime(2023, 1, 1)
+    session.commit()
+
+    average_sale.sales += 1
+    session.commit()
+
+    assert average_sale.updated_at > datetime(2023, 1, 1)
+
+
+@fixture(name="daily_sales")
+def daily_sales_fixture(create_db_rows: CreateDBRowsFunction) -> list[DailySale]:
+    create_db_rows(Tank(id=1, name="ULS Diesel"))
+    return create_db_rows(
+        DailySale(
+            tank_id=1,
+            date=date(2023, 1, 2),
+            sales=1,
+            total=10,
+            cumulative_sales=1,
+            cumulative_total=10,
+        ),
+        DailySale(
+            tank_id=1,
+            date=date(2023, 1, 5),
+            sales=2,
+            total=30,
+            cumulative_sales=3,
+            cumulative_total=40,
+        ),
+        DailySale(
+            tank_id=1,
+            date=date(2023, 2, 1),
+            sales=1,
+            total=20,
+            cumulative_sales=4,
+            cumulative_total=60,
+        ),
+    )
+
+
+def test_get_sales(
+    client: TestClient, daily_sales: list[DailySale]
+):  # pylint: disable=unused-argument
+    response = client.get("/tanks/1/sales?start=2023-01-03&end=2023-02-01")
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "tank_id": 1,
+        "start": "2023-01-03",
+        "end": "2023-02-01",
+        "sales": 3,
+        "total": 50,
+        "average": 50 / 3,
+    }
+
+
+def test_get_sales_from_first_day(
+    client: TestClient, daily_sales: list[DailySale]
+):  # pylint: disable=unused-argument
+    response = client.get("/tanks/1/sales?start=2023-01-01&end=2023-01-04")
+
+    assert (response.json()["sales"], response.json()["total"]) == (1, 10)
+
+
+def test_get_sales_without_sales(
+    client: TestClient, daily_sales: list[DailySale]
+):  # pylint: disable=unused-argument
+    response = client.get("/tanks/1/sales?start=2023-01-06&end=2023-01-31")
+
+    assert response.status_code == 200
+    assert (response.json()["sales"], response.json()["average"]) == (0, None)
+
+
+def test_get_sales_invalid_range(client: TestClient):
+    response = client.get("/tanks/1/sales?start=2023-01-06&end=2023-01-05")
+
+    assert response.status_code == 400
+
+
+def test_get_sales_follows_volumes(session: Session, client: TestClient):
+    session.add(Tank(id=1, name="ULS Diesel"))
+    session.commit()
+
+    client.post(
+        "/tanks/volumes/batch",
+        json=[
+            {"tank_id": 1, "volume": 10.0, "created_at": "2023-01-01T10:00:00"},
+            {"tank_id": 1, "volume": 30.0, "created_at": "2023-01-09T10:00:00"},
+            {"tank_id": 1, "volume": 45.0, "created_at": "2023-03-01T10:00:00"},
+        ],
+    )
+    client.post(
+        "/tanks/volumes/batch",
+        json=[{"tank_id": 1, "volume": 35.0, "created_at": "2023-02-01T10:00:00"}],
+    )
+
+    response = client.get("/tanks/1/sales?start=2023-01-02&end=2023-02-28")
+
+    assert (response.json()["sales"], response.json()["total"]) == (2, 25)
@@ -0,0 +1,71 @@
+from datetime import date
+
+from fastapi.testclient import TestClient
+from pytest import fixture
+
+from tanks.models import AverageSale, DailySale, Tank
+
+from ..conftest import CreateDBRowsFunction
+
+
+@fixture(name="database_url", autouse=True)
+def database_url_fixture(file_database_url: str) -> str:
+    return file_database_url
+
+
+@fixture(name="average_sales")
+def average_sales_fixture(create_db_rows: CreateDBRowsFunction) -> list[AverageSale]:
+    create_db_rows(Tank(id=1, name="ULS Diesel"), Tank(id=2, name="Top Diesel"))
+    return create_db_rows(
+        AverageSale(id=1, tank_id=1, date=date(2023, 1, 2), sales=1, total=10),
+        AverageSale(id=2, tank_id=2, date=date(2023, 1, 3), sales=2, total=30),
+    )
+
+
+def test_get_one_tank(
+    async_client: TestClient, average_sales: list[AverageSale]
+):  # pylint: disable=unused-argument
+    response = async_client.get("/tanks/1/average-sales")
+
+    assert response.status_code == 200
+    assert response.json() == [
+        {"tank_id": 1, "date": "2023-01-02", "sales": 1, "total": 10, "average": 10}
+    ]
+
+
+def test_get_many_tanks(
+    async_client: TestClient, average_sales: list[AverageSale]
+):  # pylint: disable=unused-argument
+    response = async_client.get("/tanks/average-sales?tank_id=2")
+
+    assert response.status_code == 200
+    assert [row["tank_id"] for row in response.json()] == [2]
+
+
+def test_if_none_match(
+    async_client: TestClient, average_sales: list[AverageSale]
+):  # pylint: disable=unused-argument
+    etag = async_client.get("/tanks/average-sales").headers["etag"]
+
+    response = async_client.get("/tanks/average-sales", headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+
+
+def test_get_sales(async_client: TestClient, create_db_rows: CreateDBRowsFunction):
+    create_db_rows(Tank(id=1, name="ULS Diesel"))
+    create_db_rows(
+        DailySale(
+            tank_id=1,
+            date=date(2023, 1, 2),
+            sales=2,
+            total=10,
+            cumulative_sales=2,
+            cumulative_total=10,
+        )
+    )
+
+    response = async_client.get("/tanks/1/sales?start=2023-01-01&end=2023-01-31")
+
+    assert response.status_code == 200
+    assert (response.json()["sales"], response.json()["average"]) == (2, 5)
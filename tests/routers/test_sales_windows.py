@@ -0,0 +1,160 @@
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+from pytest import fixture
+from sqlmodel import Session
+
+from tanks.models import SalesWindow, Tank, TankVolume, WindowedSale
+
+
+@fixture(name="tank_volumes")
+def tank_volumes_fixture(session: Session) -> list[TankVolume]:
+    session.add(Tank(id=1, name="ULS Diesel"))
+    session.add(Tank(id=2, name="Top Diesel"))
+
+    tank_volumes = [
+        TankVolume(id=1, tank_id=1, volume=10, created_at=datetime(2023, 1, 1, 10, 0)),
+        TankVolume(id=2, tank_id=1, volume=30, created_at=datetime(2023, 1, 2, 9, 0)),
+    ]
+    for tank_volume in tank_volumes:
+        session.add(tank_volume)
+
+    session.commit()
+
+    return tank_volumes
+
+
+@fixture(name="sales_window")
+def sales_window_fixture(  # pylint: disable=unused-argument
+    client: TestClient, tank_volumes: list[TankVolume]
+) -> dict:
+    response = client.post(
+        "/tanks/1/sales-windows/", json={"calendar": "day", "length": 2}
+    )
+    assert response.status_code == 201
+    return response.json()
+
+
+def test_create(sales_window: dict, client: TestClient):
+    assert sales_window == {
+        "id": sales_window["id"],
+        "tank_id": 1,
+        "calendar": "day",
+        "length": 2,
+    }
+
+    response = client.get(f"/tanks/1/sales-windows/{sales_window['id']}/sales")
+
+    assert response.status_code == 200
+    assert response.json() == [
+        {
+            "window_id": sales_window["id"],
+            "start": "2023-01-02T00:00:00",
+            "sales": 1,
+            "total": 20.0,
+            "average": 20.0,
+        },
+        {
+            "window_id": sales_window["id"],
+            "start": "2023-01-03T00:00:00",
+            "sales": 1,
+            "total": 20.0,
+            "average": 20.0,
+        },
+    ]
+
+
+def test_create_without_volumes(session: Session, client: TestClient):
+    session.add(Tank(id=1, name="ULS Diesel"))
+    session.commit()
+
+    response = client.post(
+        "/tanks/1/sales-windows/", json={"calendar": "hour_of_week", "length": 4}
+    )
+
+    assert response.status_code == 201
+    assert session.query(WindowedSale).count() == 0
+
+
+def test_create_existing(
+    sales_window: dict, client: TestClient
+):  # pylint: disable=unused-argument
+    response = client.post(
+        "/tanks/1/sales-windows/", json={"calendar": "day", "length": 2}
+    )
+
+    assert response.status_code == 409
+
+
+def test_create_for_unknown_tank(client: TestClient):
+    response = client.post(
+        "/tanks/1/sales-windows/", json={"calendar": "day", "length": 2}
+    )
+
+    assert response.status_code == 404
+
+
+def test_create_invalid(
+    client: TestClient, tank_volumes: list[TankVolume]
+):  # pylint: disable=unused-argument
+    response = client.post(
+        "/tanks/1/sales-windows/", json={"calendar": "month", "length": 0}
+    )
+
+    assert response.status_code == 422
+
+
+def test_get_many(sales_window: dict, client: TestClient):
+    response = client.get("/tanks/1/sales-windows/")
+
+    assert response.status_code == 200
+    assert response.json() == [sales_window]
+    assert client.get("/tanks/2/sales-windows/").json() == []
+
+
+def test_get_one(sales_window: dict, client: TestClient):
+    response = client.get(f"/tanks/1/sales-windows/{sales_window['id']}")
+
+    assert response.status_code == 200
+    assert response.json() == sales_window
+    assert client.get(f"/tanks/2/sales-windows/{sales_window['id']}").status_code == 404
+
+
+def test_delete(session: Session, sales_window: dict, client: TestClient):
+    response = client.delete(f"/tanks/1/sales-windows/{sales_window['id']}")
+
+    assert response.status_code == 204
+    assert session.query(SalesWindow).count() == 0
+    assert session.query(WindowedSale).count() == 0
+
+
+def test_get_sales_in_range(sales_window: dict, client: TestClient):
+    response = client.get(
+        f"/tanks/1/sales-windows/{sales_window['id']}/sales",
+        params={"start": "2023-01-03T00:00:00", "end": "2023-01-04T00:00:00"},
+    )
+
+    assert response.status_code == 200
+    assert [row["start"] for row in response.json()] == ["2023-01-03T00:00:00"]
+
+
+def test_get_sales_of_unknown_window(client: TestClient):
+    response = client.get("/tanks/1/sales-windows/1/sales")
+
+    assert response.status_code == 404
+
+
+def test_sales_follow_volumes(sales_window: dict, client: TestClient):
+    response = client.post(
+        "/tanks/volumes/batch",
+        json=[{"tank_id": 1, "volume": 35.0, "created_at": "2023-01-03T09:00:00"}],
+    )
+    assert response.status_code == 201
+
+    response = client.get(f"/tanks/1/sales-windows/{sales_window['id']}/sales")
+
+    assert [(row["start"], row["sales"], row["total"]) for row in response.json()] == [
+        ("2023-01-02T00:00:00", 1, 20.0),
+        ("2023-01-03T00:00:00", 2, 25.0),
+        ("2023-01-04T00:00:00", 1, 5.0),
+    ]
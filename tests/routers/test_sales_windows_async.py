@@ -0,0 +1,65 @@
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+from pytest import fixture
+from sqlmodel import Session
+
+from tanks.models import SalesWindow, Tank, TankVolume, WindowedSale
+
+from ..conftest import CreateDBRowsFunction
+
+
+@fixture(name="database_url", autouse=True)
+def database_url_fixture(file_database_url: str) -> str:
+    return file_database_url
+
+
+@fixture(name="sales_window")
+def sales_window_fixture(
+    create_db_rows: CreateDBRowsFunction, async_client: TestClient
+) -> dict:
+    create_db_rows(Tank(id=1, name="ULS Diesel"))
+    create_db_rows(
+        TankVolume(id=1, tank_id=1, volume=10, created_at=datetime(2023, 1, 1, 10, 0)),
+        TankVolume(id=2, tank_id=1, volume=30, created_at=datetime(2023, 1, 2, 9, 0)),
+    )
+
+    response = async_client.post(
+        "/tanks/1/sales-windows/", json={"calendar": "weekday", "length": 2}
+    )
+    assert response.status_code == 201
+    return response.json()
+
+
+def test_create(sales_window: dict, async_client: TestClient):
+    assert sales_window["calendar"] == "weekday"
+
+    response = async_client.get(f"/tanks/1/sales-windows/{sales_window['id']}/sales")
+
+    assert response.status_code == 200
+    assert [(row["start"], row["sales"], row["total"]) for row in response.json()] == [
+        ("2023-01-02T00:00:00", 1, 20.0),
+        ("2023-01-09T00:00:00", 1, 20.0),
+    ]
+
+
+def test_get_many(sales_window: dict, async_client: TestClient):
+    response = async_client.get("/tanks/1/sales-windows/")
+
+    assert response.status_code == 200
+    assert response.json() == [sales_window]
+
+
+def test_get_one(sales_window: dict, async_client: TestClient):
+    response = async_client.get(f"/tanks/1/sales-windows/{sales_window['id']}")
+
+    assert response.status_code == 200
+    assert response.json() == sales_window
+
+
+def test_delete(session: Session, sales_window: dict, async_client: TestClient):
+    response = async_client.delete(f"/tanks/1/sales-windows/{sales_window['id']}")
+
+    assert response.status_code == 204
+    assert session.query(SalesWindow).count() == 0
+    assert session.query(WindowedSale).count() == 0
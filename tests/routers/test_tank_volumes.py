@@ -1,12 +1,18 @@
+import gzip
+import json
 from datetime import datetime
 from typing import Any, Generator
 
 import dateutil.parser
+import sqlalchemy
 from fastapi.testclient import TestClient
 from pytest import fixture
 from sqlmodel import Session
 
-from tanks.models import Tank, TankVolume
+from tanks.locks import TANK_LOCKS
+from tanks.models import AverageSale, DailySale, Tank, TankVolume, TankVolumeDeletion
+
+from ..helpers import import_tank_volumes
 
 
 @fixture(name="tank_volumes")
@@ -35,6 +41,7 @@ def tank_volumes_fixture(session: Session) -> Generator:
 def as_dict(tank_volume: TankVolume) -> dict[str, Any]:
     result = tank_volume.dict()
     result["created_at"] = tank_volume.created_at.isoformat()
+    result["updated_at"] = tank_volume.updated_at.isoformat()
     return result
 
 
@@ -60,10 +67,85 @@ def test_create(session: Session, client: TestClient):
     created_at = created_tank_volume.get("created_at")
     assert created_at
     created_at_datetime = dateutil.parser.isoparse(created_at)
-    assert (datetime.now() - created_at_datetime).total_seconds() < 1
+    assert (datetime.utcnow() - created_at_datetime).total_seconds() < 1
     assert session.query(TankVolume).filter_by(id=created_tank_volume_id).first()
 
 
+def test_create_many(session: Session, client: TestClient):
+    session.add(Tank(id=1, name="USL Diesel"))
+    session.add(Tank(id=2, name="Top Diesel"))
+
+    response = client.post(
+        "/tanks/volumes/batch",
+        json=[
+            {"tank_id": 1, "volume": 10.0, "created_at": "2023-01-01T10:00:00"},
+            {"tank_id": 2, "volume": 20.0},
+            {"tank_id": 1, "volume": 30.0, "created_at": "2023-01-03T10:00:00"},
+        ],
+    )
+
+    assert response.status_code == 201
+    created_tank_volumes = response.json()
+    assert [
+        (tank_volume["tank_id"], tank_volume["volume"])
+        for tank_volume in created_tank_volumes
+    ] == [(1, 10), (2, 20), (1, 30)]
+    assert created_tank_volumes[2]["created_at"] == "2023-01-03T10:00:00"
+    created_at = dateutil.parser.isoparse(created_tank_volumes[1]["created_at"])
+    assert (datetime.utcnow() - created_at).total_seconds() < 1
+    assert session.query(TankVolume).count() == 3
+
+
+def test_create_many_at_the_same_time(session: Session, client: TestClient):
+    session.add(Tank(id=1, name="USL Diesel"))
+    session.add(Tank(id=2, name="Top Diesel"))
+    session.commit()
+
+    response = client.post(
+        "/tanks/volumes/batch",
+        json=[
+            {"tank_id": 1, "volume": 10.0},
+            {"tank_id": 2, "volume": 20.0},
+            {"tank_id": 1, "volume": 30.0},
+        ],
+    )
+
+    assert response.status_code == 422
+    assert session.query(TankVolume).count() == 0
+
+
+def test_create_many_at_stored_times(session: Session, client: TestClient):
+    session.add(Tank(id=1, name="USL Diesel"))
+    session.add(TankVolume(id=1, tank_id=1, volume=10, created_at=datetime(2023, 1, 1)))
+    session.commit()
+
+    response = client.post(
+        "/tanks/volumes/batch",
+        json=[
+            {"tank_id": 1, "volume": 20.0, "created_at": "2023-01-01T00:00:00"},
+            {"tank_id": 1, "volume": 30.0, "created_at": "2023-01-02T00:00:00"},
+        ],
+    )
+
+    assert response.status_code == 409
+    assert session.query(TankVolume).count() == 1
+
+
+def test_create_for_unknown_tank(session: Session, client: TestClient):
+    session.add(Tank(id=1, name="USL Diesel"))
+    session.commit()
+
+    response = client.post("/tanks/2/volumes", json={"volume": 10.0})
+    assert response.status_code == 404
+
+    response = client.post(
+        "/tanks/volumes/batch",
+        json=[{"tank_id": 1, "volume": 10.0}, {"tank_id": 2, "volume": 20.0}],
+    )
+    assert response.status_code == 404
+    assert session.query(TankVolume).count() == 0
+
+
 def test_get_one(client: TestClient, tank_volumes: list[TankVolume]):
     tank_volume = tank_volumes[0]
 
@@ -113,6 +195,217 @@ def test_many_limit(client: TestClient, tank_volumes: list[TankVolume]):
     assert response.json().get("limit") == 2
 
 
+def test_many_cursor(client: TestClient, tank_volumes: list[TankVolume]):
+    response = client.get("/tanks/1/volumes?limit=2")
+    next_cursor = response.json().get("next_cursor")
+    assert next_cursor
+
+    response = client.get(f"/tanks/1/volumes?limit=2&cursor={next_cursor}")
+
+    assert response.status_code == 200
+    assert response.json().get("items") == [as_dict(tank_volumes[2])]
+    assert response.json().get("total") is None
+    assert response.json().get("next_cursor") is None
+
+
+def test_many_without_total(client: TestClient, tank_volumes: list[TankVolume]):
+    response = client.get("/tanks/1/volumes?limit=2&total=none")
+
+    assert response.status_code == 200
+    assert response.json().get("items") == [
+        as_dict(tank_volume) for tank_volume in tank_volumes[:2]
+    ]
+    assert response.json().get("total") is None
+
+
+def test_many_time_range(client: TestClient, tank_volumes: list[TankVolume]):
+    response = client.get(
+        "/tanks/1/volumes?limit=10&from=2023-01-08T09:00:00&to=2023-01-15T14:00:00"
+    )
+
+    assert response.status_code == 200
+    assert response.json().get("items") == [as_dict(tank_volumes[1])]
+    assert response.json().get("total") == 1
+
+
+def test_many_descending(client: TestClient, tank_volumes: list[TankVolume]):
+    response = client.get("/tanks/1/volumes?limit=2&order=desc")
+
+    assert response.status_code == 200
+    assert response.json().get("items") == [
+        as_dict(tank_volume) for tank_volume in tank_volumes[:0:-1]
+    ]
+
+    response = client.get(
+        f"/tanks/1/volumes?limit=2&order=desc&cursor={response.json()['next_cursor']}"
+    )
+
+    assert response.json().get("items") == [as_dict(tank_volumes[0])]
+
+
+def test_export(client: TestClient, tank_volumes: list[TankVolume]):
+    response = client.get("/tanks/1/volumes/export")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.headers["content-encoding"] == "gzip"
+    assert [json.loads(line) for line in response.text.splitlines()] == [
+        {
+            "id": tank_volume.id,
+            "tank_id": 1,
+            "created_at": tank_volume.created_at.isoformat(),
+            "volume": tank_volume.volume,
+        }
+        for tank_volume in tank_volumes
+    ]
+
+
+def test_export_csv(
+    client: TestClient, tank_volumes: list[TankVolume]
+):  # pylint: disable=unused-argument
+    response = client.get(
+        "/tanks/1/volumes/export?format=csv&from=2023-01-08T00:00:00"
+        "&to=2023-01-15T14:00:00",
+        headers={"Accept-Encoding": "identity"},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert "content-encoding" not in response.headers
+    assert response.headers["content-disposition"] == (
+        'attachment; filename="tank-1-volumes.csv"'
+    )
+    assert response.text.splitlines() == [
+        "id,tank_id,created_at,volume",
+        "2,1,2023-01-08T09:00:00,45.0",
+    ]
+
+
+def test_export_gzip(
+    client: TestClient, tank_volumes: list[TankVolume]
+):  # pylint: disable=unused-argument
+    with client.stream(
+        "GET", "/tanks/2/volumes/export", headers={"Accept-Encoding": "gzip"}
+    ) as response:
+        content = b"".join(response.iter_raw())
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert json.loads(gzip.decompress(content)) == {
+        "id": 4,
+        "tank_id": 2,
+        "created_at": "2023-01-15T14:00:00",
+        "volume": 10.0,
+    }
+
+
+def test_buckets(session: Session, client: TestClient):
+    session.add(Tank(id=1, name="USL Diesel"))
+    session.commit()
+    client.post(
+        "/tanks/volumes/batch",
+        json=[
+            {"tank_id": 1, "volume": 10.0, "created_at": "2023-01-01T10:05:00"},
+            {"tank_id": 1, "volume": 30.0, "created_at": "2023-01-01T11:50:00"},
+            {"tank_id": 1, "volume": 40.0, "created_at": "2023-01-01T12:00:00"},
+            {"tank_id": 1, "volume": 20.0, "created_at": "2023-01-02T00:30:00"},
+        ],
+    )
+
+    response = client.get("/tanks/1/volumes/buckets?bucket=7200")
+
+    assert response.status_code == 200
+    assert response.json() == [
+        {
+            "start": "2023-01-01T10:00:00",
+            "count": 2,
+            "min": 10.0,
+            "max": 30.0,
+            "avg": 20.0,
+            "last": 30.0,
+        },
+        {
+            "start": "2023-01-01T12:00:00",
+            "count": 1,
+            "min": 40.0,
+            "max": 40.0,
+            "avg": 40.0,
+            "last": 40.0,
+        },
+        {
+            "start": "2023-01-02T00:00:00",
+            "count": 1,
+            "min": 20.0,
+            "max": 20.0,
+            "avg": 20.0,
+            "last": 20.0,
+        },
+    ]
+
+    response = client.get(
+        "/tanks/1/volumes/buckets?bucket=86400&from=2023-01-01T11:00:00"
+        "&to=2023-01-02T00:00:00"
+    )
+
+    assert [bucket["count"] for bucket in response.json()] == [2]
+
+
+def test_buckets_from_volumes(
+    client: TestClient, tank_volumes: list[TankVolume]
+):  # pylint: disable=unused-argument
+    response = client.get(
+        "/tanks/1/volumes/buckets?bucket=1800&from=2023-01-08T00:00:00"
+        "&to=2023-01-15T00:00:00"
+    )
+
+    assert response.status_code == 200
+    assert response.json() == [
+        {
+            "start": "2023-01-08T09:00:00",
+            "count": 1,
+            "min": 45.0,
+            "max": 45.0,
+            "avg": 45.0,
+            "last": 45.0,
+        }
+    ]
+
+
+def test_buckets_invalid_size(
+    client: TestClient, tank_volumes: list[TankVolume]
+):  # pylint: disable=unused-argument
+    response = client.get("/tanks/1/volumes/buckets?bucket=0")
+
+    assert response.status_code == 422
+
+
+def test_import(session: Session, client: TestClient):
+    response = import_tank_volumes(session, client)
+
+    assert response.status_code == 201
+    assert response.json() == {"imported": 2, "average_sales": 5}
+    assert session.query(TankVolume).count() == 2
+
+
+def test_import_invalid(session: Session, client: TestClient):
+    response = client.post(
+        "/tanks/volumes/import",
+        content="tank_id,created_at,volume\n1,2023-01-01T10:00:00,10.0\n",
+        headers={"Content-Type": "text/csv"},
+    )
+
+    assert response.status_code == 400
+    assert response.json() == {"message": "Unknown tanks: [1]."}
+    assert session.query(TankVolume).count() == 0
+
+
+def test_many_invalid_cursor(
+    client: TestClient, tank_volumes: list[TankVolume]
+):  # pylint: disable=unused-argument
+    response = client.get("/tanks/1/volumes?limit=2&cursor=invalid")
+
+    assert response.status_code == 400
+
+
 def test_update(session: Session, client: TestClient, tank_volumes: list[TankVolume]):
     tank_volume = tank_volumes[0]
     tank_volume.volume += 10
@@ -131,6 +424,31 @@ def test_update(session: Session, client: TestClient, tank_volumes: list[TankVol
     assert updated_tank.volume == tank_volume.volume
 
 
+def test_create_locks_tank_across_transactions(
+    session: Session,
+    client: TestClient,
+    tank_volumes: list[TankVolume],
+    locks: list[Any],
+):  # pylint: disable=unused-argument
+    # Outside a unit of work, the volume is committed before its sales.
+    @sqlalchemy.event.listens_for(session.get_bind(), "before_cursor_execute")
+    def record_write(_conn, _cursor, statement, *_args):
+        if statement.startswith(("INSERT", "UPDATE", "DELETE")):
+            locks.append(statement.split()[0])
+
+    @sqlalchemy.event.listens_for(session.get_bind(), "commit")
+    def record_commit(_conn):
+        locks.append("COMMIT")
+
+    response = client.post("/tanks/2/volumes", json={"volume": 50})
+
+    assert response.status_code == 201
+    # The volume, then its sales, under the one lock of the request.
+    assert locks[0] == (TANK_LOCKS, 2)
+    assert locks.count((TANK_LOCKS, 2)) == 1
+    assert locks.count("COMMIT") == 2
+
+
 def test_update_miss(
     client: TestClient, tank_volumes: list[TankVolume]
 ):  # pylint: disable=unused-argument
@@ -154,6 +472,11 @@ def test_delete(session: Session, client: TestClient, tank_volumes: list[TankVol
 
     assert response.status_code == 204
     assert session.query(TankVolume).filter_by(id=tank_volume.id).count() == 0
+    [deletion] = session.query(TankVolumeDeletion).all()
+    assert (deletion.tank_id, deletion.created_at) == (
+        tank_volume.tank_id,
+        tank_volume.created_at,
+    )
 
 
 def test_delete_miss(
@@ -164,3 +487,42 @@ def test_delete_miss(
 
     response = client.delete("/tanks/1000/volumes/1")
     assert response.status_code == 404
+
+
+def test_batch_then_single_changes(session: Session, client: TestClient):
+    session.add(Tank(id=1, name="ULS Diesel"))
+    session.commit()
+
+    response = client.post(
+        "/tanks/volumes/batch",
+        json=[
+            {"tank_id": 1, "volume": 10.0, "created_at": "2023-01-02T10:00:00"},
+            {"tank_id": 1, "volume": 20.0, "created_at": "2023-01-03T10:00:00"},
+            {"tank_id": 1, "volume": 40.0, "created_at": "2023-01-04T10:00:00"},
+        ],
+    )
+    assert response.status_code == 201
+    middle_id = response.json()[1]["id"]
+
+    response = client.patch(f"/tanks/1/volumes/{middle_id}", json={"volume": 30.0})
+    assert response.status_code == 200
+
+    response = client.delete(f"/tanks/1/volumes/{middle_id}")
+    assert response.status_code == 204
+
+    session.expire_all()
+    average_sales = session.query(AverageSale).order_by(AverageSale.date).all()
+    assert [
+        (average_sale.date.isoformat(), average_sale.sales, average_sale.total)
+        for average_sale in average_sales
+    ] == [
+        ("2023-01-04", 1, 30),
+        ("2023-01-11", 1, 30),
+        ("2023-01-18", 1, 30),
+        ("2023-01-25", 1, 30),
+        ("2023-02-01", 1, 30),
+    ]
+    assert [
+        (daily_sale.date.isoformat(), daily_sale.sales, daily_sale.total)
+        for daily_sale in session.query(DailySale).order_by(DailySale.date)
+    ] == [("2023-01-04", 1, 30)]
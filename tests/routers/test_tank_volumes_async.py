@@ -0,0 +1,364 @@
+import json
+from datetime import datetime
+from typing import Any
+
+from fastapi.testclient import TestClient
+from pytest import fixture
+from sqlmodel import Session
+
+from tanks.models import AverageSale, Tank, TankVolume, TankVolumeDeletion
+
+from ..conftest import CreateDBRowsFunction
+from ..helpers import create_inconsistent_tank_volumes, import_tank_volumes
+
+
+@fixture(name="database_url", autouse=True)
+def database_url_fixture(file_database_url: str) -> str:
+    return file_database_url
+
+
+@fixture(name="tank_volumes")
+def tank_volumes_fixture(create_db_rows: CreateDBRowsFunction) -> list[TankVolume]:
+    create_db_rows(
+        Tank(id=1, name="ULS Diesel"),
+        Tank(id=2, name="Top Diesel"),
+        TankVolume(id=4, tank_id=2, volume=10, created_at=datetime(2023, 1, 15, 14, 0)),
+    )
+
+    return create_db_rows(
+        TankVolume(id=1, tank_id=1, volume=10, created_at=datetime(2023, 1, 1, 10, 0)),
+        TankVolume(id=2, tank_id=1, volume=45, created_at=datetime(2023, 1, 8, 9, 0)),
+        TankVolume(id=3, tank_id=1, volume=10, created_at=datetime(2023, 1, 15, 14, 0)),
+    )
+
+
+def as_dict(tank_volume: TankVolume) -> dict[str, Any]:
+    result = tank_volume.dict()
+    result["created_at"] = tank_volume.created_at.isoformat()
+    result["updated_at"] = tank_volume.updated_at.isoformat()
+    return result
+
+
+def test_create(session: Session, async_client: TestClient):
+    session.add(Tank(id=1, name="USL Diesel"))
+    session.commit()
+
+    response = async_client.post("/tanks/1/volumes", json={"volume": 10.0})
+    assert response.status_code == 201
+    response = async_client.post("/tanks/1/volumes", json={"volume": 20.0})
+    assert response.status_code == 201
+
+    created_tank_volume = response.json()
+    assert created_tank_volume.get("tank_id") == 1
+    assert created_tank_volume.get("volume") == 20
+    assert session.query(TankVolume).filter_by(id=created_tank_volume["id"]).first()
+    assert session.query(AverageSale).count() == 5
+
+
+def test_create_many(session: Session, async_client: TestClient):
+    session.add(Tank(id=1, name="USL Diesel"))
+    session.commit()
+
+    response = async_client.post(
+        "/tanks/volumes/batch",
+        json=[
+            {"tank_id": 1, "volume": 10.0, "created_at": "2023-01-01T10:00:00"},
+            {"tank_id": 1, "volume": 30.0, "created_at": "2023-01-03T10:00:00"},
+        ],
+    )
+
+    assert response.status_code == 201
+    assert [tank_volume["volume"] for tank_volume in response.json()] == [10, 30]
+    assert session.query(AverageSale).count() == 5
+
+
+def test_create_many_inconsistently(session: Session, async_client: TestClient):
+    session.add(Tank(id=1, name="USL Diesel"))
+    session.add(TankVolume(id=1, tank_id=1, volume=10, created_at=datetime(2023, 1, 1)))
+    session.add(TankVolume(id=2, tank_id=1, volume=20, created_at=datetime(2023, 1, 3)))
+    session.commit()
+
+    response = async_client.post(
+        "/tanks/volumes/batch",
+        json=[{"tank_id": 1, "volume": 15.0, "created_at": "2023-01-02T10:00:00"}],
+    )
+
+    assert response.status_code == 201
+    assert session.query(TankVolume).count() == 3
+
+
+def test_create_many_at_stored_times(session: Session, async_client: TestClient):
+    session.add(Tank(id=1, name="USL Diesel"))
+    session.add(TankVolume(id=1, tank_id=1, volume=10, created_at=datetime(2023, 1, 1)))
+    session.commit()
+
+    response = async_client.post(
+        "/tanks/volumes/batch",
+        json=[{"tank_id": 1, "volume": 20.0, "created_at": "2023-01-01T00:00:00"}],
+    )
+
+    assert response.status_code == 409
+    assert session.query(TankVolume).count() == 1
+
+
+def test_create_for_unknown_tank(async_client: TestClient):
+    response = async_client.post("/tanks/1/volumes", json={"volume": 10.0})
+
+    assert response.status_code == 404
+
+
+def test_get_one(async_client: TestClient, tank_volumes: list[TankVolume]):
+    tank_volume = tank_volumes[1]
+
+    response = async_client.get(
+        f"/tanks/{tank_volume.tank_id}/volumes/{tank_volume.id}"
+    )
+
+    assert response.status_code == 200
+    assert response.json() == as_dict(tank_volume)
+
+
+def test_get_one_miss(async_client: TestClient, tank_volumes: list[TankVolume]):
+    response = async_client.get(f"/tanks/{tank_volumes[0].tank_id}/volumes/1000")
+    assert response.status_code == 404
+
+    response = async_client.get(f"/tanks/1000/volumes/{tank_volumes[0].id}")
+    assert response.status_code == 404
+
+
+def test_get_many(async_client: TestClient, tank_volumes: list[TankVolume]):
+    response = async_client.get("/tanks/1/volumes?offset=1&limit=10")
+
+    assert response.status_code == 200
+    assert response.json().get("items") == [
+        as_dict(tank_volume) for tank_volume in tank_volumes[1:]
+    ]
+    assert response.json().get("total") == len(tank_volumes)
+
+
+def test_get_many_cursor(async_client: TestClient, tank_volumes: list[TankVolume]):
+    response = async_client.get("/tanks/1/volumes?limit=2")
+    next_cursor = response.json().get("next_cursor")
+
+    response = async_client.get(f"/tanks/1/volumes?limit=2&cursor={next_cursor}")
+
+    assert response.status_code == 200
+    assert response.json().get("items") == [as_dict(tank_volumes[2])]
+    assert response.json().get("total") is None
+
+
+def test_get_many_time_range(async_client: TestClient, tank_volumes: list[TankVolume]):
+    response = async_client.get(
+        "/tanks/1/volumes?limit=10&from=2023-01-08T00:00:00&order=desc"
+    )
+
+    assert response.status_code == 200
+    assert response.json().get("items") == [
+        as_dict(tank_volumes[2]),
+        as_dict(tank_volumes[1]),
+    ]
+
+
+def test_export(
+    async_client: TestClient, tank_volumes: list[TankVolume]
+):  # pylint: disable=unused-argument
+    response = async_client.get("/tanks/1/volumes/export?to=2023-01-15T00:00:00")
+
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == [1, 2]
+
+
+def test_export_csv(
+    async_client: TestClient, tank_volumes: list[TankVolume]
+):  # pylint: disable=unused-argument
+    response = async_client.get(
+        "/tanks/2/volumes/export?format=csv", headers={"Accept-Encoding": "identity"}
+    )
+
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+    assert response.text.splitlines() == [
+        "id,tank_id,created_at,volume",
+        "4,2,2023-01-15T14:00:00,10.0",
+    ]
+
+
+def test_buckets(session: Session, async_client: TestClient):
+    session.add(Tank(id=1, name="USL Diesel"))
+    session.commit()
+    response = async_client.post(
+        "/tanks/volumes/batch",
+        json=[
+            {"tank_id": 1, "volume": 10.0, "created_at": "2023-01-01T10:05:00"},
+            {"tank_id": 1, "volume": 30.0, "created_at": "2023-01-01T10:50:00"},
+            {"tank_id": 1, "volume": 40.0, "created_at": "2023-01-01T12:00:00"},
+        ],
+    )
+    ids = [tank_volume["id"] for tank_volume in response.json()]
+
+    async_client.patch(f"/tanks/1/volumes/{ids[0]}", json={"volume": 20.0})
+    async_client.delete(f"/tanks/1/volumes/{ids[2]}")
+    response = async_client.get("/tanks/1/volumes/buckets")
+
+    assert response.status_code == 200
+    assert response.json() == [
+        {
+            "start": "2023-01-01T10:00:00",
+            "count": 2,
+            "min": 20.0,
+            "max": 30.0,
+            "avg": 25.0,
+            "last": 30.0,
+        }
+    ]
+
+
+def test_import(session: Session, async_client: TestClient):
+    response = import_tank_volumes(session, async_client)
+
+    assert response.status_code == 201
+    assert response.json() == {"imported": 2, "average_sales": 5}
+    assert session.query(AverageSale).count() == 5
+
+
+def test_update(
+    session: Session, async_client: TestClient, tank_volumes: list[TankVolume]
+):
+    tank_volume = tank_volumes[0]
+
+    response = async_client.patch(
+        f"/tanks/1/volumes/{tank_volume.id}", json={"volume": 20}
+    )
+
+    assert response.status_code == 200
+    assert response.json()["volume"] == 20
+    session.expire_all()
+    assert session.query(TankVolume).filter_by(id=tank_volume.id).one().volume == 20
+
+
+def test_update_miss(
+    async_client: TestClient, tank_volumes: list[TankVolume]
+):  # pylint: disable=unused-argument
+    response = async_client.patch("/tanks/2/volumes/1", json={"volume": 10})
+
+    assert response.status_code == 404
+
+
+def test_delete(
+    session: Session, async_client: TestClient, tank_volumes: list[TankVolume]
+):
+    tank_volume = tank_volumes[0]
+
+    response = async_client.delete(
+        f"/tanks/{tank_volume.tank_id}/volumes/{tank_volume.id}"
+    )
+
+    assert response.status_code == 204
+    assert session.query(TankVolume).filter_by(id=tank_volume.id).count() == 0
+    assert session.query(
+        TankVolumeDeletion.tank_id, TankVolumeDeletion.created_at
+    ).all() == [(tank_volume.tank_id, tank_volume.created_at)]
+
+
+def test_delete_miss(
+    async_client: TestClient, tank_volumes: list[TankVolume]
+):  # pylint: disable=unused-argument
+    response = async_client.delete("/tanks/1/volumes/1000")
+    assert response.status_code == 404
+
+    response = async_client.delete("/tanks/2/volumes/1")
+    assert response.status_code == 404
+
+
+@fixture(name="inconsistent_tank_volumes")
+def inconsistent_tank_volumes_fixture(
+    session: Session, async_client: TestClient
+) -> list[int]:
+    return create_inconsistent_tank_volumes(session, async_client)
+
+
+def test_create_inconsistently(
+    session: Session, async_client: TestClient, inconsistent_tank_volumes: list[int]
+):  # pylint: disable=unused-argument
+    response = async_client.post("/tanks/1/volumes", json={"volume": 15.0})
+
+    assert response.status_code == 201
+    assert session.query(TankVolume).count() == 3
+
+
+def test_create_inconsistently_in_unit_of_work(
+    session: Session,
+    async_client: TestClient,
+    inconsistent_tank_volumes: list[int],
+    unit_of_work: None,
+):  # pylint: disable=unused-argument
+    response = async_client.post("/tanks/1/volumes", json={"volume": 15.0})
+
+    assert response.status_code == 409
+    assert session.query(TankVolume).count() == 2
+
+
+def test_create_many_inconsistently_in_unit_of_work(
+    session: Session,
+    async_client: TestClient,
+    inconsistent_tank_volumes: list[int],
+    unit_of_work: None,
+):  # pylint: disable=unused-argument
+    response = async_client.post(
+        "/tanks/volumes/batch",
+        json=[{"tank_id": 1, "volume": 15.0, "created_at": "2023-01-02T10:00:00"}],
+    )
+
+    assert response.status_code == 409
+    assert session.query(TankVolume).count() == 2
+
+
+def test_update_inconsistently_in_unit_of_work(
+    session: Session,
+    async_client: TestClient,
+    inconsistent_tank_volumes: list[int],
+    unit_of_work: None,
+):  # pylint: disable=unused-argument
+    tank_volume_id = inconsistent_tank_volumes[1]
+
+    response = async_client.patch(
+        f"/tanks/1/volumes/{tank_volume_id}", json={"volume": 5}
+    )
+
+    assert response.status_code == 409
+    assert session.query(TankVolume).filter_by(id=tank_volume_id).one().volume == 20
+
+
+def test_create_many_and_update_in_unit_of_work(
+    session: Session, async_client: TestClient, unit_of_work: None
+):  # pylint: disable=unused-argument
+    session.add(Tank(id=1, name="ULS Diesel"))
+    session.commit()
+    response = async_client.post(
+        "/tanks/volumes/batch",
+        json=[
+            {"tank_id": 1, "volume": 10.0, "created_at": "2023-01-01T10:00:00"},
+            {"tank_id": 1, "volume": 20.0, "created_at": "2023-01-03T10:00:00"},
+        ],
+    )
+    assert response.status_code == 201
+
+    response = async_client.patch(
+        f"/tanks/1/volumes/{response.json()[1]['id']}", json={"volume": 30}
+    )
+
+    assert response.status_code == 200
+    assert [row.total for row in session.query(AverageSale)] == [20] * 5
+
+
+def test_delete_inconsistently_in_unit_of_work(
+    session: Session,
+    async_client: TestClient,
+    inconsistent_tank_volumes: list[int],
+    unit_of_work: None,
+):  # pylint: disable=unused-argument
+    response = async_client.delete(f"/tanks/1/volumes/{inconsistent_tank_volumes[1]}")
+
+    assert response.status_code == 409
+    assert session.query(TankVolume).count() == 2
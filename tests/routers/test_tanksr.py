@@ -1,10 +1,12 @@
 from typing import Generator
 
 from fastapi.testclient import TestClient
-from pytest import fixture
+from pytest import MonkeyPatch, fixture, raises
+from sqlalchemy.exc import NoResultFound
 from sqlmodel import Session
 
 from tanks.models import Tank
+from tanks.routers.tanksr import KNOWN_TANKS, check_tank
 
 
 @fixture(name="tanks")
@@ -99,6 +101,19 @@ def test_update(session: Session, client: TestClient, tanks: list[Tank]):
     assert updated_tank.name == new_name
 
 
+def test_update_commits_once(
+    session: Session, client: TestClient, tanks: list[Tank], monkeypatch: MonkeyPatch
+):
+    commits: list[None] = []
+    commit = session.commit
+    monkeypatch.setattr(session, "commit", lambda: commits.append(commit()))
+
+    response = client.put(f"/tanks/{tanks[0].id}", json={"name": "Top Diesel"})
+
+    assert response.status_code == 200
+    assert len(commits) == 1
+
+
 def test_update_miss(client: TestClient):
     response = client.put(
         "/tanks/1",
@@ -123,3 +138,39 @@ def test_delete_miss(client: TestClient):
     response = client.delete("/tanks/1")
 
     assert response.status_code == 404
+
+
+def test_many_cursor(client: TestClient, tanks: list[Tank]):
+    response = client.get("/tanks?limit=2")
+    next_cursor = response.json().get("next_cursor")
+
+    response = client.get(f"/tanks?limit=2&cursor={next_cursor}")
+
+    assert response.status_code == 200
+    assert response.json().get("items") == [tanks[2].dict()]
+    assert response.json().get("next_cursor") is None
+
+
+def test_many_cached_total(client: TestClient, tanks: list[Tank]):
+    response = client.get("/tanks?limit=2&total=cached")
+
+    assert response.status_code == 200
+    assert response.json().get("total") == len(tanks)
+
+
+def test_check_tank(
+    session: Session, client: TestClient, tanks: list[Tank]
+):  # pylint: disable=unused-argument
+    check_tank(session, 1)
+    assert KNOWN_TANKS.get(1)
+
+    with raises(NoResultFound):
+        check_tank(session, 4)
+    assert KNOWN_TANKS.get(4) is None
+
+    client.put("/tanks/1", json={"name": "Top Diesel"})
+    assert KNOWN_TANKS.get(1) is None
+
+    check_tank(session, 1)
+    client.delete("/tanks/1")
+    assert KNOWN_TANKS.get(1) is None
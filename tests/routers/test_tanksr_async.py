@@ -0,0 +1,94 @@
+from fastapi.testclient import TestClient
+from pytest import fixture
+from sqlmodel import Session
+
+from tanks.models import Tank
+
+from ..conftest import CreateDBRowsFunction
+
+
+@fixture(name="database_url", autouse=True)
+def database_url_fixture(file_database_url: str) -> str:
+    return file_database_url
+
+
+@fixture(name="tanks")
+def tanks_fixture(create_db_rows: CreateDBRowsFunction) -> list[Tank]:
+    return create_db_rows(
+        Tank(id=1, name="ULS Diesel"),
+        Tank(id=2, name="93 Premium Gasoline"),
+        Tank(id=3, name="Top Diesel"),
+    )
+
+
+def test_create(session: Session, async_client: TestClient):
+    tank_name = "ULS Diesel"
+
+    response = async_client.post("/tanks", json={"name": tank_name})
+
+    assert response.status_code == 201
+    assert response.json()["name"] == tank_name
+
+    assert session.query(Tank).filter_by(id=response.json()["id"]).first()
+
+
+def test_get_one(async_client: TestClient, tanks: list[Tank]):
+    tank = tanks[0]
+
+    response = async_client.get(f"/tanks/{tank.id}")
+
+    assert response.status_code == 200
+    assert response.json() == tank.dict()
+
+
+def test_get_one_miss(async_client: TestClient):
+    response = async_client.get("/tanks/1")
+
+    assert response.status_code == 404
+
+
+def test_many(async_client: TestClient, tanks: list[Tank]):
+    response = async_client.get("/tanks?offset=1&limit=10")
+
+    assert response.status_code == 200
+    assert response.json().get("items") == [tank.dict() for tank in tanks[1:]]
+    assert response.json().get("total") == len(tanks)
+    assert response.json().get("offset") == 1
+
+
+def test_many_cursor(async_client: TestClient, tanks: list[Tank]):
+    response = async_client.get("/tanks?limit=2")
+    next_cursor = response.json().get("next_cursor")
+
+    response = async_client.get(f"/tanks?limit=2&cursor={next_cursor}")
+
+    assert response.status_code == 200
+    assert response.json().get("items") == [tanks[2].dict()]
+
+
+def test_update(session: Session, async_client: TestClient, tanks: list[Tank]):
+    response = async_client.put(f"/tanks/{tanks[0].id}", json={"name": "Changed"})
+
+    assert response.status_code == 200
+    assert response.json() == {"id": tanks[0].id, "name": "Changed"}
+    session.expire_all()
+    assert session.query(Tank).filter_by(id=tanks[0].id).one().name == "Changed"
+
+
+def test_update_miss(async_client: TestClient):
+    response = async_client.put("/tanks/1", json={"name": "Changed"})
+
+    assert response.status_code == 404
+
+
+def test_delete(session: Session, async_client: TestClient, tanks: list[Tank]):
+    response = async_client.delete(f"/tanks/{tanks[0].id}")
+
+    assert response.status_code == 204
+    assert session.query(Tank).filter_by(id=tanks[0].id).count() == 0
+
+
+def test_delete_miss(async_client: TestClient):
+    response = async_client.delete("/tanks/1")
+
+    assert response.status_code == 404
@@ -6,7 +6,9 @@ from fastapi.testclient import TestClient
 from freezegun import freeze_time
 from sqlmodel import Session
 
-from tanks.models import AverageSale, Tank
+from tanks.models import AverageSale, DailySale, Tank, TankVolume
+
+from .helpers import create_inconsistent_tank_volumes
 
 
 def test_create_tank_volume(session: Session, client: TestClient):
@@ -76,6 +78,45 @@ def test_update_tank_volume(
     assert all(row.average == 20 for row in session.query(AverageSale).all())
 
 
+def test_update_tank_volume_inconsistently(
+    session: Session, client: TestClient, add_tank_volume: AddTankVolumeFunction
+):
+    add_tank_volume(datetime(2023, 1, 1, 10, 0), 10)
+    id2 = add_tank_volume(datetime(2023, 1, 3, 10, 0), 20)
+    session.query(AverageSale).delete()
+    session.commit()
+
+    response = client.patch(
+        f"/tanks/1/volumes/{id2}",
+        json={"volume": 5},
+    )
+
+    assert response.status_code == 200
+    assert session.query(TankVolume).filter_by(id=id2).one().volume == 5
+    assert session.query(AverageSale).count() == 0
+
+
+def test_update_tank_volume_inconsistently_with_daily_sales(
+    session: Session, client: TestClient, add_tank_volume: AddTankVolumeFunction
+):
+    add_tank_volume(datetime(2023, 1, 1, 10, 0), 10)
+    id2 = add_tank_volume(datetime(2023, 1, 3, 10, 0), 20)
+    session.query(DailySale).delete()
+    session.commit()
+
+    response = client.patch(
+        f"/tanks/1/volumes/{id2}",
+        json={"volume": 5},
+    )
+
+    assert response.status_code == 200
+    assert session.query(TankVolume).filter_by(id=id2).one().volume == 5
+    # The average sales are rolled back with the failing daily sales.
+    assert [(row.sales, row.total) for row in session.query(AverageSale)] == [
+        (1, 10)
+    ] * 5
+
+
 def test_delete_tank_volume(
     session: Session,
     client: TestClient,
@@ -89,3 +130,168 @@ def test_delete_tank_volume(
 
     assert response.status_code == 204
     assert session.query(AverageSale).count() == 0
+
+
+def test_create_many_tank_volumes(session: Session, client: TestClient):
+    session.add(Tank(id=1, name="USL Diesel"))
+    client.post(
+        "/tanks/volumes/batch",
+        json=[{"tank_id": 1, "volume": 10.0, "created_at": "2023-01-01T10:00:00"}],
+    )
+
+    response = client.post(
+        "/tanks/volumes/batch",
+        json=[
+            {"tank_id": 1, "volume": 30.0, "created_at": "2023-01-03T10:00:00"},
+            {"tank_id": 1, "volume": 20.0, "created_at": "2023-01-02T10:00:00"},
+            {"tank_id": 1, "volume": 15.0, "created_at": "2023-01-03T12:00:00"},
+        ],
+    )
+
+    assert response.status_code == 201
+    rows = session.query(AverageSale).order_by(AverageSale.date).all()
+    assert len(rows) == 10
+    assert [(row.date.isoformat(), row.sales, row.total) for row in rows[:2]] == [
+        ("2023-01-02", 1, 10),
+        ("2023-01-03", 1, 10),
+    ]
+
+
+def test_create_many_tank_volumes_inconsistently(session: Session, client: TestClient):
+    session.add(Tank(id=1, name="USL Diesel"))
+    client.post(
+        "/tanks/volumes/batch",
+        json=[
+            {"tank_id": 1, "volume": 10.0, "created_at": "2023-01-01T10:00:00"},
+            {"tank_id": 1, "volume": 20.0, "created_at": "2023-01-03T10:00:00"},
+        ],
+    )
+    session.query(AverageSale).delete()
+    session.commit()
+
+    response = client.post(
+        "/tanks/volumes/batch",
+        json=[{"tank_id": 1, "volume": 15.0, "created_at": "2023-01-02T10:00:00"}],
+    )
+
+    assert response.status_code == 201
+    assert session.query(TankVolume).count() == 3
+    assert session.query(AverageSale).count() == 0
+
+
+@pytest.fixture(name="inconsistent_tank_volumes")
+def inconsistent_tank_volumes_fixture(
+    session: Session, client: TestClient
+) -> list[int]:
+    return create_inconsistent_tank_volumes(session, client)
+
+
+def test_create_tank_volume_inconsistently(
+    session: Session, client: TestClient, inconsistent_tank_volumes: list[int]
+):  # pylint: disable=unused-argument
+    response = client.post("/tanks/1/volumes", json={"volume": 15.0})
+
+    assert response.status_code == 201
+    assert session.query(TankVolume).count() == 3
+
+
+def test_create_tank_volume_in_unit_of_work(
+    session: Session,
+    add_tank_volume: AddTankVolumeFunction,
+    unit_of_work: None,
+):  # pylint: disable=unused-argument
+    add_tank_volume(datetime(2023, 1, 1, 10, 0), 10)
+    add_tank_volume(datetime(2023, 1, 3, 10, 0), 20)
+
+    session.rollback()
+    assert session.query(TankVolume).count() == 2
+    assert session.query(AverageSale).count() == 5
+
+
+def test_create_tank_volume_inconsistently_in_unit_of_work(
+    session: Session,
+    client: TestClient,
+    inconsistent_tank_volumes: list[int],
+    unit_of_work: None,
+):  # pylint: disable=unused-argument
+    response = client.post("/tanks/1/volumes", json={"volume": 15.0})
+
+    assert response.status_code == 409
+    assert session.query(TankVolume).count() == 2
+    assert session.query(AverageSale).count() == 0
+
+
+def test_create_many_tank_volumes_inconsistently_in_unit_of_work(
+    session: Session,
+    client: TestClient,
+    inconsistent_tank_volumes: list[int],
+    unit_of_work: None,
+):  # pylint: disable=unused-argument
+    response = client.post(
+        "/tanks/volumes/batch",
+        json=[{"tank_id": 1, "volume": 15.0, "created_at": "2023-01-02T10:00:00"}],
+    )
+
+    assert response.status_code == 409
+    assert session.query(TankVolume).count() == 2
+
+
+def test_update_tank_volume_in_unit_of_work(
+    session: Session,
+    client: TestClient,
+    add_tank_volume: AddTankVolumeFunction,
+    unit_of_work: None,
+):  # pylint: disable=unused-argument
+    add_tank_volume(datetime(2023, 1, 1, 10, 0), 10)
+    id2 = add_tank_volume(datetime(2023, 1, 3, 10, 0), 20)
+
+    response = client.patch(f"/tanks/1/volumes/{id2}", json={"volume": 30})
+
+    assert response.status_code == 200
+    session.rollback()
+    assert all(row.average == 20 for row in session.query(AverageSale).all())
+
+
+def test_update_tank_volume_inconsistently_in_unit_of_work(
+    session: Session,
+    client: TestClient,
+    inconsistent_tank_volumes: list[int],
+    unit_of_work: None,
+):  # pylint: disable=unused-argument
+    response = client.patch(
+        f"/tanks/1/volumes/{inconsistent_tank_volumes[1]}", json={"volume": 5}
+    )
+
+    assert response.status_code == 409
+    assert (
+        session.query(TankVolume).filter_by(id=inconsistent_tank_volumes[1]).one()
+    ).volume == 20
+
+
+def test_delete_tank_volume_inconsistently_in_unit_of_work(
+    session: Session,
+    client: TestClient,
+    inconsistent_tank_volumes: list[int],
+    unit_of_work: None,
+):  # pylint: disable=unused-argument
+    response = client.delete(f"/tanks/1/volumes/{inconsistent_tank_volumes[1]}")
+
+    assert response.status_code == 409
+    assert session.query(TankVolume).count() == 2
+
+
+def test_delete_tank_volume_in_unit_of_work(
+    session: Session,
+    client: TestClient,
+    add_tank_volume: AddTankVolumeFunction,
+    unit_of_work: None,
+):  # pylint: disable=unused-argument
+    add_tank_volume(datetime(2023, 1, 1, 10, 0), 10)
+    id2 = add_tank_volume(datetime(2023, 1, 3, 10, 0), 20)
+
+    response = client.delete(f"/tanks/1/volumes/{id2}")
+
+    assert response.status_code == 204
+    session.rollback()
+    assert session.query(TankVolume).count() == 1
+    assert session.query(AverageSale).count() == 0
@@ -0,0 +1,188 @@
+import csv
+import io
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from tanks.backfill import backfill, main, write_average_sales
+from tanks.config import Settings
+from tanks.models import (
+    AverageSale,
+    AverageSaleDeletion,
+    DailySale,
+    HourlyVolume,
+    SalesWindow,
+    WindowedSale,
+)
+
+from .helpers import READINGS, PostgresConnection, create_tanks
+
+
+@pytest.fixture(name="database_url", autouse=True)
+def database_url_fixture(file_database_url: str) -> str:
+    return file_database_url
+
+
+@pytest.fixture(name="average_sales")
+def average_sales_fixture(session: Session, client: TestClient) -> list[tuple]:
+    create_tanks(
+        session,
+        client,
+        [
+            *READINGS,
+            {"tank_id": 1, "volume": 40.0, "created_at": "2023-02-20T12:00:00"},
+        ],
+    )
+
+    return _rows(session)
+
+
+def _rows(session: Session) -> list[tuple]:
+    session.expire_all()
+    return [
+        (row.tank_id, row.date, row.sales, row.total)
+        for row in session.query(AverageSale).order_by(
+            AverageSale.tank_id, AverageSale.date
+        )
+    ]
+
+
+def test_backfill(session: Session, average_sales: list[tuple], settings: Settings):
+    session.query(AverageSale).delete()
+    session.query(HourlyVolume).delete()
+    session.commit()
+
+    written = backfill(settings, start=date(2023, 1, 1), end=date(2023, 12, 31))
+
+    assert written == len(average_sales)
+    assert _rows(session) == average_sales
+    assert session.query(HourlyVolume).count() == 7
+    assert session.query(DailySale).count() == 4
+
+
+def test_backfill_sales_windows(
+    session: Session, average_sales: list[tuple], settings: Settings
+):
+    session.add(SalesWindow(id=1, tank_id=1, calendar="weekday", length=5))
+    session.commit()
+
+    backfill(settings, start=date(2023, 1, 1), end=date(2023, 12, 31))
+
+    assert [
+        (row.start.date(), row.sales, row.total)
+        for row in session.query(WindowedSale).order_by(WindowedSale.start)
+    ] == [
+        (day, sales, total)
+        for tank_id, day, sales, total in average_sales
+        if tank_id == 1
+    ]
+
+
+def test_backfill_range(
+    session: Session, average_sales: list[tuple], settings: Settings
+):
+    session.query(AverageSale).filter_by(tank_id=1).update({"sales": 99})
+    session.commit()
+
+    backfill(
+        settings,
+        start=date(2023, 1, 9),
+        end=date(2023, 1, 30),
+        tank_ids=[1],
+        chunk_size=1,
+    )
+
+    rows = _rows(session)
+    in_range = [
+        row
+        for row in rows
+        if row[0] == 1 and date(2023, 1, 9) <= row[1] <= date(2023, 1, 30)
+    ]
+    assert in_range == [
+        row
+        for row in average_sales
+        if row[0] == 1 and date(2023, 1, 9) <= row[1] <= date(2023, 1, 30)
+    ]
+    assert all(
+        row[2] == 99
+        for row in rows
+        if row[0] == 1 and not date(2023, 1, 9) <= row[1] <= date(2023, 1, 30)
+    )
+    assert session.get(AverageSaleDeletion, 1)
+    assert session.get(AverageSaleDeletion, 2) is None
+
+
+def test_backfill_in_parallel(
+    session: Session, average_sales: list[tuple], settings: Settings
+):
+    session.query(AverageSale).delete()
+    session.commit()
+
+    backfill(
+        settings,
+        start=date(2023, 1, 1),
+        end=date(2023, 12, 31),
+        workers=2,
+        chunk_size=1,
+    )
+
+    assert _rows(session) == average_sales
+
+
+def test_backfill_invalid_range(settings: Settings):
+    with pytest.raises(ValueError):
+        backfill(settings, start=date(2023, 2, 1), end=date(2023, 1, 1))
+
+
+def test_main(
+    session: Session,
+    average_sales: list[tuple],
+    capsys: pytest.CaptureFixture,
+):
+    session.query(AverageSale).delete()
+    session.commit()
+
+    main(["--start", "2023-01-01", "--end", "2023-12-31", "--tank-id", "2"])
+
+    assert _rows(session) == [row for row in average_sales if row[0] == 2]
+    assert capsys.readouterr().out == f"Wrote {len(_rows(session))} average sales.\n"
+
+
+def test_backfill_without_sales(
+    session: Session, average_sales: list[tuple], settings: Settings
+):
+    written = backfill(settings, start=date(2023, 6, 1), end=date(2023, 6, 30))
+
+    assert written == 0
+    assert _rows(session) == average_sales
+    assert session.query(AverageSaleDeletion).count() == 0
+
+
+def test_write_average_sales_with_copy(session: Session):
+    session.add(
+        AverageSale(id=None, tank_id=1, date=date(2023, 1, 2), sales=1, total=5)
+    )
+    session.commit()
+    connection = PostgresConnection(session.connection())
+
+    write_average_sales(
+        connection,  # type: ignore
+        tank_id=1,
+        start=date(2023, 1, 2),
+        end=date(2023, 1, 9),
+        average_sales=[(date(2023, 1, 2), 2, 30.0), (date(2023, 1, 9), 1, 10.0)],
+    )
+
+    assert len(connection.cursor.copies) == 1
+    sql, data = connection.cursor.copies[0]
+    assert sql == (
+        "COPY averagesale (tank_id, date, sales, total, updated_at) "
+        "FROM STDIN WITH (FORMAT csv)"
+    )
+    assert [row[:4] for row in csv.reader(io.StringIO(data))] == [
+        ["1", "2023-01-02", "2", "30.0"],
+        ["1", "2023-01-09", "1", "10.0"],
+    ]
+    assert session.query(AverageSale).count() == 0
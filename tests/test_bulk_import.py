@@ -0,0 +1,234 @@
+import asyncio
+import io
+from pathlib import Path
+
+import pytest
+from sqlalchemy.util import greenlet_spawn
+from sqlmodel import Session
+
+from tanks import bulk_import
+from tanks.bulk_import import InvalidImport, import_volumes, main
+from tanks.models import (
+    AverageSale,
+    DailySale,
+    HourlyVolume,
+    SalesWindow,
+    Tank,
+    TankVolume,
+    WindowedSale,
+)
+
+from .conftest import CreateDBRowsFunction
+from .helpers import PostgresConnection
+
+CSV = """tank_id,created_at,volume
+1,2023-01-01T10:00:00,10.0
+1,2023-01-03T10:00:00,20.0
+2,2023-01-02T10:00:00,5.0
+2,2023-01-09T10:00:00,15.0
+"""
+
+
+@pytest.fixture(name="database_url", autouse=True)
+def database_url_fixture(file_database_url: str) -> str:
+    return file_database_url
+
+
+@pytest.fixture(name="tanks")
+def tanks_fixture(create_db_rows: CreateDBRowsFunction) -> list[Tank]:
+    return create_db_rows(
+        Tank(id=1, name="ULS Diesel"),
+        Tank(id=2, name="Top Diesel"),
+    )
+
+
+def _average_sales(session: Session) -> list[tuple]:
+    session.expire_all()
+    return [
+        (row.tank_id, row.date.isoformat(), row.sales, row.total)
+        for row in session.query(AverageSale).order_by(
+            AverageSale.tank_id, AverageSale.date
+        )
+    ]
+
+
+def test_import_volumes(
+    session: Session, tanks: list[Tank]
+):  # pylint: disable=unused-argument
+    result = import_volumes(session.connection(), io.StringIO(CSV))
+    session.commit()
+
+    assert result.imported == 4
+    assert result.average_sales == 10
+    assert session.query(TankVolume).count() == 4
+    assert _average_sales(session)[:1] == [(1, "2023-01-03", 1, 10)]
+    assert _average_sales(session)[5:6] == [(2, "2023-01-09", 1, 10)]
+    assert session.query(HourlyVolume).count() == 4
+    assert [
+        (row.tank_id, row.date.isoformat(), row.cumulative_sales, row.cumulative_total)
+        for row in session.query(DailySale).order_by(DailySale.tank_id, DailySale.date)
+    ] == [(1, "2023-01-03", 1, 10), (2, "2023-01-09", 1, 10)]
+
+
+def test_import_volumes_with_sales_window(
+    session: Session, create_db_rows: CreateDBRowsFunction, tanks: list[Tank]
+):  # pylint: disable=unused-argument
+    create_db_rows(SalesWindow(id=1, tank_id=2, calendar="day", length=3))
+
+    import_volumes(session.connection(), io.StringIO(CSV))
+    session.commit()
+
+    assert [
+        (row.start.isoformat(), row.sales, row.total)
+        for row in session.query(WindowedSale).order_by(WindowedSale.start)
+    ] == [
+        ("2023-01-09T00:00:00", 1, 10),
+        ("2023-01-10T00:00:00", 1, 10),
+        ("2023-01-11T00:00:00", 1, 10),
+    ]
+
+
+def test_import_volumes_between_existing(
+    session: Session, tanks: list[Tank]
+):  # pylint: disable=unused-argument
+    import_volumes(
+        session.connection(),
+        io.StringIO(
+            "id,tank_id,created_at,volume\n"
+            "1,1,2023-01-01T10:00:00,10.0\n"
+            "2,1,2023-01-15T10:00:00,30.0\n"
+        ),
+    )
+    session.commit()
+
+    result = import_volumes(
+        session.connection(),
+        io.StringIO(
+            "tank_id,volume,created_at\n"
+            "1,20.0,2023-01-08T10:00:00\n"
+            "1,30.0,2023-01-15T10:00:00\n"
+        ),
+    )
+    session.commit()
+
+    assert result.imported == 1
+    assert [row for row in _average_sales(session) if row[2] == 2] == [
+        (1, "2023-01-15", 2, 20),
+        (1, "2023-01-22", 2, 20),
+        (1, "2023-01-29", 2, 20),
+        (1, "2023-02-05", 2, 20),
+    ]
+
+
+def test_import_volumes_in_batches(
+    session: Session, tanks: list[Tank], monkeypatch: pytest.MonkeyPatch
+):  # pylint: disable=unused-argument
+    monkeypatch.setattr(bulk_import, "IMPORT_BATCH_SIZE", 2)
+
+    import_volumes(session.connection(), io.StringIO(CSV))
+    session.commit()
+
+    assert session.query(TankVolume).count() == 4
+
+
+def test_import_duplicated_volumes(
+    session: Session, tanks: list[Tank]
+):  # pylint: disable=unused-argument
+    result = import_volumes(
+        session.connection(),
+        io.StringIO(
+            "tank_id,created_at,volume\n"
+            "1,2023-01-01T10:00:00,10.0\n"
+            "1,2023-01-01T10:00:00,15.0\n"
+            "1,2023-01-03T10:00:00,20.0\n"
+        ),
+    )
+    session.commit()
+
+    assert result.imported == 2
+    assert [
+        (row.created_at.isoformat(), row.volume)
+        for row in session.query(TankVolume).order_by(TankVolume.created_at)
+    ] == [("2023-01-01T10:00:00", 15.0), ("2023-01-03T10:00:00", 20.0)]
+    assert _average_sales(session)[:1] == [(1, "2023-01-03", 1, 5)]
+
+
+def test_import_volumes_with_copy(
+    session: Session, tanks: list[Tank]
+):  # pylint: disable=unused-argument
+    connection = PostgresConnection(session.connection())
+
+    result = import_volumes(connection, io.StringIO(CSV))  # type: ignore
+
+    assert len(connection.cursor.copies) == 1
+    sql, data = connection.cursor.copies[0]
+    assert sql == (
+        "COPY tankvolume_staging (tank_id, created_at, volume) "
+        "FROM STDIN WITH (FORMAT csv)"
+    )
+    assert data == CSV.split("\n", 1)[1]
+    # The fake connection only records the COPY, so nothing is staged.
+    assert result.imported == 0
+
+
+def test_import_volumes_with_asyncpg_copy(
+    session: Session, tanks: list[Tank]
+):  # pylint: disable=unused-argument
+    connection = PostgresConnection(session.connection(), driver="asyncpg")
+
+    asyncio.run(greenlet_spawn(import_volumes, connection, io.StringIO(CSV)))
+
+    assert connection.driver_connection.copies == [
+        (
+            "tankvolume_staging",
+            ["tank_id", "created_at", "volume"],
+            CSV.split("\n", 1)[1],
+        )
+    ]
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        "tank_id,volume\n1,10.0\n",
+        "tank_id,created_at,volume,note\n",
+        "tank_id,created_at,volume\n1,yesterday,10.0\n",
+        "tank_id,created_at,volume\n1,2023-01-01T10:00:00\n",
+        "tank_id,created_at,volume\n3,2023-01-01T10:00:00,10.0\n",
+    ],
+)
+def test_import_invalid_volumes(
+    session: Session, tanks: list[Tank], content: str
+):  # pylint: disable=unused-argument
+    with pytest.raises(InvalidImport):
+        import_volumes(session.connection(), io.StringIO(content))
+
+
+def test_main(
+    session: Session,
+    tanks: list[Tank],
+    tmp_path: Path,
+    capsys: pytest.CaptureFixture,
+):  # pylint: disable=unused-argument
+    path = tmp_path / "volumes.csv"
+    path.write_text(CSV)
+
+    main([str(path)])
+
+    assert session.query(TankVolume).count() == 4
+    assert capsys.readouterr().out == (
+        "Imported 4 volumes and wrote 10 average sales.\n"
+    )
+
+
+def test_main_invalid(
+    session: Session, tanks: list[Tank], tmp_path: Path
+):  # pylint: disable=unused-argument
+    path = tmp_path / "volumes.csv"
+    path.write_text("tank_id,created_at,volume\n3,2023-01-01T10:00:00,10.0\n")
+
+    with pytest.raises(SystemExit) as exc_info:
+        main([str(path)])
+
+    assert exc_info.value.code == "Unknown tanks: [3]."
+    assert session.query(TankVolume).count() == 0
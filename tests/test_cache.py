@@ -0,0 +1,63 @@
+from dataclasses import dataclass
+
+from tanks.cache import TTLCache
+
+
+@dataclass
+class Clock:
+    now: float = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_get():
+    cache: TTLCache[str, int] = TTLCache(maxsize=2, ttl=1)
+
+    cache.set("a", 1)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("b", 0) == 0
+
+
+def test_expiration():
+    clock = Clock()
+    cache: TTLCache[str, int] = TTLCache(maxsize=2, ttl=1, clock=clock)
+    cache.set("a", 1)
+
+    clock.now = 0.5
+    assert cache.get("a") == 1
+
+    clock.now = 1
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_eviction_of_least_recently_used():
+    cache: TTLCache[str, int] = TTLCache(maxsize=2, ttl=1)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_invalidate():
+    cache: TTLCache[str, int] = TTLCache(maxsize=2, ttl=1)
+    cache.set("a", 1)
+    cache.set("b", 2)
+
+    cache.invalidate("a")
+    cache.invalidate("c")
+
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+
+    cache.clear()
+
+    assert len(cache) == 0
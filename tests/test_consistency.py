@@ -0,0 +1,229 @@
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from tanks.config import Settings
+from tanks.consistency import Mismatch, check, main
+from tanks.models import (
+    AverageSale,
+    DailySale,
+    DailySaleWatermark,
+    HourlyVolume,
+    TankVolume,
+    TankVolumeDeletion,
+    WindowedSale,
+)
+
+from .helpers import READINGS, create_tanks
+
+
+@pytest.fixture(name="database_url", autouse=True)
+def database_url_fixture(file_database_url: str) -> str:
+    return file_database_url
+
+
+@pytest.fixture(name="tanks")
+def tanks_fixture(session: Session, client: TestClient) -> None:
+    create_tanks(session, client, READINGS)
+
+
+def _drift(session: Session, tank_id: int, day: date) -> None:
+    average_sale = session.query(AverageSale).filter_by(tank_id=tank_id, date=day).one()
+    average_sale.sales += 1
+    session.commit()
+
+
+def test_check_consistent(
+    tanks: None, settings: Settings
+):  # pylint: disable=unused-argument
+    assert not check(settings)
+
+
+def test_check_drifted(
+    session: Session, tanks: None, settings: Settings
+):  # pylint: disable=unused-argument
+    _drift(session, 1, date(2023, 1, 9))
+    session.query(AverageSale).filter_by(tank_id=2, date=date(2023, 1, 10)).delete()
+    session.add(
+        AverageSale(id=None, tank_id=2, date=date(2023, 6, 1), sales=1, total=1)
+    )
+    session.commit()
+
+    assert check(settings) == [
+        Mismatch(
+            rollup="average sales",
+            tank_id=1,
+            date=date(2023, 1, 9),
+            expected=(2, 25),
+            actual=(3, 25),
+        ),
+        Mismatch(
+            rollup="average sales",
+            tank_id=2,
+            date=date(2023, 1, 10),
+            expected=(1, 10),
+            actual=None,
+        ),
+        Mismatch(
+            rollup="average sales",
+            tank_id=2,
+            date=date(2023, 6, 1),
+            expected=None,
+            actual=(1, 1),
+        ),
+    ]
+
+
+def test_check_other_rollups(
+    session: Session, client: TestClient, tanks: None, settings: Settings
+):  # pylint: disable=unused-argument
+    response = client.post(
+        "/tanks/1/sales-windows/", json={"calendar": "day", "length": 1}
+    )
+    window_id = response.json()["id"]
+    session.query(DailySale).filter_by(tank_id=1, date=date(2023, 1, 9)).update(
+        {"cumulative_sales": 3}
+    )
+    session.query(WindowedSale).filter_by(
+        window_id=window_id, start=datetime(2023, 1, 2)
+    ).delete()
+    session.query(HourlyVolume).filter_by(
+        tank_id=2, hour=datetime(2023, 1, 10, 10)
+    ).update({"max_volume": 20})
+    session.commit()
+
+    assert check(settings) == [
+        Mismatch(
+            rollup="daily sales",
+            tank_id=1,
+            date=date(2023, 1, 9),
+            expected=(1, 5, 2, 25),
+            actual=(1, 5, 3, 25),
+        ),
+        Mismatch(
+            rollup="windowed sales",
+            tank_id=1,
+            window_id=window_id,
+            date=datetime(2023, 1, 2),
+            expected=(1, 20),
+            actual=None,
+        ),
+        Mismatch(
+            rollup="hourly volumes",
+            tank_id=2,
+            date=datetime(2023, 1, 10, 10),
+            expected=(1, 15, 15, 15, 15),
+            actual=(1, 15, 20, 15, 15),
+        ),
+    ]
+
+    assert len(check(settings, repair=True)) == 3
+    assert not check(settings)
+
+
+def test_check_stale_running_sums(
+    session: Session, client: TestClient, tanks: None, settings: Settings
+):  # pylint: disable=unused-argument
+    response = client.post(
+        "/tanks/volumes/batch",
+        json=[{"tank_id": 1, "volume": 40.0, "created_at": "2023-01-05T10:00:00"}],
+    )
+    assert response.status_code == 201
+
+    watermark = session.get(DailySaleWatermark, 1)
+    assert watermark
+    assert watermark.date == date(2023, 1, 6)
+    assert not check(settings)
+
+
+def test_check_repair(
+    session: Session, tanks: None, settings: Settings
+):  # pylint: disable=unused-argument
+    _drift(session, 1, date(2023, 1, 16))
+
+    assert len(check(settings, repair=True)) == 1
+    assert not check(settings)
+
+
+def test_check_since(
+    session: Session, tanks: None, settings: Settings
+):  # pylint: disable=unused-argument
+    watermark = datetime.utcnow()
+    _drift(session, 2, date(2023, 1, 17))
+
+    assert [mismatch.tank_id for mismatch in check(settings, since=watermark)] == [2]
+    assert not check(settings, since=datetime.utcnow() + timedelta(minutes=1))
+
+
+def test_check_since_deletion(
+    session: Session, tanks: None, settings: Settings
+):  # pylint: disable=unused-argument
+    watermark = datetime.utcnow()
+    # A volume deleted without handling its sales.
+    tank_volume = (
+        session.query(TankVolume)
+        .filter_by(tank_id=2, created_at=datetime(2023, 1, 10, 10))
+        .one()
+    )
+    session.delete(tank_volume)
+    session.add(
+        TankVolumeDeletion(id=None, tank_id=2, created_at=tank_volume.created_at)
+    )
+    session.commit()
+
+    assert {mismatch.tank_id for mismatch in check(settings, since=watermark)} == {2}
+
+
+def test_check_tanks(
+    session: Session, tanks: None, settings: Settings
+):  # pylint: disable=unused-argument
+    _drift(session, 2, date(2023, 1, 17))
+
+    assert not check(settings, tank_ids=[1])
+
+
+def test_check_in_parallel(
+    session: Session, tanks: None, settings: Settings
+):  # pylint: disable=unused-argument
+    _drift(session, 1, date(2023, 1, 9))
+    _drift(session, 2, date(2023, 1, 17))
+
+    mismatches = check(settings, workers=2, chunk_size=1)
+
+    assert [mismatch.tank_id for mismatch in mismatches] == [1, 2]
+
+
+def test_main(
+    session: Session, tanks: None, capsys: pytest.CaptureFixture
+):  # pylint: disable=unused-argument
+    _drift(session, 1, date(2023, 1, 9))
+
+    with pytest.raises(SystemExit) as exc_info:
+        main([])
+
+    assert exc_info.value.code == 1
+    assert capsys.readouterr().out == (
+        "Tank 1 average sales on 2023-01-09: expected (2, 25.0), found (3, 25.0).\n"
+        "Found 1 mismatches.\n"
+    )
+
+    main(["--repair"])
+
+    assert capsys.readouterr().out.endswith("Repaired 1 mismatches.\n")
+
+
+def test_main_watermark(
+    session: Session, tanks: None, tmp_path: Path, capsys: pytest.CaptureFixture
+):  # pylint: disable=unused-argument
+    watermark_file = tmp_path / "watermark"
+
+    main(["--watermark-file", str(watermark_file)])
+    watermark = datetime.fromisoformat(watermark_file.read_text())
+
+    main(["--watermark-file", str(watermark_file)])
+
+    assert datetime.fromisoformat(watermark_file.read_text()) > watermark
+    assert capsys.readouterr().out == "Found 0 mismatches.\nFound 0 mismatches.\n"
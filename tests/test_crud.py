@@ -1,10 +1,26 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, cast
+
 import pytest
 import sqlalchemy
 from pydantic import BaseModel
-from pytest import fixture
+from pytest import MonkeyPatch, fixture
+from sqlalchemy.dialects.postgresql import asyncpg, psycopg2
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import Field, Session, SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from tanks.crud import CollectionResource, SQLModelCRUD
+from tanks.cache import TTLCache
+from tanks.crud import (
+    AsyncSQLModelCRUD,
+    CollectionResource,
+    InvalidCursor,
+    Order,
+    SQLModelCRUD,
+    TotalMode,
+    _planned_rows,
+)
 
 
 class Base(BaseModel):
@@ -91,12 +107,58 @@ def test_get_many_offset(sqlmodel_crud: SQLModelCRUD, rows: list[Model]):
 
 
 def test_get_many_limit(sqlmodel_crud: SQLModelCRUD, rows: list[Model]):
-    assert sqlmodel_crud.get_many(offset=0, limit=2) == CollectionResource(
+    page = sqlmodel_crud.get_many(offset=0, limit=2)
+
+    assert page == CollectionResource(
         items=rows[:2],
         offset=0,
         limit=2,
         total=len(rows),
+        next_cursor=page.next_cursor,
     )
+    assert page.next_cursor is not None
+
+
+def test_get_many_cursor(sqlmodel_crud: SQLModelCRUD, rows: list[Model]):
+    first_page = sqlmodel_crud.get_many(limit=1)
+    second_page = sqlmodel_crud.get_many(limit=1, cursor=first_page.next_cursor)
+    last_page = sqlmodel_crud.get_many(limit=1, cursor=second_page.next_cursor)
+
+    assert [first_page.items, second_page.items, last_page.items] == [
+        [rows[0]],
+        [rows[1]],
+        [rows[2]],
+    ]
+    assert second_page.total is None
+    assert last_page.next_cursor is None
+
+
+def test_get_many_keyset(
+    session: Session, rows: list[Model]
+):  # pylint: disable=unused-argument
+    sqlmodel_crud = SQLModelCRUD[Model, Base](
+        session, Model, keyset=(Model.value, Model.id)
+    )
+    session.add(Model(id=3, value=1))
+    session.commit()
+
+    first_page = sqlmodel_crud.get_many(limit=2)
+    second_page = sqlmodel_crud.get_many(limit=2, cursor=first_page.next_cursor)
+
+    assert [row.id for row in first_page.items + second_page.items] == [0, 3, 1, 2]
+    assert second_page.next_cursor is None
+
+
+@pytest.mark.parametrize(
+    argnames="cursor",
+    argvalues=["not base64!", "bm90IGpzb24=", "WzEsIDJd", "WyJvbmUiXQ=="],
+    ids=["not base64", "not json", "wrong length", "wrong type"],
+)
+def test_get_many_invalid_cursor(
+    sqlmodel_crud: SQLModelCRUD, rows, cursor: str
+):  # pylint: disable=unused-argument
+    with pytest.raises(InvalidCursor):
+        sqlmodel_crud.get_many(limit=1, cursor=cursor)
 
 
 def test_get_many_filter(sqlmodel_crud: SQLModelCRUD, rows: list[Model]):
@@ -110,6 +172,107 @@ def test_get_many_filter(sqlmodel_crud: SQLModelCRUD, rows: list[Model]):
     )
 
 
+def test_get_many_conditions(sqlmodel_crud: SQLModelCRUD, rows: list[Model]):
+    page = sqlmodel_crud.get_many(
+        limit=10, conditions=[Model.value >= 2, Model.value < 4]
+    )
+
+    assert page.items == rows[1:]
+    assert page.total == 2
+
+
+def test_get_many_descending(sqlmodel_crud: SQLModelCRUD, rows: list[Model]):
+    first_page = sqlmodel_crud.get_many(limit=2, order=Order.DESC)
+    second_page = sqlmodel_crud.get_many(
+        limit=2, cursor=first_page.next_cursor, order=Order.DESC
+    )
+
+    assert first_page.items == [rows[2], rows[1]]
+    assert second_page.items == [rows[0]]
+    assert second_page.next_cursor is None
+
+
+@pytest.mark.parametrize(
+    argnames=("mode", "expected_total"),
+    argvalues=[
+        (TotalMode.EXACT, 3),
+        (TotalMode.NONE, None),
+        (TotalMode.ESTIMATE, 3),
+        (TotalMode.CACHED, 3),
+    ],
+)
+def test_get_many_total(
+    sqlmodel_crud: SQLModelCRUD, rows, mode: TotalMode, expected_total: int | None
+):  # pylint: disable=unused-argument
+    assert sqlmodel_crud.get_many(limit=1, total=mode).total == expected_total
+
+
+def test_get_many_cached_total(session: Session, rows: list[Model]):
+    sqlmodel_crud = SQLModelCRUD[Model, Base](
+        session, Model, totals_cache=TTLCache(maxsize=10, ttl=60)
+    )
+    sqlmodel_crud.get_many(limit=1, total=TotalMode.CACHED)
+    session.add(Model(id=3, value=1))
+    session.commit()
+
+    assert sqlmodel_crud.get_many(limit=1, total=TotalMode.CACHED).total == len(rows)
+    assert (
+        sqlmodel_crud.get_many(
+            limit=1, filters={Model.value: 1}, total=TotalMode.CACHED
+        ).total
+        == 2
+    )
+    assert sqlmodel_crud.get_many(limit=1).total == len(rows) + 1
+
+
+@dataclass
+class ExplainingConnection:
+    """A connection answering EXPLAIN with a plan of planned_rows rows."""
+
+    dialect: sqlalchemy.engine.Dialect
+    planned_rows: int
+    executed: list[tuple[str, Any]] = field(default_factory=list)
+
+    def exec_driver_sql(self, sql: str, params: Any) -> Any:
+        self.executed.append((sql, params))
+        plan = [{"Plan": {"Node Type": "Seq Scan", "Plan Rows": self.planned_rows}}]
+        return sqlalchemy.engine.result.IteratorResult(
+            sqlalchemy.engine.result.SimpleResultMetaData(["QUERY PLAN"]),
+            iter([(plan,)]),
+        )
+
+
+@pytest.mark.parametrize(
+    "dialect,expected_params",
+    [(psycopg2.dialect(), {"value_1": 2}), (asyncpg.dialect(), (2,))],
+)
+def test_planned_rows(dialect: sqlalchemy.engine.Dialect, expected_params: Any):
+    connection = ExplainingConnection(dialect, planned_rows=42)
+    statement = sqlalchemy.select(Model).where(Model.value == 2)
+
+    assert (
+        _planned_rows(cast(sqlalchemy.engine.Connection, connection), statement) == 42
+    )
+
+    assert len(connection.executed) == 1
+    sql, params = connection.executed[0]
+    assert sql.startswith("EXPLAIN (FORMAT JSON) SELECT")
+    assert params == expected_params
+
+
+def test_get_many_estimated_total_on_postgres(
+    session: Session, rows, monkeypatch: MonkeyPatch
+):  # pylint: disable=unused-argument
+    connection = ExplainingConnection(psycopg2.dialect(), planned_rows=1000)
+    monkeypatch.setattr(session, "connection", lambda: connection)
+    sqlmodel_crud = SQLModelCRUD[Model, Base](session, Model)
+
+    page = sqlmodel_crud.get_many(limit=1, total=TotalMode.ESTIMATE)
+
+    assert page.total == 1000
+    assert len(page.items) == 1
+
+
 def test_update(
     session: Session, sqlmodel_crud: SQLModelCRUD, rows
 ):  # pylint: disable=unused-argument
@@ -143,3 +306,24 @@ def test_delete(
 def test_delete_miss(sqlmodel_crud: SQLModelCRUD):
     with pytest.raises(sqlalchemy.exc.NoResultFound):
         sqlmodel_crud.delete(1)
+
+
+def test_async_crud():
+    async def run_operations() -> tuple[int, Model, int]:
+        engine = create_async_engine("sqlite+aiosqlite://")
+        async with engine.begin() as connection:
+            await connection.run_sync(Model.metadata.create_all)
+
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            crud = AsyncSQLModelCRUD[Model, Base](session, Model)
+            created = await crud.create(Base(value=1))
+            await crud.create(Base(value=2))
+            updated = await crud.update(row_id=created.id, content=Base(value=3))
+            await crud.delete(row_id=created.id + 1)
+            return await crud.total(), updated, (await crud.get_one(created.id)).value
+
+    total, updated, value = asyncio.run(run_operations())
+
+    assert total == 1
+    assert updated.value == 3
+    assert value == 3
@@ -0,0 +1,140 @@
+import asyncio
+import io
+
+import pytest
+import sqlalchemy
+from sqlalchemy.util import greenlet_spawn
+
+from tanks import database
+from tanks.config import Settings
+from tanks.database import (
+    copy_csv,
+    create_async_engine,
+    create_engine,
+    get_async_database_url,
+    get_engine_options,
+    supports_copy,
+)
+
+from .helpers import PostgresConnection
+
+
+def test_get_engine_options():
+    settings = Settings(
+        database_url="postgresql://postgres@db:5432/tanks",
+        database_pool_size=20,
+        database_max_overflow=5,
+        database_pool_pre_ping=False,
+        database_pool_recycle=60,
+    )
+
+    assert get_engine_options(settings) == {
+        "pool_size": 20,
+        "max_overflow": 5,
+        "pool_pre_ping": False,
+        "pool_recycle": 60,
+    }
+
+
+def test_get_sqlite_engine_options():
+    settings = Settings(database_url="sqlite://")
+
+    assert get_engine_options(settings) == {
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+    }
+
+
+def test_create_engine():
+    engine = create_engine(Settings(database_url="sqlite://"))
+
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("SELECT 1").scalar() == 1
+
+
+@pytest.mark.parametrize(
+    argnames=("database_url", "expected_async_database_url"),
+    argvalues=[
+        (
+            "postgresql://postgres@db:5432/tanks",
+            "postgresql+asyncpg://postgres@db:5432/tanks",
+        ),
+        (
+            "postgresql+psycopg2://postgres@db:5432/tanks",
+            "postgresql+asyncpg://postgres@db:5432/tanks",
+        ),
+        (
+            "postgresql+asyncpg://postgres@db:5432/tanks",
+            "postgresql+asyncpg://postgres@db:5432/tanks",
+        ),
+        ("sqlite://", "sqlite+aiosqlite://"),
+    ],
+)
+def test_get_async_database_url(database_url: str, expected_async_database_url: str):
+    assert str(get_async_database_url(database_url)) == expected_async_database_url
+
+
+def test_get_async_database_url_unknown():
+    with pytest.raises(ValueError):
+        get_async_database_url("oracle://scott:tiger@db/tanks")
+
+
+def test_create_async_engine():
+    engine = create_async_engine(Settings(database_url="sqlite://"))
+
+    async def select_one() -> int:
+        async with engine.connect() as connection:
+            return (await connection.exec_driver_sql("SELECT 1")).scalar()
+
+    assert asyncio.run(select_one()) == 1
+
+
+@pytest.mark.parametrize(
+    argnames=("database_url", "expected"),
+    argvalues=[
+        ("postgresql+psycopg2://postgres@db:5432/tanks", True),
+        ("postgresql+asyncpg://postgres@db:5432/tanks", True),
+        ("postgresql+pg8000://postgres@db:5432/tanks", False),
+        ("sqlite://", False),
+    ],
+)
+def test_supports_copy(database_url: str, expected: bool):
+    dialect = sqlalchemy.engine.make_url(database_url).get_dialect()
+    connection = PostgresConnection(None, driver=dialect.driver)  # type: ignore
+    connection.dialect.name = dialect.name
+
+    assert supports_copy(connection) is expected  # type: ignore
+
+
+def test_copy_csv_with_psycopg2():
+    connection = PostgresConnection(None)  # type: ignore
+
+    copy_csv(
+        connection,  # type: ignore
+        "tankvolume",
+        ["tank_id", "volume"],
+        io.StringIO("1,2.0\n"),
+    )
+
+    assert connection.cursor.copies == [
+        ("COPY tankvolume (tank_id, volume) FROM STDIN WITH (FORMAT csv)", "1,2.0\n")
+    ]
+
+
+def test_copy_csv_with_asyncpg(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(database, "COPY_CHUNK_SIZE", 4)
+    connection = PostgresConnection(None, driver="asyncpg")  # type: ignore
+
+    asyncio.run(
+        greenlet_spawn(
+            copy_csv,
+            connection,
+            "tankvolume",
+            ("tank_id", "volume"),
+            io.StringIO("1,2.0\n2,3.0\n"),
+        )
+    )
+
+    assert connection.driver_connection.copies == [
+        ("tankvolume", ["tank_id", "volume"], "1,2.0\n2,3.0\n")
+    ]
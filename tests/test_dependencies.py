@@ -1,9 +1,88 @@
-from tanks.dependencies import get_session, get_settings
+import asyncio
+
+import sqlmodel
+from pytest import MonkeyPatch
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import tanks.locks
+from tanks.dependencies import (
+    get_async_engine,
+    get_async_session,
+    get_avgsales_updater,
+    get_engine,
+    get_session,
+    get_settings,
+)
+from tanks.hooks.avgsales_updater import AvgSalesUpdater, UpsertAvgSalesUpdater
+from tanks.locks import TANK_LOCKS, lock_session_tanks
 
 
 def test_get_settings():
     assert get_settings()
 
 
+def test_get_engine():
+    assert get_engine() is get_engine()
+
+
 def test_get_session():
-    assert get_session()
+    sessions = get_session()
+
+    session = next(sessions)
+
+    assert isinstance(session, sqlmodel.Session)
+    assert session.bind.engine is get_engine()
+    assert next(get_session()) is not session
+    sessions.close()
+
+
+def test_get_session_unlocks_tanks(monkeypatch: MonkeyPatch):
+    monkeypatch.setattr(tanks.locks, "LOCKING_DIALECTS", ("sqlite",))
+    calls: list[tuple] = []
+    sessions = get_session()
+    session = next(sessions)
+    connection = session.connection().connection
+    connection.create_function("pg_advisory_lock", 2, lambda *key: calls.append(key))
+    connection.create_function(
+        "pg_advisory_unlock_all", 0, lambda: calls.append(("unlock_all",))
+    )
+
+    lock_session_tanks(session, [1])
+    session.commit()
+    sessions.close()
+
+    assert calls == [(TANK_LOCKS, 1), ("unlock_all",)]
+
+
+def test_get_async_engine():
+    assert get_async_engine() is get_async_engine()
+
+
+def test_get_async_session():
+    async def get_one_session():
+        sessions = get_async_session()
+        session = await sessions.__anext__()
+        await sessions.aclose()
+        # The pool keeps aiosqlite's connection, whose thread outlives the test.
+        await get_async_engine().dispose()
+        return session
+
+    session = asyncio.run(get_one_session())
+
+    assert isinstance(session, AsyncSession)
+    assert session.bind.engine is get_async_engine()
+
+
+def test_get_avgsales_updater(monkeypatch: MonkeyPatch):
+    session = sqlmodel.Session(get_engine())
+
+    assert isinstance(get_avgsales_updater(session), UpsertAvgSalesUpdater)
+
+    monkeypatch.setenv("AVGSALES_UPDATER", "orm")
+    get_settings.cache_clear()
+
+    updater = get_avgsales_updater(session)
+    assert isinstance(updater, AvgSalesUpdater)
+    assert not isinstance(updater, UpsertAvgSalesUpdater)
+
+    get_settings.cache_clear()
@@ -0,0 +1,206 @@
+from collections.abc import Iterator
+from datetime import date, datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+import tanks.derivation
+from tanks.backfill import backfill
+from tanks.config import Settings
+from tanks.consistency import check
+from tanks.dependencies import get_settings
+from tanks.derivation import main, run
+from tanks.hooks.daily_sales import DailySalesUpdater
+from tanks.models import (
+    AverageSale,
+    DailySale,
+    DailySaleWatermark,
+    SalesWindow,
+    Tank,
+    VolumeChange,
+    WindowedSale,
+)
+from tanks.schemas import Sale
+
+from .helpers import READINGS, create_tanks
+
+
+@pytest.fixture(name="database_url", autouse=True)
+def database_url_fixture(file_database_url: str) -> str:
+    return file_database_url
+
+
+@pytest.fixture(name="outbox", autouse=True)
+def outbox_fixture(monkeypatch: pytest.MonkeyPatch) -> Iterator[None]:
+    monkeypatch.setenv("SALES_DERIVATION", "outbox")
+    get_settings.cache_clear()
+
+    yield
+
+    get_settings.cache_clear()
+
+
+@pytest.fixture(name="changes")
+def changes_fixture(session: Session, client: TestClient) -> None:
+    # The fourth reading is added in a batch of its own.
+    tank_volumes = create_tanks(session, client, [*READINGS[:3], *READINGS[4:]])
+    ids = [tank_volume["id"] for tank_volume in tank_volumes]
+    client.post("/tanks/volumes/batch", json=[READINGS[3]])
+    client.patch(f"/tanks/1/volumes/{ids[1]}", json={"volume": 40.0})
+    client.delete(f"/tanks/2/volumes/{ids[3]}")
+
+
+def test_record_changes(
+    session: Session, changes: None
+):  # pylint: disable=unused-argument
+    assert session.query(VolumeChange).count() == 8
+    assert session.query(AverageSale).count() == 0
+
+
+def _derived(session: Session) -> tuple[set[tuple], set[tuple]]:
+    return (
+        {
+            (row.tank_id, row.date, row.sales, row.total)
+            for row in session.query(AverageSale)
+        },
+        {
+            (row.tank_id, row.date, row.cumulative_sales, row.cumulative_total)
+            for row in session.query(DailySale)
+        },
+    )
+
+
+def test_run(
+    session: Session, changes: None, settings: Settings
+):  # pylint: disable=unused-argument
+    assert run(settings, batch_size=3, once=True) == 8
+
+    assert session.query(VolumeChange).count() == 0
+    assert session.query(AverageSale).count() > 0
+    assert session.query(DailySale).count() > 0
+    assert not check(settings)
+
+    derived = _derived(session)
+    session.query(AverageSale).delete()
+    session.query(DailySale).delete()
+    session.commit()
+    backfill(settings, start=date(2023, 1, 1), end=date(2023, 12, 31))
+    session.expire_all()
+    assert derived == _derived(session)
+
+
+def test_run_polls(
+    session: Session, changes: None, monkeypatch: pytest.MonkeyPatch, settings: Settings
+):  # pylint: disable=unused-argument
+    class Stop(Exception):
+        pass
+
+    def sleep(seconds: float):
+        assert seconds == 2
+        raise Stop()
+
+    monkeypatch.setattr(tanks.derivation.time, "sleep", sleep)
+
+    with pytest.raises(Stop):
+        run(settings, poll_interval=2)
+
+    assert session.query(VolumeChange).count() == 0
+
+
+def test_run_settles_running_sums(session: Session, settings: Settings):
+    session.add(Tank(id=1, name="ULS Diesel"))
+    session.add(Tank(id=2, name="Top Diesel"))
+    session.commit()
+    daily_sales = DailySalesUpdater(session)
+    for tank_id in (1, 2):
+        # The second sale lands before the first, whose running sums get stale.
+        for day, quantity in ((3, 10), (1, 5)):
+            daily_sales.handle_added_sale(
+                Sale(
+                    tank_id=tank_id,
+                    quantity=quantity,
+                    created_at=datetime(2023, 1, day),
+                )
+            )
+    session.commit()
+    assert session.query(DailySaleWatermark).count() == 2
+
+    assert run(settings, batch_size=1, once=True) == 0
+
+    session.expire_all()
+    assert session.query(DailySaleWatermark).count() == 0
+    assert {
+        (row.tank_id, row.date, row.cumulative_sales, row.cumulative_total)
+        for row in session.query(DailySale)
+    } == {
+        (tank_id, day, sales, total)
+        for tank_id in (1, 2)
+        for day, sales, total in ((date(2023, 1, 1), 1, 5), (date(2023, 1, 3), 2, 15))
+    }
+
+
+def test_record_changes_async(session: Session, async_client: TestClient):
+    session.add(Tank(id=1, name="ULS Diesel"))
+    session.commit()
+
+    response = async_client.post("/tanks/1/volumes", json={"volume": 10.0})
+
+    assert response.status_code == 201
+    assert session.query(VolumeChange).count() == 1
+    assert session.query(AverageSale).count() == 0
+
+
+def test_main(
+    changes: None, capsys: pytest.CaptureFixture
+):  # pylint: disable=unused-argument
+    main(["--once"])
+
+    assert capsys.readouterr().out == "Derived 8 changes.\n"
+
+
+def test_run_shards(
+    session: Session, changes: None, settings: Settings
+):  # pylint: disable=unused-argument
+    assert run(settings, once=True, shard=1, shards=2) == 5
+    assert {change.tank_id for change in session.query(VolumeChange)} == {2}
+    assert {sale.tank_id for sale in session.query(AverageSale)} == {1}
+
+    assert run(settings, once=True, shard=0, shards=2) == 3
+    assert session.query(VolumeChange).count() == 0
+    assert not check(settings)
+
+
+def test_main_shards(
+    changes: None, capsys: pytest.CaptureFixture
+):  # pylint: disable=unused-argument
+    main(["--once", "--shard", "0", "--shards", "2"])
+
+    assert capsys.readouterr().out == "Derived 3 changes.\n"
+
+
+def test_main_rejects_shard_out_of_range(capsys: pytest.CaptureFixture):
+    with pytest.raises(SystemExit):
+        main(["--shard", "2", "--shards", "2"])
+
+    assert "--shard must be between 0 and --shards - 1" in capsys.readouterr().err
+
+
+def test_run_sales_windows(
+    session: Session, changes: None, settings: Settings
+):  # pylint: disable=unused-argument
+    session.add(SalesWindow(id=1, tank_id=1, calendar="weekday", length=5))
+    session.commit()
+
+    run(settings, once=True)
+
+    session.expire_all()
+    assert [
+        (row.start.date(), row.sales, row.total)
+        for row in session.query(WindowedSale).order_by(WindowedSale.start)
+    ] == [
+        (row.date, row.sales, row.total)
+        for row in session.query(AverageSale)
+        .filter_by(tank_id=1)
+        .order_by(AverageSale.date)
+    ]
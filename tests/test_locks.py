@@ -0,0 +1,69 @@
+import asyncio
+
+import sqlalchemy
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from tanks.locks import (
+    LOCKED_TANKS,
+    TANK_LOCKS,
+    lock_session_tanks,
+    lock_tanks,
+    lock_tanks_async,
+    unlock_session_tanks,
+)
+
+
+def test_lock_tanks_skips_sqlite(session: Session):
+    connection = session.connection()
+    statements: list[str] = []
+
+    @sqlalchemy.event.listens_for(connection, "before_cursor_execute")
+    def record(_conn, _cursor, statement, *_args):
+        statements.append(statement)
+
+    lock_tanks(connection, [2, 1, 2])
+
+    assert not statements
+
+
+def test_lock_tanks_async_skips_sqlite():
+    async def lock() -> None:
+        engine = create_async_engine("sqlite+aiosqlite://")
+        async with AsyncSession(engine) as session:
+            await lock_tanks_async(session, [1])
+
+    asyncio.run(lock())
+
+
+def test_lock_tanks_on_postgres(session: Session, locks: list[tuple]):
+    lock_tanks(session.connection(), [2, 1, 2])
+
+    assert locks == [(TANK_LOCKS, 1), (TANK_LOCKS, 2)]
+
+
+def test_lock_session_tanks_across_commits(session: Session, locks: list[tuple]):
+    lock_session_tanks(session, [2, 1])
+    session.commit()
+    lock_session_tanks(session, [3, 2])
+    session.commit()
+
+    assert locks == [(TANK_LOCKS, 1), (TANK_LOCKS, 2), (TANK_LOCKS, 3)]
+    assert session.info[LOCKED_TANKS] == {1, 2, 3}
+
+
+def test_lock_session_tanks_skips_sqlite(session: Session):
+    lock_session_tanks(session, [1])
+
+    assert LOCKED_TANKS not in session.info
+
+
+def test_unlock_session_tanks(session: Session, locks: list[tuple]):
+    connection = session.connection()
+    unlock_session_tanks(connection, session)
+    lock_session_tanks(session, [1])
+    unlock_session_tanks(connection, session)
+
+    assert locks == [(TANK_LOCKS, 1), ("unlock_all",)]
+    assert LOCKED_TANKS not in session.info
@@ -0,0 +1,170 @@
+import random
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from sqlmodel import Session
+
+from tanks.hooks.avgsales_updater import AvgSalesUpdater
+from tanks.models import AverageSale, Tank, TankVolume
+from tanks.sales_series import (
+    derive_average_sales,
+    derive_sales,
+    derive_windowed_sales,
+    get_volume_series,
+)
+from tanks.schemas import Sale
+
+from .conftest import CreateDBRowsFunction
+
+
+def _series(*volumes: tuple[datetime, float]) -> tuple[np.ndarray, np.ndarray]:
+    return (
+        np.array([created_at for created_at, _ in volumes], dtype="datetime64[us]"),
+        np.array([volume for _, volume in volumes], dtype=np.float64),
+    )
+
+
+def test_derive_sales():
+    created_at, quantities = derive_sales(
+        *_series(
+            (datetime(2023, 1, 1, 10), 10.0),
+            (datetime(2023, 1, 2, 10), 30.0),
+            (datetime(2023, 1, 9, 10), 20.0),
+            (datetime(2023, 1, 9, 12), 25.0),
+        )
+    )
+
+    assert created_at.tolist() == [datetime(2023, 1, 2, 10), datetime(2023, 1, 9, 12)]
+    assert quantities.tolist() == [20.0, 5.0]
+
+
+def test_derive_average_sales():
+    days, sales, totals = derive_average_sales(
+        *_series(
+            (datetime(2022, 12, 1, 10), 0.0),
+            (datetime(2023, 1, 2, 10), 10.0),
+            (datetime(2023, 1, 16, 10), 12.0),
+            (datetime(2023, 1, 16, 11), 15.0),
+            (datetime(2023, 3, 1, 11), 20.0),
+        ),
+        start=date(2023, 1, 9),
+        end=date(2023, 1, 23),
+    )
+
+    assert days.tolist() == [date(2023, 1, 9), date(2023, 1, 16), date(2023, 1, 23)]
+    assert sales.tolist() == [1, 3, 3]
+    assert totals.tolist() == [10.0, 15.0, 15.0]
+
+
+def test_derive_average_sales_without_volumes():
+    days, sales, totals = derive_average_sales(
+        *_series(), start=date(2023, 1, 9), end=date(2023, 1, 1)
+    )
+
+    assert days.tolist() == sales.tolist() == totals.tolist() == []
+
+
+def test_get_volume_series(session: Session, create_db_rows: CreateDBRowsFunction):
+    create_db_rows(Tank(id=1, name="ULS Diesel"), Tank(id=2, name="Top Diesel"))
+    create_db_rows(
+        TankVolume(id=1, tank_id=1, volume=5, created_at=datetime(2022, 12, 1)),
+        TankVolume(id=2, tank_id=1, volume=10, created_at=datetime(2022, 12, 31)),
+        TankVolume(id=3, tank_id=1, volume=20, created_at=datetime(2023, 1, 2, 23)),
+        TankVolume(id=4, tank_id=1, volume=15, created_at=datetime(2023, 1, 1)),
+        TankVolume(id=5, tank_id=1, volume=30, created_at=datetime(2023, 1, 3)),
+        TankVolume(id=6, tank_id=2, volume=40, created_at=datetime(2023, 1, 2)),
+    )
+
+    created_at, volumes = get_volume_series(
+        session.connection(), 1, date(2023, 1, 1), date(2023, 1, 2)
+    )
+
+    assert created_at.tolist() == [
+        datetime(2022, 12, 31),
+        datetime(2023, 1, 1),
+        datetime(2023, 1, 2, 23),
+    ]
+    assert volumes.tolist() == [10.0, 15.0, 20.0]
+
+
+def test_derive_average_sales_matches_updater(
+    session: Session, create_db_rows: CreateDBRowsFunction
+):
+    randomizer = random.Random(7)
+    create_db_rows(Tank(id=1, name="ULS Diesel"))
+    create_db_rows(
+        *(
+            TankVolume(
+                tank_id=1,
+                volume=randomizer.randint(0, 100),
+                created_at=datetime(2023, 1, 1)
+                + timedelta(minutes=randomizer.randint(0, 60 * 24 * 120)),
+            )
+            for _ in range(2000)
+        )
+    )
+    start, end = date(2023, 2, 1), date(2023, 3, 31)
+    window_start = start - timedelta(weeks=4)
+    volume_series = get_volume_series(session.connection(), 1, window_start, end)
+
+    days, sales, totals = derive_average_sales(*volume_series, start, end)
+
+    sale_created_at, quantities = derive_sales(*volume_series)
+    AvgSalesUpdater(session).handle_sales(
+        added=[
+            Sale(tank_id=1, created_at=created_at, quantity=quantity)
+            for created_at, quantity in zip(
+                sale_created_at.tolist(), quantities.tolist()
+            )
+            if created_at.date() >= window_start
+        ],
+        deleted=[],
+    )
+    expected = (
+        session.query(AverageSale)
+        .filter(AverageSale.date >= start, AverageSale.date <= end)
+        .order_by(AverageSale.date)
+        .all()
+    )
+
+    assert list(zip(days.tolist(), sales.tolist())) == [
+        (average_sale.date, average_sale.sales) for average_sale in expected
+    ]
+    assert np.allclose(totals, [average_sale.total for average_sale in expected])
+
+
+def test_derive_windowed_sales():
+    volumes = _series(
+        (datetime(2023, 1, 1, 9, 30), 0.0),
+        (datetime(2023, 1, 1, 10, 15), 10.0),
+        (datetime(2023, 1, 2, 10, 45), 15.0),
+        (datetime(2023, 1, 8, 10, 5), 20.0),
+    )
+
+    starts, sales, totals = derive_windowed_sales(
+        *volumes,
+        "day",
+        2,
+        datetime(2023, 1, 1, 12),
+        datetime(2023, 1, 3),
+    )
+
+    assert starts.tolist() == [
+        datetime(2023, 1, 1),
+        datetime(2023, 1, 2),
+        datetime(2023, 1, 3),
+    ]
+    assert sales.tolist() == [1, 2, 1]
+    assert totals.tolist() == [10.0, 15.0, 5.0]
+
+    starts, sales, totals = derive_windowed_sales(
+        *volumes,
+        "hour_of_week",
+        2,
+        datetime(2023, 1, 8),
+        datetime(2023, 1, 8, 23),
+    )
+
+    assert starts.tolist() == [datetime(2023, 1, 8, 10)]
+    assert sales.tolist() == [2]
+    assert totals.tolist() == [15.0]
@@ -0,0 +1,24 @@
+import sqlalchemy
+from sqlalchemy.dialects import postgresql, sqlite
+
+from tanks.sql import epoch_of, hour_of
+
+created_at = sqlalchemy.column("created_at", sqlalchemy.DateTime)
+
+
+def test_hour_of():
+    assert str(hour_of(created_at).compile(dialect=postgresql.dialect())) == (
+        "date_trunc('hour', created_at)"
+    )
+    assert str(hour_of(created_at).compile(dialect=sqlite.dialect())) == (
+        "strftime('%Y-%m-%d %H:00:00.000000', created_at)"
+    )
+
+
+def test_epoch_of():
+    assert str(epoch_of(created_at).compile(dialect=postgresql.dialect())) == (
+        "CAST(extract(epoch FROM created_at) AS BIGINT)"
+    )
+    assert str(epoch_of(created_at).compile(dialect=sqlite.dialect())) == (
+        "CAST(strftime('%s', created_at) AS INTEGER)"
+    )
@@ -0,0 +1,27 @@
+from datetime import datetime, timedelta
+
+from tanks.windows import bucket_of, window_offsets, window_span
+
+
+def test_bucket_of():
+    moment = datetime(2023, 1, 2, 10, 30, 15)
+
+    assert bucket_of("weekday", moment) == datetime(2023, 1, 2)
+    assert bucket_of("day", moment) == datetime(2023, 1, 2)
+    assert bucket_of("hour_of_week", moment) == datetime(2023, 1, 2, 10)
+
+
+def test_window_offsets():
+    assert window_offsets("weekday", 3) == (
+        timedelta(0),
+        timedelta(weeks=1),
+        timedelta(weeks=2),
+    )
+    assert window_offsets("day", 2) == (timedelta(0), timedelta(days=1))
+    assert window_offsets("hour_of_week", 2) == (timedelta(0), timedelta(weeks=1))
+    assert window_offsets("day", 2) is window_offsets("day", 2)
+
+
+def test_window_span():
+    assert window_span("weekday", 5) == timedelta(weeks=4)
+    assert window_span("day", 1) == timedelta(0)